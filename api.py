@@ -0,0 +1,136 @@
+from lxml import etree
+import os, uuid
+
+from constants import *
+from helpers import *
+from mdparse import parse_buffer
+from retitle import adjust_title_tree
+from tgen import clip_data_to_titleclips, titleclips_to_kdenlive
+
+
+#
+# Library API
+#
+# Runs the same pipeline as tgen.py without touching the disk: a script is parsed to clip
+# records, the records are turned into title files, and the titles are placed in a new project
+# or fitted into an existing one. Every stage takes and returns plain objects, and every setting
+# is passed in as a settings dictionary from load_settings instead of being read from
+# constants.py, so separate calls can run on separate threads.
+#
+# Errors are printed like they are by tgen.py and then raised as TitleGenError.
+#
+#   settings = api.load_settings("2160p30", {"FONT_NAME": "Inter", "READ_SPEED": 3.2})
+#   clips = api.parse_script(script_text, settings)
+#   layout, titles = api.create_titles(clips, settings)
+#   project = api.create_project(layout, titles, "/srv/videos/42", settings)
+#
+
+# Gets the settings used by every other function of the API.
+#
+# profile_name: The name of a profile in PROFILES, or a blank string for the settings in
+# constants.py.
+# overrides: Settings to use instead of those of the profile, keyed by constant name, e.g.
+# {"FONT_NAME": "Inter", "SECTION_GAP": 1.5}.
+#
+# Returns the settings as a dictionary.
+def load_settings(profile_name: str = "", overrides: dict | None = None) -> dict:
+	settings = load_profile(profile_name, overrides)
+	if (settings == None):
+		raise ValueError(f"Unknown profile \"{profile_name}\" or setting in {list((overrides or {}).keys())}")
+	return settings
+
+# Parses a markdown script.
+#
+# script: The contents of the script.
+# settings: The settings from load_settings. Defaults to the settings in constants.py.
+# include_cache: Whether or not to reuse files pulled in with the include command from the include
+# cache, and store them there. This writes to the cache directory.
+#
+# Returns the clip records of the script.
+def parse_script(script: str | bytes, settings: dict | None = None, include_cache: bool = False) -> list[dict]:
+	if (isinstance(script, str)):
+		script = script.encode()
+
+	clips = parse_buffer(script, profile=settings, include_cache=include_cache)
+	if (clips == []):
+		raise TitleGenError("Invalid markdown script.")
+	return clips
+
+# Creates the title files of a script.
+#
+# clips: The clip records returned by parse_script.
+# settings: The settings from load_settings. Defaults to the settings in constants.py.
+# dedupe: Whether or not clips with identical titles share a single title file. The same value
+# must be passed to create_project.
+# title_cache: Whether or not to reuse line breaks and title files from the shared title cache.
+#
+# Returns a tuple with two elements. The first is the layout of the titles (the contents of
+# layout.json). The second is the title files by path relative to the project directory.
+def create_titles(clips: list[dict], settings: dict | None = None, dedupe: bool = False, title_cache: bool = False) -> tuple[list[dict], dict[str, bytes]]:
+	titles = {}
+	layout = clip_data_to_titleclips(clips, "", titles, dedupe=dedupe, title_cache=title_cache, profile=settings)
+	return layout, titles
+
+# Creates a new project from the titles of a script.
+#
+# layout, titles: The values returned by create_titles.
+# projdir: The directory the project and its titles will be placed in. Title files are referred
+# to relative to this directory.
+# settings: The settings from load_settings. Defaults to the settings in constants.py.
+# inline_titles: Whether or not to store the title XML inside each producer instead of referring
+# to the title files.
+# dedupe: Must match the value passed to create_titles.
+# uuid_namespace: If given, every UUID in the project is derived from this namespace instead of
+# being random, so unchanged inputs produce an identical project.
+#
+# Returns the contents of the project file.
+def create_project(layout: list[dict], titles: dict[str, bytes], projdir: str, settings: dict | None = None, inline_titles: bool = False, dedupe: bool = False, uuid_namespace: uuid.UUID | None = None) -> bytes:
+	files = dict(titles)
+	titleclips_to_kdenlive(projdir, layout=layout, files=files, inline_titles=inline_titles, cache=False, dedupe_titles=dedupe, uuid_namespace=uuid_namespace, profile=settings)
+	return files["project.kdenlive"]
+
+# Fits new titles into an existing project, keeping any other changes made to it.
+#
+# project: The contents of the project file.
+# layout, titles: The values returned by create_titles. Titles must not be deduplicated.
+# projdir: The directory of the project.
+# settings: The settings from load_settings the project was created with.
+# inline_titles: Whether or not to store the title XML inside new and changed producers. If not,
+# the title files must be written to projdir along with the project.
+# uuid_namespace: If given, the UUIDs of new producers are derived from this namespace.
+#
+# Returns the contents of the adjusted project file.
+def retitle_project(project: bytes, layout: list[dict], titles: dict[str, bytes], projdir: str, settings: dict | None = None, inline_titles: bool = False, uuid_namespace: uuid.UUID | None = None) -> bytes:
+	if (settings == None):
+		settings = load_profile()
+
+	try:
+		ptree = etree.ElementTree(etree.fromstring(project))
+	except etree.XMLSyntaxError:
+		raise TitleGenError("Invalid project file.")
+
+	result = adjust_title_tree(ptree, os.path.join(projdir, "project.kdenlive"), layout, titles, inline_titles, uuid_namespace, settings)
+	if (result == 3):
+		raise_error("pf", "The script now needs a different number of sequences than the project has.")
+	elif (result == 4):
+		raise_error("pf", "The project was created with deduplicated titles, which cannot be adjusted in place.")
+
+	return etree.tostring(ptree, pretty_print=True)
+
+# Runs the whole pipeline on a script.
+#
+# script: The contents of the script.
+# projdir: The directory the files will be placed in.
+# settings: The settings from load_settings. Defaults to the settings in constants.py.
+# inline_titles, dedupe, uuid_namespace: See create_project.
+#
+# Returns every file of the project by path relative to projdir, as they would be written by
+# tgen.py. Title files are left out when they are inlined.
+def generate_project(script: str | bytes, projdir: str, settings: dict | None = None, inline_titles: bool = False, dedupe: bool = False, uuid_namespace: uuid.UUID | None = None) -> dict[str, bytes]:
+	clips = parse_script(script, settings)
+	layout, titles = create_titles(clips, settings, dedupe=dedupe)
+	project = create_project(layout, titles, projdir, settings, inline_titles=inline_titles, dedupe=dedupe, uuid_namespace=uuid_namespace)
+
+	files = {} if inline_titles else dict(titles)
+	files["project.kdenlive"] = project
+	return files
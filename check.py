@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+# checks markdown scripts for kdenlive-title-gen without generating anything
+
+from constants import *
+from helpers import *
+from mdparse import *
+from textbreak import *
+
+import io, os, sys, json, contextlib, concurrent.futures
+
+
+#
+# Script Checking
+#
+# Scripts are parsed and their content is broken into lines exactly as tgen.py would, but no
+# titles or projects are created and nothing is written. Every clip is then checked against the
+# frame of each profile. Only the parser and text measurement are loaded, so this runs without
+# lxml, and without Pillow when text is measured with metrics packs.
+#
+
+# Checks the lines of a single clip against the frame.
+#
+# clip: The clip record from parse_file.
+# clip_idx: The index of the clip in the script.
+# profile: The output profile from load_profile.
+#
+# Returns a dictionary describing the clip, or a string with an error message if its font could
+# not be found.
+def check_clip(clip: dict, clip_idx: int, profile: dict) -> dict | str:
+	backend = profile["TEXT_MEASUREMENT"]
+
+	clip_font = profile["FONT_NAME"]
+	if ("font" in clip["modifiers"]):
+		if (find_font_source(clip["modifiers"]["font"][0], profile["FONT_SIZE"], backend) != ""):
+			clip_font = clip["modifiers"]["font"][0]
+		else:
+			pwrn(f"Font modifier for block {clip_idx} ({clip["content"]}) could not be applied due to invalid font.")
+
+	clip_font_size = {"title": profile["TITLE_FONT_SIZE"], "section": profile["SECTION_FONT_SIZE"], "content": profile["FONT_SIZE"]}[clip["type"]]
+	if ("font_size" in clip["modifiers"]):
+		clip_font_size = scale_to_profile(int(clip["modifiers"]["font_size"][0]), profile)
+
+	# Only content is broken into lines; titles and sections are always a single line.
+	if (clip["type"] == "content"):
+		lines = break_text_by_font_width(clip["content"], clip_font, clip_font_size, profile["MAX_CONTENT_WIDTH"], backend)
+		widths = measure_text_widths(lines, clip_font, clip_font_size, backend) if len(lines) > 0 else None
+		y_pos = profile["Y_CENTER"]
+	else:
+		lines = [clip["content"]]
+		widths = measure_text_widths(lines, clip_font, clip_font_size, backend)
+		y_pos = profile["RES_HEIGHT"] // 2
+	if (widths == None):
+		return f"Font for clip ({clip_font}) could not be found."
+
+	# Place the text like clip_data_to_titleclips does
+	if ("y" in clip["modifiers"]):
+		y_pos = scale_to_profile(int(clip["modifiers"]["y"][0]), profile)
+	if (clip["type"] == "content"):
+		y_pos -= round((len(lines) / 2.0) * clip_font_size)
+	else:
+		y_pos -= clip_font_size // 2
+
+	longest_width = max(widths)
+	overflow = []
+	if (longest_width > profile["MAX_CONTENT_WIDTH"]):
+		overflow.append("width")
+	if (y_pos < 0):
+		overflow.append("top")
+	if (y_pos + len(lines) * clip_font_size > profile["RES_HEIGHT"]):
+		overflow.append("bottom")
+
+	return {
+		"index": clip_idx,
+		"type": clip["type"],
+		"content": clip["content"],
+		"lines": len(lines),
+		"longest_line": lines[widths.index(longest_width)],
+		"longest_width": r3(longest_width),
+		"max_width": profile["MAX_CONTENT_WIDTH"],
+		"top": y_pos,
+		"bottom": y_pos + len(lines) * clip_font_size,
+		"duration": clip["duration"],
+		"overflow": overflow
+	}
+
+# Checks a script.
+#
+# path: The path of the script.
+# profile_name: The name of the profile to check against, or a blank string for the settings in
+# constants.py.
+# overrides: Settings to use instead of those of the profile, as in load_profile.
+#
+# Returns a dictionary with the errors, warnings and clips of the script.
+def check_script(path: str, profile_name: str = "", overrides: dict | None = None) -> dict:
+	profile = load_profile(profile_name, overrides)
+	report = {
+		"file": path,
+		"profile": profile_name,
+		"ok": False,
+		"errors": [],
+		"warnings": [],
+		"clips": []
+	}
+
+	# Messages are printed by the parser, so they are collected from its output.
+	output = io.StringIO()
+	with contextlib.redirect_stdout(output):
+		if (not(os.path.isfile(path))):
+			print_error("general", "File not found.")
+			clips = []
+		else:
+			# Nothing is written, so the include cache is not used either.
+			clips = parse_file(path, jobs=1, profile=profile, include_cache=False)
+			if (clips == []):
+				print_error("dp", "Invalid Markdown Script!")
+
+		for i in range(len(clips)):
+			result = check_clip(clips[i], i, profile)
+			if (isinstance(result, str)):
+				print_error("tc", result)
+				break
+			report["clips"].append(result)
+
+	for line in output.getvalue().splitlines():
+		if (line.startswith("WARN: ")):
+			report["warnings"].append(line[len("WARN: "):])
+		elif (not(line.startswith("* DEBUG: "))):
+			report["errors"].append(line)
+
+	report["overflows"] = sum(1 for clip in report["clips"] if len(clip["overflow"]) > 0)
+	report["ok"] = len(report["errors"]) == 0 and report["overflows"] == 0
+	return report
+
+# Checks many scripts across a process pool.
+#
+# paths: The paths of the scripts.
+# profile_names: The profiles to check each script against. See check_script.
+# overrides: Settings to use instead of those of each profile.
+# jobs: The number of processes to use. 0 uses every core.
+#
+# Returns the report of each script and profile, in order.
+def check_scripts(paths: list[str], profile_names: list[str], overrides: dict | None = None, jobs: int = CHECK_JOBS) -> list[dict]:
+	tasks = [(path, name) for path in paths for name in profile_names]
+	if (jobs == 0):
+		jobs = os.cpu_count() or 1
+	jobs = min(jobs, len(tasks))
+
+	if (jobs <= 1):
+		return [check_script(path, name, overrides) for path, name in tasks]
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+		return list(pool.map(check_script, [t[0] for t in tasks], [t[1] for t in tasks], [overrides] * len(tasks), chunksize=max(1, len(tasks) // (jobs * 4))))
+
+
+def parse_flags():
+	if (get_flag_idx("h", "help") >= 0):
+		print("kdenlive title generator script checker")
+		print()
+		print("Usage: python3 check.py [options] [files]")
+		print("       python3 tgen.py --check [options] [files]")
+		print()
+		print("Parses each script and breaks its content into lines without writing any files, and")
+		print("prints a JSON report of parse errors, missing fonts, and clips whose text does not")
+		print("fit in the frame. Exits with status 1 if any script has errors or overflowing clips.")
+		print("Options:")
+		print("  --profiles\tCheck against each of the given comma-separated profiles.")
+		print(f"            \tAvailable profiles: {", ".join(PROFILES.keys())}")
+		print("  --measure\tHow content is measured: freetype, metrics or auto. See tgen.py --help.")
+		print("  -j\t")
+		print("  --jobs\tThe number of processes to check scripts with. Defaults to every core.")
+		sys.exit()
+
+# Gets the scripts given on the command line: every argument that is not a flag or a flag's
+# argument.
+def get_script_args() -> list[str]:
+	return get_positional_args(["--profiles", "--measure", "-j", "--jobs"])
+
+
+def main():
+	parse_flags()
+	paths = get_script_args()
+	CFG_PROFILES = get_flag_arg("", "profiles")
+	CFG_MEASURE = get_flag_arg("", "measure")
+	CFG_JOBS = get_flag_arg("j", "jobs")
+
+	if (len(paths) == 0):
+		print("No scripts given. Run with --help for usage.")
+		sys.exit(1)
+
+	profile_names = CFG_PROFILES.split(",") if CFG_PROFILES != "" else [""]
+	for name in profile_names:
+		if (load_profile(name) == None):
+			print(f"Unknown profile \"{name}\". Available profiles: {", ".join(PROFILES.keys())}")
+			sys.exit(1)
+
+	if (CFG_MEASURE != "" and not(CFG_MEASURE in ["freetype", "metrics", "auto"])):
+		print(f"Unknown measurement backend \"{CFG_MEASURE}\". Use freetype, metrics or auto.")
+		sys.exit(1)
+	overrides = {"TEXT_MEASUREMENT": CFG_MEASURE} if CFG_MEASURE != "" else None
+
+	if (CFG_JOBS != "" and not(CFG_JOBS.isdigit())):
+		print(f"Invalid number of jobs \"{CFG_JOBS}\".")
+		sys.exit(1)
+
+	reports = check_scripts(paths, profile_names, overrides, int(CFG_JOBS) if CFG_JOBS != "" else CHECK_JOBS)
+	ok = all(report["ok"] for report in reports)
+	print(json.dumps({"ok": ok, "scripts": reports}, indent=1))
+	sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+# compiles installed fonts into metrics packs for kdenlive-title-gen
+# see fontmetrics.py for what a pack holds
+
+from constants import *
+from helpers import *
+from profiles import *
+from fontmetrics import *
+from textbreak import get_system_font
+
+import os, sys
+
+
+def parse_flags():
+	if (get_flag_idx("h", "help") >= 0 or get_flag_arg("f", "font") == ""):
+		print("kdenlive title generator font metrics compiler")
+		print()
+		print("Usage: python3 compile_metrics.py [options] -f [font]")
+		print("Required Flags:")
+		print("  -f\t")
+		print("  --font\tThe name of an installed font to compile, as given in FONT_NAME or a")
+		print("        \tscript's font modifier.")
+		print("Options:")
+		print("  -s\t")
+		print("  --sizes\tComma-separated font sizes in pixels to compile a pack for. Defaults to")
+		print("         \tthe content font size of every profile.")
+		print("  -w\t")
+		print("  --weight\tThe weight to compile variable fonts at. Defaults to the font's")
+		print("          \tdefault weight, which is what the FreeType backend measures with.")
+		print("  --chars\tA text file, e.g. a script, whose characters are measured on top of")
+		print("         \tthe default Latin and punctuation ranges.")
+		print("  -o\t")
+		print("  --output\tThe directory to write the packs to. Defaults to FONT_METRICS_DIR.")
+		sys.exit()
+
+
+def main():
+	parse_flags()
+	font = get_flag_arg("f", "font")
+	sizes = get_flag_arg("s", "sizes")
+	weight = get_flag_arg("w", "weight")
+	chars_file = get_flag_arg("", "chars")
+	output_dir = get_flag_arg("o", "output")
+
+	font_path = get_system_font(font)
+	if (font_path == ""):
+		print(f"Font {font} could not be found.")
+		sys.exit()
+
+	if (sizes == ""):
+		font_sizes = sorted({load_profile(name)["FONT_SIZE"] for name in [""] + list(PROFILES.keys())})
+	else:
+		try:
+			font_sizes = [int(size) for size in sizes.split(",")]
+		except ValueError:
+			print(f"Invalid font sizes \"{sizes}\".")
+			sys.exit()
+
+	if (weight != "" and not(weight.isdigit())):
+		print(f"Invalid font weight \"{weight}\".")
+		sys.exit()
+
+	extra_chars = ""
+	if (chars_file != ""):
+		with open(chars_file, "r", encoding="utf-8", errors="replace") as f:
+			extra_chars = "".join(sorted(set(f.read())))
+
+	if (output_dir == ""):
+		output_dir = font_metrics_dir()
+	os.makedirs(output_dir, exist_ok=True)
+
+	for font_size in font_sizes:
+		pack_path = os.path.join(output_dir, metrics_pack_name(font, font_size))
+		print(f"Compiling {os.path.basename(font_path)} at {font_size}px to {pack_path}...")
+		data = compile_metrics_pack(font_path, font_size, int(weight) if weight != "" else 0, extra_chars)
+		with open(pack_path, "wb") as pack_file:
+			pack_file.write(data)
+
+if __name__ == "__main__":
+	main()
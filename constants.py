@@ -9,6 +9,10 @@ RES_HEIGHT = 1080
 # The framerate to process each clip/set as project default to.
 FRAMERATE = 60
 
+# The name and description of the MLT profile matching the resolution and framerate above.
+PROFILE_NAME = "atsc_1080p_60"
+PROFILE_DESCRIPTION = "HD 1080p 60 fps"
+
 
 
 # speed of each clip in words per second
@@ -94,6 +98,92 @@ MAX_CONTENT_WIDTH = 1440
 # Y position on screen where the text is centered.
 Y_CENTER = 860
 
+# How content is measured to break it into lines.
+# "freetype": Load the installed font with Pillow. Exact.
+# "metrics": Use the font's metrics pack from FONT_METRICS_DIR (see compile_metrics.py). Does not
+# need Pillow or the font to be installed.
+# "auto": FreeType if Pillow and the font are available, otherwise the metrics pack.
+TEXT_MEASUREMENT = "auto"
+
+# Directory of the font metrics packs.
+# Leave blank to use the metrics folder next to tgen.py.
+FONT_METRICS_DIR = ""
+
+
+
+# Sections with more clips than this are split into several consecutive sequences, which keeps
+# Kdenlive's timeline responsive. 0 disables the limit.
+MAX_SEQUENCE_CLIPS = 200
+
+# Sections longer than this many seconds are split in the same way. 0 disables the limit.
+MAX_SEQUENCE_DURATION = 0.0
+
+
+
+# Number of processes used to parse very large scripts. 0 uses every core.
+PARSE_JOBS = 0
+
+# Number of processes used to render title previews. 0 uses every core.
+PREVIEW_JOBS = 0
+
+# Number of processes used to check scripts with --check. 0 uses every core.
+CHECK_JOBS = 0
+
+# Number of processes used to create the titles of scripts merged with --merge. 0 uses every core.
+MERGE_JOBS = 0
+
+
+
+# Width in pixels of each title in a preview contact sheet.
+PREVIEW_TILE_WIDTH = 384
+
+# Number of titles in each row of a preview contact sheet.
+PREVIEW_COLUMNS = 5
+
+# Size in pixels of the label under each title in a preview contact sheet.
+PREVIEW_LABEL_SIZE = 14
+
+# Color shown behind titles in a preview contact sheet.
+PREVIEW_BACKGROUND = (64, 64, 64, 255)
+
+
+
+# Number of threads writing title clips and project files in the background.
+WRITE_THREADS = 4
+
+# Number of files that can wait to be written before generation pauses for the writer threads.
+WRITE_QUEUE_SIZE = 64
+
+# Whether every written file, and the directories they are written to, are flushed to disk
+# before the script exits.
+WRITE_FSYNC = False
+
+# Number of finished title clips between checkpoints of the journal --resume continues from.
+CHECKPOINT_INTERVAL = 500
+
+
+
+# Directory of the title cache shared by all projects.
+# Leave blank to use kdenlive-title-gen inside the user's cache directory.
+TITLE_CACHE_DIR = ""
+
+# Maximum size of the title cache in bytes. The least recently used entries are removed past this.
+TITLE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Whether title files are hardlinked from the title cache into projects instead of copied. A
+# hardlinked title edited in place (e.g. by Kdenlive's title editor) also changes the cached
+# title and every other project linking it, so only enable this if titles are never edited.
+# If hardlinking fails, titles are copied.
+TITLE_CACHE_HARDLINK = False
+
+# Whether files pulled into scripts with the include command are cached, parsed, in the title
+# cache directory.
+INCLUDE_CACHE = True
+
+# Maximum number of bound templates (one per distinct style) kept by each template. The least
+# recently used are dropped past this, so that long-running use with many styles stays bounded.
+TEMPLATE_BINDINGS_MAX = 256
+
 
 
 
@@ -0,0 +1,224 @@
+import os, sys, json, zlib, array, struct
+
+from constants import *
+from helpers import *
+
+
+#
+# Font Metrics Packs
+#
+# A metrics pack holds what is needed to measure text in one font at one size and weight: the
+# advance width of every codepoint up to the highest one measured, and a table of the kerning
+# adjustments between pairs of codepoints. Text is measured from a pack with plain array and
+# dictionary lookups, so line breaking works without Pillow or the font itself being installed.
+#
+# Packs are compiled from a font with compile_metrics.py and looked up by font name and size in
+# FONT_METRICS_DIR. A pack compiled at another size of the same font is scaled to fit, which is
+# close but not exact, as FreeType hints advances differently at each size.
+#
+# Packs are stored as the magic bytes followed by a zlib-compressed body:
+#   3 uint32: length of the JSON header, number of advances, number of kerning pairs
+#   JSON header: font, size, weight and the advance of codepoints missing from the font
+#   float32 advances, indexed by codepoint
+#   uint32 pairs of left and right codepoints, then one float32 adjustment per pair
+# All values are little endian.
+#
+
+PACK_MAGIC = b"TGFM\x01"
+PACK_EXTENSION = ".tgfm"
+
+# Codepoints measured by default when compiling a pack: Latin, Latin-1, Latin Extended-A and B,
+# general punctuation and currency symbols.
+PACK_RANGES = [(0x20, 0x7E), (0xA0, 0x24F), (0x2010, 0x205E), (0x20A0, 0x20C0)]
+
+# Codepoints whose pairs are checked for kerning when compiling a pack. Every pair is measured,
+# so this is kept to the letters, digits and punctuation kerning usually applies to.
+PACK_KERNING_RANGES = [(0x20, 0x7E), (0xC0, 0x17F), (0x2018, 0x201F)]
+
+# Packs loaded by this process, by path, and pack paths found for each font and size.
+loaded_packs = {}
+metrics_pack_paths = {}
+
+# Gets the directory metrics packs are looked up in.
+def font_metrics_dir() -> str:
+	if (FONT_METRICS_DIR != ""):
+		return FONT_METRICS_DIR
+	return os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics")
+
+# Gets the file name of the metrics pack of a font.
+#
+# font: The name of the font, as given in a script or FONT_NAME.
+# font_size: The size of the font in pixels.
+def metrics_pack_name(font: str, font_size: int) -> str:
+	return f"{font.lower().replace(" ", "_")}_{font_size}{PACK_EXTENSION}"
+
+# Attempts to find the metrics pack of a font. If there is no pack at the given size, the pack
+# of the same font at the nearest size is used.
+#
+# font: The name of the font.
+# font_size: The size of the font in pixels.
+#
+# Returns the path of the pack if one was found, otherwise returns a blank string.
+def find_metrics_pack(font: str, font_size: int) -> str:
+	if ((font, font_size) in metrics_pack_paths):
+		return metrics_pack_paths[(font, font_size)]
+
+	pack_dir = font_metrics_dir()
+	pack_path = os.path.join(pack_dir, metrics_pack_name(font, font_size))
+	if (not(os.path.isfile(pack_path))):
+		pack_path = ""
+
+		# Fall back to the nearest size, preferring larger sizes since they lose less to hinting.
+		prefix = metrics_pack_name(font, 0)[:-len(f"0{PACK_EXTENSION}")]
+		sizes = []
+		if (os.path.isdir(pack_dir)):
+			for filename in os.listdir(pack_dir):
+				size = filename[len(prefix):-len(PACK_EXTENSION)]
+				if (filename.startswith(prefix) and filename.endswith(PACK_EXTENSION) and size.isdigit()):
+					sizes.append(int(size))
+		if (len(sizes) > 0):
+			size = min(sizes, key=lambda s: (abs(s - font_size), -s))
+			pack_path = os.path.join(pack_dir, metrics_pack_name(font, size))
+
+	pdb(f"Metrics pack for font {font} at {font_size}px: {pack_path}")
+
+	metrics_pack_paths[(font, font_size)] = pack_path
+	return pack_path
+
+# Encodes a metrics pack.
+#
+# header: The font, size, weight and default advance of the pack.
+# advances: The advance of every codepoint, indexed by codepoint.
+# kerning: The kerning adjustment of each pair of codepoints, by (left, right) tuple.
+#
+# Returns the contents of the pack file.
+def encode_metrics_pack(header: dict, advances: list[float], kerning: dict[tuple[int, int], float]) -> bytes:
+	header_data = json.dumps(header).encode()
+	advance_array = array.array("f", advances)
+	pair_array = array.array("I", [cp for pair in kerning for cp in pair])
+	adjust_array = array.array("f", kerning.values())
+	if (sys.byteorder == "big"):
+		for values in [advance_array, pair_array, adjust_array]:
+			values.byteswap()
+
+	body = struct.pack("<III", len(header_data), len(advance_array), len(kerning))
+	body += header_data + advance_array.tobytes() + pair_array.tobytes() + adjust_array.tobytes()
+	return PACK_MAGIC + zlib.compress(body, 9)
+
+# Loads a metrics pack.
+#
+# pack_path: The path of the pack file.
+#
+# Returns a dictionary with the pack's header values, an "advances" array indexed by codepoint
+# and a "kerning" dictionary keyed by left codepoint << 21 | right codepoint, or None if the
+# file is not a valid pack.
+def load_metrics_pack(pack_path: str) -> dict | None:
+	if (pack_path in loaded_packs):
+		return loaded_packs[pack_path]
+
+	try:
+		with open(pack_path, "rb") as pack_file:
+			data = pack_file.read()
+		if (not(data.startswith(PACK_MAGIC))):
+			return None
+		body = zlib.decompress(data[len(PACK_MAGIC):])
+
+		header_len, advance_count, kerning_count = struct.unpack_from("<III", body)
+		offset = struct.calcsize("<III")
+		pack = json.loads(body[offset:offset + header_len])
+		offset += header_len
+
+		advances = array.array("f", body[offset:offset + 4 * advance_count])
+		offset += 4 * advance_count
+		pairs = array.array("I", body[offset:offset + 8 * kerning_count])
+		offset += 8 * kerning_count
+		adjustments = array.array("f", body[offset:offset + 4 * kerning_count])
+	except (OSError, ValueError, zlib.error, struct.error):
+		return None
+
+	if (sys.byteorder == "big"):
+		for values in [advances, pairs, adjustments]:
+			values.byteswap()
+
+	pack["advances"] = advances
+	pack["kerning"] = {pairs[2 * i] << 21 | pairs[2 * i + 1]: adjustments[i] for i in range(kerning_count)}
+
+	loaded_packs[pack_path] = pack
+	return pack
+
+# Measures the width of several strings with a metrics pack.
+#
+# pack: The pack from load_metrics_pack.
+# strings: The strings to measure.
+# font_size: The size of the font in pixels. The pack's measurements are scaled if it was
+# compiled at another size.
+#
+# Returns the width of each string in pixels.
+def measure_with_pack(pack: dict, strings: list[str], font_size: int) -> list[float]:
+	advances = pack["advances"]
+	advance_count = len(advances)
+	default = pack["default"]
+	kerning = pack["kerning"]
+	scale = font_size / pack["size"]
+
+	widths = []
+	for text in strings:
+		width = 0.0
+		prev = -1
+		for char in text:
+			cp = ord(char)
+			width += advances[cp] if cp < advance_count else default
+			if (prev >= 0 and len(kerning) > 0):
+				width += kerning.get(prev << 21 | cp, 0.0)
+			prev = cp
+		widths.append(width * scale)
+	return widths
+
+# Compiles a font into a metrics pack. Requires Pillow.
+#
+# font_path: The path of the font file.
+# font_size: The size of the font in pixels.
+# font_weight: The weight to set on variable fonts. If 0, the font's default weight is used,
+# which is what the FreeType backend measures with.
+# extra_chars: Characters to measure on top of PACK_RANGES.
+#
+# Returns the contents of the pack file.
+def compile_metrics_pack(font_path: str, font_size: int, font_weight: int = 0, extra_chars: str = "") -> bytes:
+	from PIL import ImageFont
+
+	ifont = ImageFont.truetype(font_path, font_size)
+	if (font_weight != 0):
+		try:
+			axes = ifont.get_variation_axes()
+			ifont.set_variation_by_axes([min(max(font_weight, axis["minimum"]), axis["maximum"]) if axis["name"] in [b"Weight", "Weight"] else axis["default"] for axis in axes])
+		except OSError:
+			# Not a variable font
+			pass
+
+	codepoints = set(ord(char) for char in extra_chars if char.isprintable())
+	for first, last in PACK_RANGES:
+		codepoints.update(range(first, last + 1))
+
+	# Codepoints the font has no glyph for are drawn with its missing glyph, so they are given
+	# the advance of a private use codepoint no font is expected to have.
+	default = ifont.getlength(chr(0x10FFFD))
+
+	advances = [default] * (max(codepoints) + 1)
+	for cp in codepoints:
+		advances[cp] = ifont.getlength(chr(cp))
+
+	kerning_codepoints = sorted(cp for cp in codepoints if any(first <= cp <= last for first, last in PACK_KERNING_RANGES))
+	kerning = {}
+	for left in kerning_codepoints:
+		for right in kerning_codepoints:
+			adjustment = ifont.getlength(chr(left) + chr(right)) - advances[left] - advances[right]
+			if (adjustment != 0):
+				kerning[(left, right)] = adjustment
+
+	header = {
+		"font": os.path.basename(font_path),
+		"size": font_size,
+		"weight": font_weight,
+		"default": default
+	}
+	return encode_metrics_pack(header, advances, kerning)
@@ -1,7 +1,20 @@
-import os, math, uuid, hashlib
+import os, sys, math, uuid, hashlib, pathlib
+from xml.sax.saxutils import escape
 
 from constants import *
 from templates import *
+from profiles import *
+
+
+errors = {
+	"general": "General Error",
+	"dp": "Markdown Parsing Error",
+	"cp": "Command Parsing Error",
+	"mp": "Modifier Parsing Error",
+	"tc": "Title Clip Conversion Error",
+	"pf": "Project Creation Error",
+	"fw": "File Writing Error"
+}
 
 
 # Prints a debug message. Will only print if the internal DEBUG variable is true.
@@ -13,6 +26,72 @@ def pdb(msg: str):
 def pwrn(msg: str):
 	print(f"WARN: {msg}")
 
+# Prints the given error with the given error key.
+def print_error(error_key: str, msg: str):
+	print(f"{errors[error_key]}: {msg}")
+
+# Raised when a script, its titles or a project cannot be processed. The error has already been
+# printed with print_error, and the message is the one printed.
+class TitleGenError(Exception):
+	pass
+
+# Prints the given error with the given error key and raises it as a TitleGenError.
+def raise_error(error_key: str, msg: str):
+	print_error(error_key, msg)
+	raise TitleGenError(msg)
+
+
+
+# Gets the index of the given flag in sys.argv if it exists.
+# If it does not exist, returns -1.
+#
+# shorthand: The flag's shorthand (e.g. h)
+# longhand: The flag's full name (e.g. help)
+def get_flag_idx(shorthand: str, longhand: str) -> int:
+	try:
+		return sys.argv.index(f"--{longhand}")
+	except:
+		if (shorthand != ""):
+			try:
+				return sys.argv.index(f"-{shorthand}")
+			except:
+				pass
+
+	return -1
+
+# Gets the argument for the given flag.
+# Note: This does not work for longhand arguments adjacent to the flag, e.g. --opt=2
+#
+# shorthand: The flag's shorthand (e.g. h)
+# longhand: The flag's full name (e.g. help)
+#
+# Returns the argument for this flag, as a string.
+def get_flag_arg(shorthand: str, longhand: str) -> str:
+	idx = get_flag_idx(shorthand, longhand)
+
+	# Index Check
+	if (idx == -1 or idx == len(sys.argv) - 1):
+		return ""
+
+	# Get argument
+	return sys.argv[idx + 1]
+
+# Gets every argument that is not a flag or a flag's argument, such as the scripts given to
+# --check or --merge.
+#
+# flags_with_args: The flags that take an argument.
+def get_positional_args(flags_with_args: list[str]) -> list[str]:
+	args = []
+	i = 1
+	while (i < len(sys.argv)):
+		if (sys.argv[i] in flags_with_args):
+			i += 2
+			continue
+		if (not(sys.argv[i].startswith("-")) or sys.argv[i] == "-"):
+			args.append(sys.argv[i])
+		i += 1
+	return args
+
 
 
 # Rounds the given value to 3 decimal places.
@@ -28,19 +107,19 @@ def pad2(val: int) -> str:
 
 
 
-# Converts the given amount of seconds to frames based on the current framerate.
+# Converts the given amount of seconds to frames based on the given framerate.
 # This truncates the exact time to the nearest frame.
-def seconds_to_frames(seconds: float) -> int:
-	return int(seconds * FRAMERATE)
+def seconds_to_frames(seconds: float, framerate: int = FRAMERATE) -> int:
+	return int(seconds * framerate)
 
 # Converts a number of frames into a timestamp in the form hh:mm:ss:ff, where ff is
 # the frame offset within a second.
-def frames_to_timestamp(frames: int) -> str:
-	seconds: int = (frames // FRAMERATE) % 60
-	minutes: int = (frames // (FRAMERATE * 60)) % 60
-	hours: int = (frames // (FRAMERATE * 3600))
+def frames_to_timestamp(frames: int, framerate: int = FRAMERATE) -> str:
+	seconds: int = (frames // framerate) % 60
+	minutes: int = (frames // (framerate * 60)) % 60
+	hours: int = (frames // (framerate * 3600))
 
-	return f"{pad2(hours)}:{pad2(minutes)}:{pad2(seconds)}:{pad2(frames % FRAMERATE)}"
+	return f"{pad2(hours)}:{pad2(minutes)}:{pad2(seconds)}:{pad2(frames % framerate)}"
 
 # Converts a number of seconds into a timestamp in the form hh:mm:ss.sss
 def seconds_to_timestamp(seconds: float) -> str:
@@ -62,11 +141,17 @@ def timestamp_to_seconds(timestamp: str) -> float:
 
 
 # Converts a layout object (as saved in layout.json) to a list of sequences.
+# Sections that exceed MAX_SEQUENCE_CLIPS or MAX_SEQUENCE_DURATION are split into consecutive
+# sequences.
 #
 # layout: The layout data for a video, acquired by using json.loads on the contents
 # of the layout.json file.
 # title_last: Whether or not the title sequence should be moved to the end of the sequences list.
-def layout_to_sequences(layout: list[dict], title_last: bool = False) -> list[list[dict]]:
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+def layout_to_sequences(layout: list[dict], title_last: bool = False, profile: dict | None = None) -> list[list[dict]]:
+	if (profile == None):
+		profile = load_profile()
+
 	sections = [[]]
 	section = 0
 
@@ -79,6 +164,13 @@ def layout_to_sequences(layout: list[dict], title_last: bool = False) -> list[li
 		else:
 			sections[section].append(clip)
 
+	# Split oversized sections. Only the first part of the title section is placed in the main
+	# sequence, the rest become ordinary sequences.
+	split_sections = []
+	for section_clips in sections:
+		split_sections += split_section(section_clips, profile)
+	sections = split_sections
+
 	if (title_last):
 		# Move title section to end
 		sections.append(sections[0])
@@ -88,6 +180,86 @@ def layout_to_sequences(layout: list[dict], title_last: bool = False) -> list[li
 
 
 
+# Splits a section into parts that fit the given limits. The first clip of each following part
+# is given the gap it had in the section as an explicit before_pause, and so is the clip after
+# it, so that the parts are timed exactly like the section would have been.
+#
+# section: The clips of a single section.
+# profile: The output profile from load_profile, which sets the limits (MAX_SEQUENCE_CLIPS and
+# MAX_SEQUENCE_DURATION, where 0 is no limit) and the gaps between clips.
+#
+# Returns a list of parts, each a list of clips.
+def split_section(section: list[dict], profile: dict) -> list[list[dict]]:
+	max_clips = profile["MAX_SEQUENCE_CLIPS"]
+	max_duration = profile["MAX_SEQUENCE_DURATION"]
+	if (len(section) == 0 or (max_clips <= 0 and max_duration <= 0)):
+		return [section]
+
+	parts = [[section[0]]]
+	part_len = section[0]["duration_full"]
+	for i in range(1, len(section)):
+		clip = section[i]
+
+		# The gap before this clip within the section
+		gap = profile["CONTENT_GAP"]
+		if ("before_pause" in clip["modifiers"]):
+			gap = clip["modifiers"]["before_pause"]
+		elif (i == 1):
+			gap = profile["SECTION_GAP"]
+
+		too_many = max_clips > 0 and len(parts[-1]) >= max_clips
+		too_long = max_duration > 0 and part_len + gap + clip["duration_full"] > max_duration
+		if (too_many or too_long):
+			parts.append([])
+			part_len = clip["duration_full"]
+		else:
+			part_len += gap + clip["duration_full"]
+
+		# Sequences assume their first clip is a section, so make the gaps before and after a
+		# new part's first clip explicit.
+		if (len(parts) > 1 and len(parts[-1]) < 2 and not("before_pause" in clip["modifiers"])):
+			clip = {**clip, "modifiers": {**clip["modifiers"], "before_pause": gap}}
+
+		parts[-1].append(clip)
+
+	return parts
+
+# Gets the ref of the title file used by a title object. Titles that are identical to an
+# earlier title share its file when titles are deduplicated. Titles of a script merged into a
+# project are in the folder of titles given by their title_dir.
+def title_file_ref(title_obj: dict) -> str:
+	if ("title_dir" in title_obj):
+		return f"{title_obj["title_dir"]}/{title_obj.get("title_ref", title_obj["ref"])}"
+	return title_obj.get("title_ref", title_obj["ref"])
+
+
+
+# Gets the namespace that the UUIDs of a deterministic project are derived from.
+#
+# script_path: The path of the markdown script, or "-" if it was read from stdin.
+def script_uuid_namespace(script_path: str) -> uuid.UUID:
+	if (script_path == "-"):
+		return uuid.uuid5(uuid.NAMESPACE_URL, "stdin:")
+	return uuid.uuid5(uuid.NAMESPACE_URL, pathlib.Path(os.path.abspath(script_path)).as_uri())
+
+# Gets the namespace that the UUIDs of a deterministic project merged from several scripts are
+# derived from.
+#
+# script_paths: The paths of the markdown scripts, in order.
+def merge_uuid_namespace(script_paths: list[str]) -> uuid.UUID:
+	return uuid.uuid5(uuid.NAMESPACE_URL, "merge:" + ";".join(str(script_uuid_namespace(path)) for path in script_paths))
+
+# Creates a UUID.
+#
+# namespace: The namespace from script_uuid_namespace, or None for a random UUID.
+# name: The stable identity of the object the UUID is for. Only used if namespace is given.
+def make_uuid(namespace: uuid.UUID | None, name: str) -> uuid.UUID:
+	if (namespace == None):
+		return uuid.uuid4()
+	return uuid.uuid5(namespace, name)
+
+
+
 # Converts a title object which refers to a .kdenlivetitle file to a MLT producer.
 #
 # title_obj: A dictionary that stores the data for a single title clip. Get these from layout.json.
@@ -96,25 +268,57 @@ def layout_to_sequences(layout: list[dict], title_last: bool = False) -> list[li
 # clip_id: The unique numeric ID given to this clip.
 # producer_id: The ID of the clip within the sequence it is in.
 # seq_id: The ID of the sequence this clip is in.
+# file_hash: The md5 hash of the title file, if already known. Read from the file otherwise.
+# title_xml: The contents of the title file. If given, the title is stored inside the producer
+# instead of referring to the file.
+# uuid_namespace: If given, the producer's UUID is derived from this namespace (see make_uuid).
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
 #
 # Returns the XML for a producer that
-def title_to_producer(title_obj: dict, projdir: str, folder_id: int, clip_id: int, producer_id: int, seq_id: int) -> str:
-	file_hash = hashlib.md5(open(os.path.join(projdir, "titles", f"{title_obj["ref"]}.kdenlivetitle"), 'rb').read()).hexdigest()
+def title_to_producer(title_obj: dict, projdir: str, folder_id: int, clip_id: int, producer_id: int, seq_id: int, file_hash: str = "", title_xml: str = "", uuid_namespace: uuid.UUID | None = None, profile: dict | None = None) -> str:
+	if (profile == None):
+		profile = load_profile()
 
-	new_uuid = uuid.uuid4()
+	if (file_hash == ""):
+		if (title_xml != ""):
+			file_hash = hashlib.md5(title_xml.encode()).hexdigest()
+		else:
+			file_hash = hashlib.md5(open(os.path.join(projdir, "titles", f"{title_file_ref(title_obj)}.kdenlivetitle"), 'rb').read()).hexdigest()
+
+	new_uuid = make_uuid(uuid_namespace, f"producer/seq{seq_id}_clip{producer_id}/{file_hash}")
+
+	if (title_xml != ""):
+		return template_INLINE_TITLE_PRODUCER(
+			seq_id,
+			producer_id,
+			seconds_to_timestamp(title_obj["duration_time"]),
+			title_obj["duration_frames"],
+			title_file_ref(title_obj),
+			escape(title_xml),
+			seconds_to_timestamp(title_obj["duration_full"]),
+			frames_to_timestamp(title_obj["duration_frames"], profile["FRAMERATE"]),
+			folder_id,
+			clip_id,
+			f"{{{new_uuid}}}",
+			file_hash,
+			profile["RES_WIDTH"],
+			profile["RES_HEIGHT"]
+		)
 
 	return template_TITLE_PRODUCER(
 		seq_id,
 		producer_id,
 		seconds_to_timestamp(title_obj["duration_time"]),
 		title_obj["duration_frames"],
-		f"titles/{title_obj["ref"]}.kdenlivetitle",
+		f"titles/{title_file_ref(title_obj)}.kdenlivetitle",
 		seconds_to_timestamp(title_obj["duration_full"]),
-		frames_to_timestamp(title_obj["duration_frames"]),
+		frames_to_timestamp(title_obj["duration_frames"], profile["FRAMERATE"]),
 		folder_id,
 		clip_id,
 		f"{{{new_uuid}}}",
-		file_hash
+		file_hash,
+		profile["RES_WIDTH"],
+		profile["RES_HEIGHT"]
 	)
 
 
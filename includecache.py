@@ -0,0 +1,83 @@
+import os, json, hashlib
+
+from constants import *
+from helpers import *
+from titlecache import title_cache_dir, write_cache_file, touch_cache_file
+
+
+#
+# Include Cache
+#
+# Files pulled into a script with the include command are parsed once and stored in the shared
+# cache directory under a key derived from their path and the profile they were parsed with.
+# Each entry records every file it was parsed from (the included file and any files it includes
+# in turn) by modification time, size and content hash. An entry is reused while all of these
+# files are unchanged; a file that was touched without changing its contents is still a hit.
+#
+
+# Gets the state of a file that a cached include depends on.
+#
+# path: The absolute path of the file.
+# data: The contents of the file, if they have already been read.
+#
+# Returns a list of the path, modification time, size and md5 hash of the file.
+def include_file_state(path: str, data: bytes | None = None) -> list:
+	file_stat = os.stat(path)
+	if (data == None):
+		with open(path, "rb") as f:
+			data = f.read()
+	return [path, file_stat.st_mtime_ns, file_stat.st_size, hashlib.md5(data).hexdigest()]
+
+# Checks whether a file a cached include depends on is unchanged.
+#
+# state: The file's state from include_file_state when the include was cached.
+def include_file_unchanged(state: list) -> bool:
+	path, mtime, size, md5 = state
+	try:
+		file_stat = os.stat(path)
+		if (file_stat.st_size != size):
+			return False
+		if (file_stat.st_mtime_ns == mtime):
+			return True
+		with open(path, "rb") as f:
+			return hashlib.md5(f.read()).hexdigest() == md5
+	except OSError:
+		return False
+
+# Computes the cache key of an included file.
+#
+# path: The absolute path of the file.
+# profile: The output profile from load_profile the file is parsed with.
+#
+# Returns the key as a hex string.
+def include_cache_key(path: str, profile: dict) -> str:
+	return hashlib.md5(json.dumps([path, profile], sort_keys=True).encode()).hexdigest()
+
+# Attempts to load a parsed include from the cache.
+#
+# key: The key from include_cache_key.
+#
+# Returns a dictionary with the files the include depends on under "deps" and the result of
+# parsing it under "result", or None if it is not cached or any of its files have changed.
+def load_cached_include(key: str) -> dict | None:
+	path = os.path.join(title_cache_dir(), "includes", f"{key}.json")
+	try:
+		with open(path, "r") as cache_file:
+			entry = json.loads(cache_file.read())
+	except (OSError, ValueError):
+		return None
+
+	if not(all(include_file_unchanged(state) for state in entry["deps"])):
+		pdb(f"Include cache entry {key} is stale")
+		return None
+
+	touch_cache_file(path)
+	return entry
+
+# Stores a parsed include in the cache.
+#
+# key: The key from include_cache_key.
+# deps: The states of the files the include depends on, from include_file_state.
+# result: The result of parsing the include.
+def store_cached_include(key: str, deps: list[list], result: dict):
+	write_cache_file(os.path.join(title_cache_dir(), "includes", f"{key}.json"), json.dumps({"deps": deps, "result": result}).encode())
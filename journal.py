@@ -0,0 +1,175 @@
+import os, json, hashlib
+
+from constants import *
+from helpers import *
+from writer import *
+
+
+#
+# Checkpoint Journal
+#
+# While a project is generated, every finished title clip is recorded in a journal in the
+# project's .cache folder, so that a run that dies partway can be resumed with --resume instead
+# of starting over. Records are appended in batches, and only once the files they describe have
+# been written, so the journal never claims more than is on disk. A checkpoint is made every
+# CHECKPOINT_INTERVAL clips. Sequences are not journaled: those finished by an earlier run are
+# reused from the sequence cache (see seqcache.py), resumed or not.
+#
+# The journal starts with a hash of everything the titles are generated from, and is only
+# resumed from if that hash still matches. A resumed run starts a new journal and records the
+# clips it reuses again as it verifies them. The journal is deleted once the project is
+# complete.
+#
+# Each line of the journal is a JSON object:
+#   {"input": hash}: The first line.
+#   {"clip": index, "entry": layout entry, "hash": md5 of the title file}: A finished title clip.
+#     The hash is null for clips that share another clip's title file.
+#
+
+# Gets the path of a project's journal.
+def journal_path(projdir: str) -> str:
+	return os.path.join(projdir, ".cache", "journal.jsonl")
+
+# Computes the hash of everything a project's titles are generated from.
+#
+# cdata: The clip data returned by parse_file.
+# profile: The output profile from load_profile.
+# dedupe: Whether or not titles are deduplicated.
+def journal_input_hash(cdata: list[dict], profile: dict, dedupe: bool) -> str:
+	return hashlib.md5(json.dumps([cdata, profile, dedupe], sort_keys=True).encode()).hexdigest()
+
+# Reads the records of a journal up to the last complete line.
+#
+# path: The path of the journal.
+# input_hash: The hash from journal_input_hash the journal must start with.
+#
+# Returns the list of records after the first line, or None if the journal does not exist or
+# does not match input_hash.
+def read_journal(path: str, input_hash: str) -> list[dict] | None:
+	try:
+		with open(path, "rb") as journal_file:
+			data = journal_file.read()
+	except OSError:
+		return None
+
+	records = []
+	end = 0
+	while (True):
+		line_end = data.find(b"\n", end)
+		# A line without a newline was cut off when the run died
+		if (line_end == -1):
+			break
+		try:
+			record = json.loads(data[end:line_end])
+		except ValueError:
+			break
+		records.append(record)
+		end = line_end + 1
+
+	if (len(records) == 0 or records[0].get("input") != input_hash):
+		return None
+	return records[1:]
+
+# Opens a project's journal for a run.
+#
+# projdir: The directory of the project.
+# input_hash: The hash from journal_input_hash.
+# resume: Whether or not to continue from the existing journal. If not, or if the journal does
+# not match input_hash, the run starts from the beginning.
+# writer: The writer the run's files are queued in. It is flushed before each checkpoint.
+#
+# Returns the journal as a dictionary. Its "clips" hold the records left by the earlier run, in
+# order, to be checked by resume_journal_clips.
+def open_journal(projdir: str, input_hash: str, resume: bool, writer: dict) -> dict:
+	path = journal_path(projdir)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+
+	journal = {
+		"path": path,
+		"clips": [],
+		"pending": [],
+		"pending_clips": 0,
+		"writer": writer
+	}
+
+	previous = read_journal(path, input_hash) if resume else None
+	if (resume and previous == None):
+		pwrn("No checkpoint journal matching this script was found, so generation starts from the beginning.")
+
+	if (previous != None):
+		for record in previous:
+			# Clips are generated in order, so only an unbroken run of them can be reused.
+			if ("clip" in record and record["clip"] == len(journal["clips"])):
+				journal["clips"].append(record)
+
+	journal["file"] = open(path, "wb")
+	journal["file"].write(json.dumps({"input": input_hash}).encode() + b"\n")
+	journal["file"].flush()
+
+	return journal
+
+# Records a finished title clip. The record is written at the next checkpoint.
+#
+# journal: The journal from open_journal.
+# clip_idx: The index of the clip.
+# entry: The clip's entry in the layout.
+# title_hash: The md5 hash of the clip's title file, or None if it has no file of its own.
+def journal_clip(journal: dict, clip_idx: int, entry: dict, title_hash: str | None):
+	journal["pending"].append({"clip": clip_idx, "entry": entry, "hash": title_hash})
+	journal["pending_clips"] += 1
+	checkpoint_journal(journal)
+
+# Writes the pending records of a journal once enough have built up, after waiting for the
+# files they describe to be written.
+#
+# journal: The journal from open_journal.
+# force: Whether or not to write the pending records however few there are.
+def checkpoint_journal(journal: dict, force: bool = False):
+	if (len(journal["pending"]) == 0 or (journal["pending_clips"] < CHECKPOINT_INTERVAL and not(force))):
+		return
+
+	raise_write_errors(flush_writer(journal["writer"]))
+
+	journal["file"].write(b"".join(json.dumps(record).encode() + b"\n" for record in journal["pending"]))
+	journal["file"].flush()
+	os.fsync(journal["file"].fileno())
+	journal["pending"] = []
+	journal["pending_clips"] = 0
+
+# Closes a journal.
+#
+# journal: The journal from open_journal.
+# complete: Whether or not the project was finished, in which case the journal is deleted.
+def close_journal(journal: dict, complete: bool):
+	try:
+		if (not(complete)):
+			checkpoint_journal(journal, force=True)
+	finally:
+		journal["file"].close()
+	if (complete):
+		os.remove(journal["path"])
+
+# Gets the title clips a resumed journal records as finished whose title files are still intact.
+# Clips after the first one with a missing or changed file are generated again.
+#
+# journal: The journal from open_journal.
+# projdir: The directory of the project.
+# title_refs: If given, the title files of the returned clips are added to this dictionary, by
+# contents, as in clip_data_to_titleclips with dedupe.
+#
+# Returns the clip records, in order.
+def resume_journal_clips(journal: dict, projdir: str, title_refs: dict | None = None) -> list[dict]:
+	records = []
+	for record in journal["clips"]:
+		if (record["hash"] != None):
+			try:
+				with open(os.path.join(projdir, "titles", f"{title_file_ref(record["entry"])}.kdenlivetitle"), "rb") as title_file:
+					data = title_file.read()
+			except OSError:
+				break
+			if (hashlib.md5(data).hexdigest() != record["hash"]):
+				break
+			if (title_refs != None):
+				title_refs[data] = record["entry"]["ref"]
+		records.append(record)
+	return records
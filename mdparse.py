@@ -0,0 +1,779 @@
+import os, io, re, mmap, contextlib, concurrent.futures
+
+from constants import *
+from helpers import *
+from includecache import *
+
+
+#
+# Command & Modifier Definitions
+#
+# Each keyword maps to a list of accepted parameter lists. Each parameter is given as a type
+# spec of the form "type" or "type;lower-upper", where either bound may be left out.
+#
+
+commands = {
+	"pause": [
+		["float;0-"]
+	],
+	"ignore": [
+		[]
+	],
+	"include": [
+		["string"]
+	]
+}
+
+modifiers = {
+	"color": [
+		["int;0-255","int;0-255","int;0-255"],
+		["int;0-255","int;0-255","int;0-255","int;0-255"]
+	],
+	"font": [
+		["string"]
+	],
+	"font_size": [
+		["int;1-2147483647"]
+	],
+	"outline_color": [
+		["int;0-255","int;0-255","int;0-255"],
+		["int;0-255","int;0-255","int;0-255","int;0-255"]
+	],
+	"outline_width": [
+		["int;0-2147483647"]
+	],
+	"y": [
+		["int"]
+	]
+}
+
+
+#
+# Compiled Parser Tables
+#
+
+# A single compiled parameter type spec, e.g. "int;0-255".
+class ParamType:
+	__slots__ = ("cast", "lower", "upper")
+
+	SPEC_RE = re.compile(r"(?P<type>\w+)(?:;(?P<lower>-?\d+)?-(?P<upper>-?\d+)?)?")
+	CASTS = {
+		"int": int,
+		"float": float,
+		"string": None
+	}
+
+	def __init__(self, spec: str):
+		m = ParamType.SPEC_RE.fullmatch(spec)
+		if (m == None or m["type"] not in ParamType.CASTS):
+			raise ValueError(f"Invalid parameter type spec: {spec}")
+
+		self.cast = ParamType.CASTS[m["type"]]
+		self.lower = int(m["lower"]) if m["lower"] != None else None
+		self.upper = int(m["upper"]) if m["upper"] != None else None
+
+	# Returns whether or not the given parameter string is valid for this type.
+	def accepts(self, param: str) -> bool:
+		if (self.cast == None):
+			return True
+
+		try:
+			value = self.cast(param)
+		except ValueError:
+			return False
+
+		if (self.lower != None and value < self.lower):
+			return False
+		if (self.upper != None and value > self.upper):
+			return False
+		return True
+
+# Compiles a command or modifier definition table into lists of ParamType tuples, so that
+# the type specs are only parsed once.
+def compile_definitions(definitions: dict[str, list[list[str]]]) -> dict[str, list[tuple[ParamType, ...]]]:
+	return {keyword: [tuple(ParamType(spec) for spec in paramlist) for paramlist in forms] for keyword, forms in definitions.items()}
+
+compiled_commands = compile_definitions(commands)
+compiled_modifiers = compile_definitions(modifiers)
+
+# Matches the prefix that determines the kind of a line within a block.
+LINE_KIND_RE = re.compile(r"(?P<comment>/=/)|(?P<command>-=-)|(?P<modifier>\{\{)")
+
+# Match a command or modifier line once all spaces have been removed.
+COMMAND_RE = re.compile(r"-=-(?P<keyword>[^()]*)(?P<rest>.*)")
+MODIFIER_RE = re.compile(r"\{\{(?P<keyword>.*?)\}\}(?P<rest>.*)")
+PARAMS_RE = re.compile(r"\((?P<params>[^)]*)\)")
+
+# Gets the kind of a line: "comment", "command", "modifier", or "text".
+def classify_line(line: str) -> str:
+	m = LINE_KIND_RE.match(line)
+	return m.lastgroup if m != None else "text"
+
+# Splits a semicolon separated parameter string into a list of parameters.
+def split_params(param_str: str) -> list[str]:
+	return param_str.split(";") if param_str != "" else []
+
+
+# Checks a list of parameters for type validity based on the given keyword and corresponding
+# command definition.
+#
+# keyword: The keyword for a given command.
+# params: The list of parameters acquired from the command line, as a list of strings.
+# modifier: Whether or not to use the modifiers list. This ensures commands with modifier
+# keywords are not checked and vice versa.
+#
+# Returns whether or not the given parameter list is a valid set for the given command.
+def check_paramlist_validity(keyword: str, params: list[str], modifier: bool = False) -> bool:
+	cmd_def_list = (compiled_modifiers if modifier else compiled_commands).get(keyword, [])
+	if (DEBUG):
+		pdb(f"Checking if {params} valid")
+	for paramlist in cmd_def_list:
+		if (len(params) != len(paramlist)):
+			continue
+
+		if all(param_type.accepts(param) for param_type, param in zip(paramlist, params)):
+			return True
+
+	# No valid form found.
+	return False
+
+
+# Parses a single command line.
+#
+# line: The entire command line to parse.
+#
+# Returns a tuple containing two elements. The first is the keyword of the command,
+# the second is a list of its parameters as a string.
+def parse_command(line: str) -> tuple[str, list[str]]:
+	# Check if command
+	m = COMMAND_RE.match(line.replace(" ", "")) if line.startswith("-=-") else None
+	if (m == None):
+		return ("ERROR_NOT_COMMAND", [])
+
+	keyword = m["keyword"]
+	rest = m["rest"]
+
+	pdb(f"Parsing Command {keyword}")
+
+	# Get command parameters (if present)
+	params = []
+	if (rest != ""):
+		pm = PARAMS_RE.match(rest)
+		if (pm == None):
+			if (rest[0] == "("):
+				return ("ERROR_UNCLOSED_PARAMS", [])
+			return ("ERROR_INVALID_COMMAND", [])
+		params = split_params(pm["params"])
+
+	if not(keyword in commands):
+		return ("ERROR_INVALID_COMMAND", [])
+
+	# Paths may contain spaces, so they are taken from the line as written.
+	if (keyword == "include" and len(params) > 0):
+		params = [PARAMS_RE.search(line)["params"].strip()]
+
+	# Check validity of params
+	params_valid = check_paramlist_validity(keyword, params)
+	if not(params_valid):
+		return ("ERROR_PARAMVALID", [])
+
+	return (keyword, params)
+
+# Parses the given block for commands, ensuring only commands are present and that
+# all commands are valid.
+# Assumes that this block has already been determined to be a command block (i.e. contains
+# at least one command line).
+#
+# lines: The list of lines that form this command block.
+# line_num: The number of the first line of the command block in the markdown file.
+# kinds: The kind of each line as given by classify_line, if known. Comment lines are skipped.
+#
+# Returns the list of commands as keyword/parameter list pairs, or an empty list if an
+# error occurred while parsing.
+def parse_commands(lines: list[str], line_num: int, kinds: list[str] | None = None) -> list[tuple[str, list[str]]]:
+	cmd_list = []
+	for i in range(len(lines)):
+		if (kinds != None and kinds[i] == "comment"):
+			continue
+
+		keyerr, paramlist = parse_command(lines[i])
+		# Check if error
+		if not(keyerr in commands):
+			match keyerr:
+				case "ERROR_NOT_COMMAND":
+					print_error("cp", f"Line in Command Block is Not a Command (Line {i + line_num}).")
+				case "ERROR_UNCLOSED_PARAMS":
+					print_error("cp", f"Unclosed Parameters (Line {i + line_num})")
+				case "ERROR_INVALID_COMMAND":
+					print_error("cp", f"Unspecified Command (Line {i + line_num})")
+				case "ERROR_PARAMVALID":
+					print_error("cp", f"Invalid Parameters (Line {i + line_num})")
+			return []
+
+		# Add to list
+		cmd_list.append((keyerr, paramlist))
+
+	return cmd_list
+
+
+# Parses the given block for modifiers, ensuring all modifiers are valid.
+# See the documentation for more details regarding modifiers and their syntax.
+#
+# lines: The list of lines that form this command block.
+# line_num: The number of the first line of the command block in the markdown file.
+# kinds: The kind of each line as given by classify_line, if already known.
+#
+# Returns the list of modifiers as a dictionary, with the key being the modifier's keyword
+# and the value being the list of parameters the modifier has as an all-string list.
+def parse_modifiers(lines: list[str], line_num: int, kinds: list[str] | None = None) -> dict[str, list[str]]:
+	current_modifiers = {}
+
+	for i in range(len(lines)):
+		kind = kinds[i] if kinds != None else classify_line(lines[i])
+		if (kind != "modifier"):
+			continue
+
+		m = MODIFIER_RE.match(lines[i].replace(" ", ""))
+		if (m == None):
+			print_error("mp", f"Unclosed Modifier Keyword (Line {i + line_num})")
+			return {"error": True}
+
+		# Get modifier keyword
+		keyword = m["keyword"]
+		rest = m["rest"]
+
+		pdb(f"Parsing Modifier ({keyword})")
+
+		# Get params
+		params = []
+		pm = PARAMS_RE.search(rest)
+		if (pm != None):
+			params = split_params(pm["params"])
+		elif ("(" in rest or ")" in rest):
+			print_error("mp", f"Unclosed Parameter Block (Line {i + line_num})")
+			return {"error": True}
+
+		if not(keyword in modifiers):
+			print_error("mp", f"Unspecified Modifier (Line {i + line_num})")
+			return {"error": True}
+
+		params_valid = check_paramlist_validity(keyword, params, modifier=True)
+		if not(params_valid):
+			print_error("mp", f"Invalid Parameters (Line {i + line_num})")
+			return {"error": True}
+
+		# Create Modifier
+		current_modifiers[keyword] = params
+
+	current_modifiers["error"] = False
+	return current_modifiers
+
+
+# Scans the content of a script for blocks, which are separated by one or more blank lines.
+# Blocks are found with a single regex pass over the buffer and decoded straight from a view
+# into it, so the script never has to be split or copied line by line.
+#
+# buf: The bytes of the script, e.g. a memory-mapped file.
+# pos: The byte offset to start scanning at.
+# line_no: The line number of the line starting at pos.
+# end: The byte offset to stop scanning at. Defaults to the end of the buffer.
+#
+# Yields a tuple for each block containing the line number of the first line in the block
+# and the list of lines in the block.
+def scan_blocks(buf, pos: int, line_no: int, end: int | None = None):
+	if (end == None):
+		end = len(buf)
+
+	# Skip blank lines before the first block
+	lead = BLANK_LINES_RE.match(buf, pos, end)
+	line_no += lead.group().count(b"\n")
+	pos = lead.end()
+
+	with memoryview(buf) as view:
+		while (pos < end):
+			sep = BLOCK_SEP_RE.search(buf, pos, end)
+			block_end = sep.start() if sep != None else end
+
+			with view[pos:block_end] as block_view:
+				lines = str(block_view, "utf-8").split("\n")
+			lines = [line.removesuffix("\r") for line in lines]
+
+			yield (line_no, lines)
+
+			if (sep == None):
+				break
+
+			# The separator holds the newline ending the block plus every blank line after it.
+			line_no += len(lines) + sep.group().count(b"\n") - 1
+			pos = sep.end()
+
+# Line ending and blank line patterns used by the block scanner.
+FRONTMATTER_START_RE = re.compile(rb"---\r?\n")
+FRONTMATTER_END_RE = re.compile(rb"^---\r?$", re.MULTILINE)
+BLANK_LINES_RE = re.compile(rb"(?:\r?\n)*")
+BLOCK_SEP_RE = re.compile(rb"\r?\n(?:\r?\n)+|\r?\n$")
+
+# Matches the blank lines before a section header, used to split scripts for parallel parsing.
+SECTION_SPLIT_RE = re.compile(rb"\n(?:\r?\n)+(?=##)")
+
+# Scripts with less content than this (in bytes) are always parsed in a single process.
+PARALLEL_PARSE_MIN_BYTES = 1 << 20
+
+
+# Creates the command flags used at the start of a script. Commands set these flags, which
+# then apply to the next content block.
+def default_cmd_flags() -> dict:
+	return {
+		"pause": -1,
+		"ignore": False
+	}
+
+# Creates the include context of a script. The context tracks the files being parsed, innermost
+# last, which include paths are relative to and which must not include themselves, and collects
+# the files any included clips came from.
+#
+# path: The path of the script, or None if it was not read from a file.
+# cache: Whether or not included files are reused from and stored in the include cache.
+def include_context(path: str | None = None, cache: bool = INCLUDE_CACHE) -> dict:
+	return {
+		"stack": (os.path.abspath(path),) if path != None else (),
+		"deps": [],
+		"cache": cache
+	}
+
+# Parses a single content block.
+#
+# line_no: The line number of the first line in the block.
+# lines: The lines in the block.
+# cmd_flags: The command flags set by previous blocks. Updated in place.
+# profile: The output profile from load_profile, which sets the reading speed and durations.
+# Defaults to the settings in constants.py.
+# includes: The include context from include_context. Defaults to a script read from stdin,
+# whose includes are relative to the working directory.
+#
+# Returns the clip for the block, a list of clips for a command block that includes other files,
+# None if the block does not produce a clip (comments, commands, or ignored blocks), or False if
+# an error occurred.
+def parse_block(line_no: int, lines: list[str], cmd_flags: dict, profile: dict | None = None, includes: dict | None = None) -> dict | list[dict] | None:
+	if (profile == None):
+		profile = load_profile()
+	if (includes == None):
+		includes = include_context()
+
+	# Classify each line of the block once
+	kinds = [classify_line(line) for line in lines]
+
+	# Formatting the whole block is costly on large scripts, so skip it unless debugging
+	if (DEBUG):
+		pdb(f"Block Read: {lines} (@{line_no})")
+
+	if all(kind == "comment" for kind in kinds):
+		return None
+
+	# Check if this is a command block
+	if ("command" in kinds):
+		command_list = parse_commands(lines, line_no, kinds)
+
+		if (command_list == []):
+			print_error("dp", "An error occurred while parsing a command block.")
+			return False
+
+		# Process Commands
+		included_clips = None
+		for command_pair in command_list:
+			match command_pair[0]:
+				case "pause":
+					cmd_flags["pause"] = command_pair[1][0]
+				case "ignore":
+					cmd_flags["ignore"] = True
+				case "include":
+					clips = parse_include(command_pair[1][0], line_no, cmd_flags, profile, includes)
+					if (clips == None):
+						return False
+					included_clips = (included_clips or []) + clips
+		return included_clips
+
+	# Not a command block.
+
+	# Check if ignore
+	if (cmd_flags["ignore"]):
+		cmd_flags["ignore"] = False
+		return None
+
+	this_clip = {}
+
+	# Coalesce lines into content, stripping unnecessary whitespace
+	block_text = " ".join(lines[i].strip() for i in range(len(lines)) if kinds[i] == "text")
+	modifiers_present = "modifier" in kinds
+	if (DEBUG):
+		pdb(f"CONTENT: [{block_text}]")
+
+	# Check if contentless block has modifiers
+	if (modifiers_present and block_text == ""):
+		print_error("dp", "Modifier present with No Content.")
+		return False
+
+	# Parse for modifiers
+	this_clip["modifiers"] = parse_modifiers(lines, line_no, kinds)
+	if (this_clip["modifiers"]["error"]):
+		return False
+	del this_clip["modifiers"]["error"]
+
+	if (block_text[0:2] == "##"):
+		# section clip
+		this_clip["type"] = "section"
+		this_clip["duration"] = profile["SECTION_DURATION"] + profile["FADE_DURATION"] * 2
+
+		this_clip["content"] = block_text[3:]
+	else:
+		# content clip
+		this_clip["type"] = "content"
+
+		wc = len(block_text.split(" "))
+
+		# Get duration_frames as a function of reading speed relative to # words
+		# multiplied by a factor which shortens the clip length as longer
+		# texts are entered
+		this_clip["duration"] = r3((wc / profile["READ_SPEED"]) * (2 ** (-0.01 * wc)))
+		# Add fade time
+		this_clip["duration"] += profile["FADE_DURATION"] * 2
+
+		this_clip["content"] = block_text
+
+	# Pause command
+	if (cmd_flags["pause"] != -1):
+		this_clip["modifiers"]["before_pause"] = float(cmd_flags["pause"])
+		cmd_flags["pause"] = -1
+
+	return this_clip
+
+# Parses a sequence of content blocks.
+#
+# blocks: An iterable of (line number, lines) tuples, as yielded by scan_blocks.
+# cmd_flags: The command flags set before the first block. Updated in place.
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+# includes: The include context from include_context. See parse_block.
+#
+# Returns the list of clips, or None if an error occurred.
+def parse_blocks(blocks, cmd_flags: dict, profile: dict | None = None, includes: dict | None = None) -> list[dict] | None:
+	if (profile == None):
+		profile = load_profile()
+
+	clips = []
+	for line_no, lines in blocks:
+		clip = parse_block(line_no, lines, cmd_flags, profile, includes)
+		if (clip == False):
+			return None
+		if (isinstance(clip, list)):
+			clips += clip
+		elif (clip != None):
+			clips.append(clip)
+	return clips
+
+
+# Parses a sequence of content blocks as though no command flags were set before them, so that
+# the result can be reused wherever the blocks appear; apply_chunk_flags corrects the start of
+# the blocks afterwards.
+#
+# blocks: An iterable of (line number, lines) tuples, as yielded by scan_blocks.
+# profile: The output profile from load_profile.
+# includes: The include context from include_context. See parse_block.
+#
+# Returns a dictionary containing the following keys:
+#   "clips": The clips in the blocks, or None if an error occurred.
+#   "cmd_flags": The command flags set at the end of the blocks.
+#   "prefix": The blocks up to and including the one that produced the second clip. These are
+#     the only blocks whose result can depend on command flags set before them.
+#   "prefix_clips": The number of clips produced by the prefix.
+#   "whole": Whether or not the prefix covers every block.
+def parse_chunk_blocks(blocks, profile: dict, includes: dict) -> dict:
+	cmd_flags = default_cmd_flags()
+	clips = []
+	prefix = []
+	prefix_clips = 0
+	whole = True
+
+	for line_no, lines in blocks:
+		in_prefix = len(clips) < 2
+		if (in_prefix):
+			prefix.append((line_no, lines))
+		elif (whole):
+			whole = False
+
+		clip = parse_block(line_no, lines, cmd_flags, profile, includes)
+		if (clip == False):
+			clips = None
+			break
+		if (isinstance(clip, list)):
+			clips += clip
+		elif (clip != None):
+			clips.append(clip)
+
+		if (in_prefix):
+			prefix_clips = len(clips)
+
+	return {
+		"clips": clips,
+		"cmd_flags": cmd_flags,
+		"prefix": prefix,
+		"prefix_clips": prefix_clips if clips != None else 0,
+		"whole": whole
+	}
+
+# Gets the clips of a result from parse_chunk_blocks as they are when it follows blocks that set
+# command flags.
+#
+# result: The result from parse_chunk_blocks.
+# line_no: The line number the result's line numbers are relative to.
+# cmd_flags: The command flags set before the blocks. Updated in place.
+# profile: The output profile from load_profile.
+# includes: The include context the blocks were parsed in.
+#
+# Returns the list of clips, or None if an error occurred.
+def apply_chunk_flags(result: dict, line_no: int, cmd_flags: dict, profile: dict, includes: dict) -> list[dict] | None:
+	if (cmd_flags == default_cmd_flags()):
+		# Nothing carries over from before the blocks, so the result is exact.
+		cmd_flags.update(result["cmd_flags"])
+		return result["clips"]
+
+	# Commands before the blocks apply to the start of them.
+	prefix = [(line_no + block_line - 1, lines) for block_line, lines in result["prefix"]]
+	prefix_clips = parse_blocks(prefix, cmd_flags, profile, includes)
+	if (prefix_clips == None):
+		return None
+	if not(result["whole"]):
+		cmd_flags.update(result["cmd_flags"])
+	return prefix_clips + result["clips"][result["prefix_clips"]:]
+
+# Parses a markdown file pulled into a script with the include command, reusing the result from
+# the include cache if the file has not changed. Included files hold blocks only, without
+# frontmatter.
+#
+# path: The path of the file, relative to the file including it.
+# line_no: The line number of the block including the file.
+# cmd_flags: The command flags set before the include. Updated in place.
+# profile: The output profile from load_profile.
+# includes: The include context of the file including this one.
+#
+# Returns the clips of the file, or None if an error occurred.
+def parse_include(path: str, line_no: int, cmd_flags: dict, profile: dict, includes: dict) -> list[dict] | None:
+	base_dir = os.path.dirname(includes["stack"][-1]) if len(includes["stack"]) > 0 else os.getcwd()
+	full_path = os.path.abspath(os.path.join(base_dir, path))
+	if (full_path in includes["stack"]):
+		print_error("cp", f"{path} includes itself (Line {line_no}).")
+		return None
+
+	context = {
+		"stack": includes["stack"] + (full_path,),
+		"deps": [],
+		"cache": includes["cache"]
+	}
+
+	key = include_cache_key(full_path, profile) if includes["cache"] else ""
+	entry = load_cached_include(key) if key != "" else None
+	if (entry != None):
+		pdb(f"Include cache hit: {full_path}")
+		result = entry["result"]
+		deps = entry["deps"]
+	else:
+		try:
+			with open(full_path, "rb") as inp:
+				data = inp.read()
+			state = include_file_state(full_path, data)
+		except OSError:
+			print_error("cp", f"Could not read included file {path} (Line {line_no}).")
+			return None
+
+		result = parse_chunk_blocks(scan_blocks(data, 0, 1), profile, context)
+		if (result["clips"] == None):
+			print_error("dp", f"An error occurred while parsing included file {path} (Line {line_no}).")
+			return None
+
+		deps = [state] + context["deps"]
+		if (key != ""):
+			store_cached_include(key, deps, result)
+
+	includes["deps"] += deps
+	return apply_chunk_flags(result, 1, cmd_flags, profile, context)
+
+
+# Parses one chunk of a script in a worker process. The chunk is parsed as though no command
+# flags were set before it; parse_chunks_parallel corrects the start of the chunk afterwards.
+#
+# path: The path of the script.
+# start, end: The byte range of the chunk.
+# profile: The output profile from load_profile.
+# include_cache: Whether or not to use the include cache. See include_context.
+#
+# Returns the result of parse_chunk_blocks, with line numbers relative to the start of the chunk.
+def parse_chunk(path: str, start: int, end: int, profile: dict, include_cache: bool = INCLUDE_CACHE) -> dict:
+	# Errors are reported by the parent process when it re-parses the chunk.
+	with open(path, "rb") as inp, mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) as buf, contextlib.redirect_stdout(io.StringIO()):
+		return parse_chunk_blocks(scan_blocks(buf, start, 1, end), profile, include_context(path, include_cache))
+
+# Splits the content of a script into chunks at section headers for parallel parsing.
+#
+# buf: The bytes of the script.
+# start: The byte offset the content of the script starts at.
+# line_no: The line number of the line starting at start.
+# chunk_count: The number of chunks to aim for.
+#
+# Returns a list of (start, end, line number) tuples, one per chunk.
+def split_script_chunks(buf, start: int, line_no: int, chunk_count: int) -> list[tuple[int, int, int]]:
+	target_size = (len(buf) - start) // chunk_count
+
+	bounds = [start]
+	for m in SECTION_SPLIT_RE.finditer(buf, start):
+		if (m.end() - bounds[-1] >= target_size):
+			bounds.append(m.end())
+	bounds.append(len(buf))
+
+	chunks = []
+	for i in range(len(bounds) - 1):
+		chunks.append((bounds[i], bounds[i + 1], line_no))
+		line_no += buf[bounds[i]:bounds[i + 1]].count(b"\n")
+	return chunks
+
+# Parses the content of a script across a process pool. The result is the same as parsing it
+# with parse_blocks in a single process, including any error messages.
+#
+# path: The path of the script.
+# buf: The bytes of the script, mapped from path.
+# start: The byte offset the content of the script starts at.
+# line_no: The line number of the line starting at start.
+# jobs: The number of processes to use.
+# profile: The output profile from load_profile.
+# include_cache: Whether or not to use the include cache. See include_context.
+#
+# Returns the list of clips, or None if an error occurred.
+def parse_chunks_parallel(path: str, buf, start: int, line_no: int, jobs: int, profile: dict, include_cache: bool = INCLUDE_CACHE) -> list[dict] | None:
+	chunks = split_script_chunks(buf, start, line_no, jobs * 4)
+	pdb(f"Parsing {len(chunks)} chunks over {jobs} processes")
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+		results = pool.map(parse_chunk, [path] * len(chunks), [c[0] for c in chunks], [c[1] for c in chunks], [profile] * len(chunks), [include_cache] * len(chunks))
+
+		clips = []
+		cmd_flags = default_cmd_flags()
+		includes = include_context(path, include_cache)
+		for (chunk_start, chunk_end, chunk_line), result in zip(chunks, results):
+			if (result["clips"] == None):
+				# Re-parse the chunk here so the error is reported with the right flags and line numbers.
+				chunk_clips = parse_blocks(scan_blocks(buf, chunk_start, chunk_line, chunk_end), cmd_flags, profile, includes)
+			else:
+				# Commands at the end of the previous chunk apply to the start of this one.
+				chunk_clips = apply_chunk_flags(result, chunk_line, cmd_flags, profile, includes)
+			if (chunk_clips == None):
+				return None
+			clips += chunk_clips
+
+	return clips
+
+
+# Parses a markdown script file for text content.
+# Currently, the markdown file must have the following properties:
+# - frontmatter with at least a title field at the very start of the file
+#   - subtitle, supertitle, and other fields are optional, with subtitle and supertitle being read
+# - one empty line after frontmatter
+# - at least one line of content
+#   - lines are "section titles" if they start with ##
+#   - all other lines are treated as normal text
+#   - all content lines must have an empty line in between.
+#
+# The script is memory-mapped rather than read line by line. See parse_buffer.
+#
+# jobs: The number of processes to parse very large scripts with. 0 uses every core.
+# profile: The output profile from load_profile, which sets the reading speed and durations.
+# Defaults to the settings in constants.py.
+# include_cache: Whether or not files pulled in with the include command are reused from and
+# stored in the include cache.
+def parse_file(f, jobs: int = PARSE_JOBS, profile: dict | None = None, include_cache: bool = INCLUDE_CACHE):
+	with open(f, "rb") as inp:
+		# Empty files cannot be mapped
+		if (os.fstat(inp.fileno()).st_size == 0):
+			return parse_buffer(b"", profile=profile, include_cache=include_cache)
+
+		with mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+			return parse_buffer(buf, path=f, jobs=jobs, profile=profile, include_cache=include_cache)
+
+# Parses the bytes of a markdown script for text content. See parse_file.
+#
+# buf: The bytes of the script.
+# path: The path buf was mapped from. Required to parse in parallel.
+# jobs: The number of processes to parse very large scripts with. 0 uses every core.
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+# include_cache: Whether or not to use the include cache. See parse_file.
+#
+# Returns the list of clips in the script, or an empty list if an error occurred.
+def parse_buffer(buf, path: str | None = None, jobs: int = 1, profile: dict | None = None, include_cache: bool = INCLUDE_CACHE) -> list[dict]:
+	if (profile == None):
+		profile = load_profile()
+
+	# Initialize title clip
+	clip_data = [
+		{
+			"type": "title",
+			"duration": profile["TITLE_DURATION"] + profile["TITLE_FADE_DURATION"]
+		}
+	]
+
+	# Frontmatter check 1
+	fm_start = FRONTMATTER_START_RE.match(buf)
+	if (fm_start == None):
+		print_error("dp", "Markdown does not start with frontmatter")
+		return []
+
+	# Frontmatter check 2
+	fm_end = FRONTMATTER_END_RE.search(buf, fm_start.end())
+	if (fm_end == None):
+		print_error("dp", "Frontmatter incomplete.")
+		return []
+
+	# Parse frontmatter
+	with memoryview(buf) as view, view[fm_start.end():fm_end.start()] as fm_view:
+		# Every frontmatter line ends in a newline, so the last split is always empty
+		title_lines = [line.removesuffix("\r") for line in str(fm_view, "utf-8").split("\n")[:-1]]
+	for lt in title_lines:
+		# Get title field
+		if ("title:" in lt[0:6]):
+			clip_data[0]["content"] = lt[7:]
+
+		# Get subtitle field
+		if ("subtitle:" in lt[0:9]):
+			clip_data[0]["subtitle"] = lt[10:]
+
+		# Get supertitle field
+		if ("supertitle:" in lt[0:11]):
+			clip_data[0]["supertitle"] = lt[12:]
+
+	clip_data[0]["modifiers"] = parse_modifiers(title_lines, 2)
+
+	if not("content" in clip_data[0]):
+		print_error("dp", "No 'title' field in frontmatter.")
+		return []
+
+	# Content starts on the line after the closing "---"
+	body_line = len(title_lines) + 3
+	body_start = min(fm_end.end() + 1, len(buf))
+
+	# Content check
+	if (BLANK_LINES_RE.match(buf, body_start).end() == len(buf)):
+		print_error("dp", "At least one line of text/section header/command must be present in the document.")
+		return []
+
+	# Parse content
+	if (jobs == 0):
+		jobs = os.cpu_count() or 1
+	if (jobs > 1 and path != None and len(buf) - body_start >= PARALLEL_PARSE_MIN_BYTES):
+		content_clips = parse_chunks_parallel(path, buf, body_start, body_line, jobs, profile, include_cache)
+	else:
+		content_clips = parse_blocks(scan_blocks(buf, body_start, body_line), default_cmd_flags(), profile, include_context(path, include_cache))
+
+	if (content_clips == None):
+		return []
+	clip_data += content_clips
+
+	if (DEBUG):
+		pdb(f"CLIPS: {clip_data}")
+
+	return clip_data
@@ -0,0 +1,183 @@
+from lxml import etree
+import os, copy, json
+
+from helpers import *
+from constants import *
+
+
+#
+# Per-Sequence MLT Export
+#
+# The main timeline of a generated project is the main sequence's own title clips followed by
+# every other sequence, separated by blanks. Each of these is exported as a standalone MLT
+# document which can be rendered on its own, e.g. with melt. Every part ends with the blank that
+# follows it on the main timeline, so rendering all parts and concatenating them in order gives
+# the same video as rendering the whole project.
+#
+
+# Directory, relative to the project, that parts are exported to.
+PARTS_DIR = "parts"
+
+# Gets the elements an element depends on, in the order they appear in the document.
+#
+# root: The root element of the project.
+# element: The element to find the dependencies of.
+#
+# Returns a list of elements.
+def element_dependencies(root, element) -> list:
+	by_id = {child.get("id"): child for child in root if child.get("id") != None}
+
+	needed = set()
+	pending = [ref for ref in element.xpath(".//@producer")]
+	while (len(pending) > 0):
+		ref = pending.pop()
+		if (ref in needed or not(ref in by_id)):
+			continue
+		needed.add(ref)
+		pending += by_id[ref].xpath(".//@producer")
+
+	return [child for child in root if child.get("id") in needed]
+
+# Gets the playlists of a sequence's own tracks, without those of the sequences placed in it.
+#
+# root: The root element of the project.
+# sequence: The tractor of the sequence.
+#
+# Returns a list of playlist elements, in track order.
+def sequence_playlists(root, sequence) -> list:
+	by_id = {child.get("id"): child for child in root if child.get("id") != None}
+
+	playlists = []
+	pending = sequence.xpath("track/@producer")
+	while (len(pending) > 0):
+		element = by_id.get(pending.pop(0))
+		if (element == None):
+			continue
+		if (element.tag == "playlist"):
+			playlists.append(element)
+		elif (element.tag == "tractor" and element.find("property[@name='kdenlive:uuid']") == None):
+			pending += element.xpath("track/@producer")
+
+	return playlists
+
+# Converts a timestamp to a number of frames.
+def timestamp_to_frames(timestamp: str, framerate: int) -> int:
+	return round(timestamp_to_seconds(timestamp) * framerate)
+
+# Creates a standalone MLT document for a single part of the main timeline.
+#
+# root: The root element of the project.
+# items: The entries of the main title track that make up this part.
+# tail: The blank following the part on the main timeline, or None.
+# part_idx: The index of the part.
+#
+# Returns the document as bytes.
+def part_document(root, items: list, tail, part_idx: int) -> bytes:
+	part = etree.Element("mlt", {"LC_NUMERIC": "C", "producer": f"part{part_idx}_tractor", "root": root.get("root"), "version": root.get("version")})
+	part.append(copy.deepcopy(root.find("profile")))
+
+	playlist = etree.Element("playlist", {"id": f"part{part_idx}_playlist"})
+	for item in items + ([tail] if tail != None else []):
+		playlist.append(copy.deepcopy(item))
+
+	for dependency in element_dependencies(root, playlist):
+		part.append(copy.deepcopy(dependency))
+	part.append(playlist)
+
+	tractor = etree.SubElement(part, "tractor", {"id": f"part{part_idx}_tractor"})
+	etree.SubElement(tractor, "track", {"producer": f"part{part_idx}_playlist"})
+
+	return etree.tostring(part, xml_declaration=True, encoding="utf-8")
+
+# Exports every part of a project's main timeline.
+#
+# project_xml: The contents of the project file.
+# render_ext: The extension of the files each part is expected to be rendered to.
+#
+# Returns the exported files by path relative to the project directory: one MLT document per
+# part, a manifest.json describing the parts, and a concat.txt listing the rendered parts in
+# order in the format of ffmpeg's concat demuxer.
+def export_parts(project_xml: bytes, render_ext: str = "mp4") -> dict[str, bytes]:
+	root = etree.fromstring(project_xml)
+	framerate = int(root.find("profile").get("frame_rate_num")) // int(root.find("profile").get("frame_rate_den"))
+
+	# Sequences are told apart from title clips by their UUIDs. Producer IDs cannot be used, as
+	# deduplicated title clips may use a producer named after another sequence.
+	sequence_ids = set(root.xpath("/mlt/tractor[property[@name='kdenlive:uuid']]/@id"))
+
+	# The main title track is the playlist of the main sequence holding its title clips.
+	main_uuid = root.xpath("/mlt/tractor[property[@name='kdenlive:projectTractor']]/track/@producer")[0]
+	main_sequence = root.xpath(f"/mlt/tractor[@id='{main_uuid}']")[0]
+	main_track = [playlist for playlist in sequence_playlists(root, main_sequence) if any(not(producer in sequence_ids) for producer in playlist.xpath("entry/@producer"))][0]
+
+	# Group the main track into parts. Title clips and the blanks between them form the first
+	# part, and every sequence is a part of its own. In a merged project, the title clips of each
+	# later script follow the sequences of the script before it, so they start a new part.
+	parts = [{"items": [], "tail": None}]
+	for item in main_track:
+		is_sequence = item.tag == "entry" and item.get("producer") in sequence_ids
+		follows_sequence = len(parts[-1]["items"]) > 0 and parts[-1]["items"][0].get("producer") in sequence_ids
+		if (is_sequence or (item.tag == "entry" and follows_sequence)):
+			parts.append({"items": [item], "tail": None})
+		elif (item.tag == "entry" or item.tag == "blank"):
+			parts[-1]["items"].append(item)
+
+	# Move the blank before each part to the end of the part before it.
+	for i in range(1, len(parts)):
+		if (len(parts[i - 1]["items"]) > 0 and parts[i - 1]["items"][-1].tag == "blank"):
+			parts[i - 1]["tail"] = parts[i - 1]["items"].pop()
+
+	files = {}
+	manifest_parts = []
+	concat = ""
+	start_frame = 0
+	for i in range(len(parts)):
+		frames = 0
+		for item in parts[i]["items"] + ([parts[i]["tail"]] if parts[i]["tail"] != None else []):
+			if (item.tag == "blank"):
+				frames += timestamp_to_frames(item.get("length"), framerate)
+			else:
+				frames += timestamp_to_frames(item.get("out"), framerate) - timestamp_to_frames(item.get("in"), framerate) + 1
+
+		name = f"part_{i:03}"
+		files[f"{PARTS_DIR}/{name}.mlt"] = part_document(root, parts[i]["items"], parts[i]["tail"], i)
+
+		# Parts of title clips are labelled as the main sequence they are placed in.
+		first_producer = parts[i]["items"][0].get("producer") if len(parts[i]["items"]) > 0 else None
+		sequence = root.xpath(f"/mlt/tractor[@id='{first_producer}']/property[@name='kdenlive:clipname']/text()") if first_producer in sequence_ids else "Main"
+		manifest_parts.append({
+			"index": i,
+			"sequence": sequence if isinstance(sequence, str) else (sequence[0] if len(sequence) > 0 else ""),
+			"file": f"{name}.mlt",
+			"output": f"{name}.{render_ext}",
+			"start_frame": start_frame,
+			"frames": frames,
+			"start": r3(start_frame / framerate),
+			"duration": r3(frames / framerate)
+		})
+		concat += f"file '{name}.{render_ext}'\n"
+		start_frame += frames
+
+	manifest = {
+		"framerate": framerate,
+		"width": int(root.find("profile").get("width")),
+		"height": int(root.find("profile").get("height")),
+		"frames": start_frame,
+		"parts": manifest_parts
+	}
+	files[f"{PARTS_DIR}/manifest.json"] = json.dumps(manifest, indent=1).encode()
+	files[f"{PARTS_DIR}/concat.txt"] = concat.encode()
+
+	return files
+
+# Creates a project's parts folder, deleting parts left over from an earlier export with more parts.
+#
+# projdir: The directory of the project.
+# files: The files about to be written, by path relative to projdir.
+def remove_stale_parts(projdir: str, files: dict[str, bytes]):
+	parts_dir = os.path.join(projdir, PARTS_DIR)
+	os.makedirs(parts_dir, exist_ok=True)
+
+	for filename in os.listdir(parts_dir):
+		if (filename.startswith("part_") and not(f"{PARTS_DIR}/{filename}" in files)):
+			os.remove(os.path.join(parts_dir, filename))
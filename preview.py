@@ -0,0 +1,324 @@
+from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from lxml import etree
+import io, os, json, hashlib, concurrent.futures
+
+from constants import *
+from helpers import *
+
+
+#
+# Title Previews
+#
+# Every title is rasterized at the project resolution from its kdenlivetitle XML, so the preview
+# shows exactly the lines, positions and sizes written to the project. Rendered titles are cached
+# in the project's .cache folder by the hash of their XML and fonts, and are tiled into one
+# contact sheet per sequence in the project's previews folder.
+#
+
+# Directory, relative to the project, that contact sheets are written to.
+PREVIEWS_DIR = "previews"
+
+# Fonts loaded by this process, by path, size and weight.
+preview_fonts = {}
+
+# Gets the directory rendered titles of a project are cached in.
+def preview_cache_dir(projdir: str) -> str:
+	return os.path.join(projdir, ".cache", "previews")
+
+# Converts a color code from a title file, e.g. 255,255,255,255, to an RGBA tuple.
+def parse_color_code(code: str) -> tuple[int, int, int, int]:
+	components = [int(c) for c in code.split(",")]
+	if (len(components) == 3):
+		components.append(255)
+	return tuple(components)
+
+# Converts a Qt color name, e.g. #80000000 (#AARRGGBB), to an RGBA tuple.
+def parse_qt_color(name: str) -> tuple[int, int, int, int]:
+	name = name.lstrip("#")
+	if (len(name) == 6):
+		name = "ff" + name
+	return (int(name[2:4], 16), int(name[4:6], 16), int(name[6:8], 16), int(name[0:2], 16))
+
+# Loads a font for previews, set to the given weight if it is a variable font.
+#
+# font_path: The path of the font file.
+# font_size: The size of the font in pixels.
+# font_weight: The weight of the font, e.g. 600.
+def load_preview_font(font_path: str, font_size: int, font_weight: int):
+	ifont = preview_fonts.get((font_path, font_size, font_weight))
+	if (ifont != None):
+		return ifont
+
+	ifont = ImageFont.truetype(font_path, font_size)
+	try:
+		axes = ifont.get_variation_axes()
+		ifont.set_variation_by_axes([min(max(font_weight, axis["minimum"]), axis["maximum"]) if axis["name"] in [b"Weight", "Weight"] else axis["default"] for axis in axes])
+	except OSError:
+		# Not a variable font
+		pass
+
+	preview_fonts[(font_path, font_size, font_weight)] = ifont
+	return ifont
+
+# Composites an image onto another at a position that may be partly outside of it.
+#
+# image: The image to draw onto.
+# layer: The image to draw.
+# x, y: The position of the top left corner of the layer.
+def composite_at(image: Image.Image, layer: Image.Image, x: int, y: int):
+	left = max(0, -x)
+	top = max(0, -y)
+	right = min(layer.width, image.width - x)
+	bottom = min(layer.height, image.height - y)
+	if (right > left and bottom > top):
+		image.alpha_composite(layer, (x + left, y + top), (left, top, right, bottom))
+
+# Rasterizes a title.
+#
+# title_xml: The contents of the title file.
+# font_paths: The path of every font used by the title, by name.
+#
+# Returns an RGBA image at the title's resolution.
+def render_title(title_xml: bytes, font_paths: dict[str, str]) -> Image.Image:
+	# Title text is not escaped, so recover from stray markup characters.
+	root = etree.fromstring(title_xml, etree.XMLParser(recover=True))
+	width = int(root.get("width"))
+	height = int(root.get("height"))
+
+	background = root.find("background")
+	image = Image.new("RGBA", (width, height), parse_color_code(background.get("color")) if background != None else (0, 0, 0, 0))
+
+	# Items with a higher z-index are drawn on top.
+	items = sorted(root.findall("item"), key=lambda item: int(item.get("z-index", "0")))
+	for item in items:
+		content = item.find("content")
+		if (content == None or content.text == None or not(content.get("font") in font_paths)):
+			continue
+
+		font_size = int(content.get("font-pixel-size"))
+		ifont = load_preview_font(font_paths[content.get("font")], font_size, int(content.get("font-weight", "400")))
+		ascent, descent = ifont.getmetrics()
+
+		# The outline is drawn centered on the edge of each glyph, so half of it is outside.
+		stroke_width = round(int(content.get("font-outline", "0")) / 2)
+		fill = parse_color_code(content.get("font-color"))
+		stroke_fill = parse_color_code(content.get("font-outline-color"))
+
+		# Lines are centered in the item's box (alignment 4 is Qt::AlignHCenter). Only the area
+		# the text can cover is drawn, which is far smaller than the whole frame.
+		lines = content.text.split("\n")
+		margin = stroke_width + 2
+		box_x = round(float(item.find("position").get("x"))) - margin
+		box_y = round(float(item.find("position").get("y"))) - margin
+		box_width = float(content.get("box-width"))
+
+		layer = Image.new("RGBA", (round(box_width) + 2 * margin, len(lines) * (ascent + descent) + 2 * margin), (0, 0, 0, 0))
+		draw = ImageDraw.Draw(layer)
+		for i in range(len(lines)):
+			line_x = margin + (box_width - ifont.getlength(lines[i])) / 2
+			line_y = margin + i * (ascent + descent)
+			draw.text((line_x, line_y), lines[i], font=ifont, fill=fill, stroke_width=stroke_width, stroke_fill=stroke_fill)
+
+		# Shadow: enabled;color;blur radius;x offset;y offset
+		shadow = content.get("shadow", "0").split(";")
+		if (shadow[0] == "1" and len(shadow) == 5):
+			shadow_color = parse_qt_color(shadow[1])
+			blur = int(shadow[2])
+
+			shadow_layer = Image.new("RGBA", (layer.width + 4 * blur, layer.height + 4 * blur), shadow_color[:3] + (0,))
+			shadow_alpha = Image.new("L", shadow_layer.size, 0)
+			shadow_alpha.paste(layer.getchannel("A").point(lambda a: a * shadow_color[3] // 255), (2 * blur, 2 * blur))
+			shadow_layer.putalpha(shadow_alpha)
+			if (blur > 0):
+				shadow_layer = shadow_layer.filter(ImageFilter.GaussianBlur(blur / 2))
+			composite_at(image, shadow_layer, box_x - 2 * blur + int(shadow[3]), box_y - 2 * blur + int(shadow[4]))
+
+		composite_at(image, layer, box_x, box_y)
+
+	return image
+
+# Renders a title and shrinks it to a contact sheet tile, reusing the cached render and tile if
+# there are any. Run in the process pool of render_previews.
+#
+# title_xml: The contents of the title file.
+# font_paths: The path of every font used by the title, by name.
+# cache_path: The path of the cached render, or a blank string to not cache it.
+# tile_size: The width and height of the tile.
+#
+# Returns the tile as raw RGBA data.
+def render_preview_tile(title_xml: bytes, font_paths: dict[str, str], cache_path: str, tile_size: tuple[int, int]) -> bytes:
+	tile_path = preview_tile_path(cache_path, tile_size) if cache_path != "" else ""
+	tile = load_cached_preview(tile_path)
+	if (tile != None):
+		return tile.convert("RGBA").tobytes()
+
+	image = load_cached_preview(cache_path)
+	if (image == None):
+		image = render_title(title_xml, font_paths)
+		store_cached_preview(cache_path, image)
+
+	tile = image.convert("RGBA").resize(tile_size, Image.Resampling.BOX)
+	store_cached_preview(tile_path, tile)
+	return tile.tobytes()
+
+# Gets the path of a cached tile from the path of the cached render it was shrunk from.
+def preview_tile_path(cache_path: str, tile_size: tuple[int, int]) -> str:
+	return f"{cache_path.removesuffix(".png")}_{tile_size[0]}x{tile_size[1]}.png"
+
+# Attempts to load a cached render or tile.
+#
+# path: The path of the cached image, or a blank string.
+#
+# Returns the image, or None if it is not cached.
+def load_cached_preview(path: str) -> Image.Image | None:
+	if (path == ""):
+		return None
+
+	try:
+		image = Image.open(path)
+		image.load()
+	except OSError:
+		return None
+	return image
+
+# Stores a render or tile in the cache.
+#
+# path: The path of the cached image, or a blank string to not cache it.
+# image: The image to store.
+def store_cached_preview(path: str, image: Image.Image):
+	if (path == ""):
+		return
+
+	# Save to a temporary file first so an interrupted run never leaves a partial image.
+	image.save(f"{path}.{os.getpid()}.tmp", format="PNG", compress_level=1)
+	os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+# Computes the cache key of a rendered title.
+#
+# title_xml: The contents of the title file.
+# font_paths: The path of every font used by the title, by name.
+#
+# Returns the key as a hex string.
+def preview_cache_key(title_xml: bytes, font_paths: dict[str, str]) -> str:
+	# The font files' sizes and modification times stand in for their contents.
+	fonts = []
+	for name in sorted(font_paths.keys()):
+		font_stat = os.stat(font_paths[name])
+		fonts.append([name, font_paths[name], font_stat.st_size, font_stat.st_mtime_ns])
+	return hashlib.md5(title_xml + json.dumps(fonts).encode()).hexdigest()
+
+# Tiles rendered titles into a contact sheet.
+#
+# tiles: The tiles of the sequence's clips in order, as (raw RGBA data, label) tuples.
+# tile_size: The width and height of each tile.
+#
+# Returns the contact sheet as PNG data.
+def contact_sheet(tiles: list[tuple[bytes, str]], tile_size: tuple[int, int]) -> bytes:
+	label_font = ImageFont.load_default(size=PREVIEW_LABEL_SIZE)
+	label_height = PREVIEW_LABEL_SIZE + 8
+	columns = min(PREVIEW_COLUMNS, len(tiles))
+	rows = (len(tiles) + columns - 1) // columns
+
+	sheet = Image.new("RGBA", (columns * (tile_size[0] + 4) + 4, rows * (tile_size[1] + label_height + 4) + 4), (0, 0, 0, 255))
+	draw = ImageDraw.Draw(sheet)
+	for i in range(len(tiles)):
+		x = 4 + (i % columns) * (tile_size[0] + 4)
+		y = 4 + (i // columns) * (tile_size[1] + label_height + 4)
+
+		tile = Image.new("RGBA", tile_size, PREVIEW_BACKGROUND)
+		tile.alpha_composite(Image.frombytes("RGBA", tile_size, tiles[i][0]))
+		sheet.paste(tile, (x, y))
+		draw.text((x + 2, y + tile_size[1] + 4), tiles[i][1], font=label_font, fill=(255, 255, 255, 255))
+
+	out = io.BytesIO()
+	sheet.convert("RGB").save(out, format="PNG", compress_level=1)
+	return out.getvalue()
+
+# Renders a contact sheet of the titles of every sequence.
+#
+# layout: The layout data of the video, as returned by clip_data_to_titleclips.
+# projdir: The directory of the project.
+# find_font: A function returning the path of a font from its name, or a blank string if the
+# font cannot be found.
+# files: The project's files by relative path, if they are held in memory instead of on disk.
+# cache: Whether or not to cache rendered titles in the project's .cache folder.
+# jobs: The number of processes to render titles with. 0 uses every core.
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+#
+# Returns the contact sheets by path relative to the project directory.
+def render_previews(layout: list[dict], projdir: str, find_font, files: dict[str, bytes] | None = None, cache: bool = True, jobs: int = PREVIEW_JOBS, profile: dict | None = None) -> dict[str, bytes]:
+	sequences = layout_to_sequences(layout, profile=profile)
+
+	# Render every distinct title once.
+	titles = {}
+	for sequence in sequences:
+		for clip in sequence:
+			ref = title_file_ref(clip)
+			if (ref in titles):
+				continue
+
+			if (files != None):
+				title_xml = files[f"titles/{ref}.kdenlivetitle"]
+			else:
+				with open(os.path.join(projdir, "titles", f"{ref}.kdenlivetitle"), "rb") as title_file:
+					title_xml = title_file.read()
+
+			font_paths = {}
+			for content in etree.fromstring(title_xml, etree.XMLParser(recover=True)).iter("content"):
+				font_path = find_font(content.get("font"))
+				if (font_path != ""):
+					font_paths[content.get("font")] = font_path
+				else:
+					pwrn(f"Font {content.get("font")} could not be found, so it is left out of the preview of {ref}.")
+			titles[ref] = (title_xml, font_paths)
+
+	root = etree.fromstring(next(iter(titles.values()))[0], etree.XMLParser(recover=True))
+	tile_size = (PREVIEW_TILE_WIDTH, round(PREVIEW_TILE_WIDTH * int(root.get("height")) / int(root.get("width"))))
+
+	cache_paths = {}
+	if (cache):
+		os.makedirs(preview_cache_dir(projdir), exist_ok=True)
+		cache_paths = {ref: os.path.join(preview_cache_dir(projdir), f"{preview_cache_key(*titles[ref])}.png") for ref in titles}
+
+	refs = list(titles.keys())
+	args = [
+		[titles[ref][0] for ref in refs],
+		[titles[ref][1] for ref in refs],
+		[cache_paths.get(ref, "") for ref in refs],
+		[tile_size] * len(refs)
+	]
+
+	if (jobs == 0):
+		jobs = os.cpu_count() or 1
+	if (jobs > 1 and len(refs) > 1):
+		pdb(f"Rendering {len(refs)} previews over {jobs} processes")
+		with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+			rendered = dict(zip(refs, pool.map(render_preview_tile, *args, chunksize=8)))
+	else:
+		rendered = dict(zip(refs, map(render_preview_tile, *args)))
+
+	# Delete renders of titles that are no longer in the project.
+	if (cache):
+		used = {os.path.basename(path) for path in cache_paths.values()}
+		used |= {os.path.basename(preview_tile_path(path, tile_size)) for path in cache_paths.values()}
+		for filename in os.listdir(preview_cache_dir(projdir)):
+			if (filename.endswith(".png") and not(filename in used)):
+				os.remove(os.path.join(preview_cache_dir(projdir), filename))
+
+	sheets = {}
+	for i in range(len(sequences)):
+		tiles = [(rendered[title_file_ref(clip)], f"{clip["ref"]} ({clip["duration_full"]}s)") for clip in sequences[i]]
+		sheets[f"{PREVIEWS_DIR}/sequence_{i:03}.png"] = contact_sheet(tiles, tile_size)
+	return sheets
+
+# Creates a project's previews folder, deleting contact sheets of sequences that no longer exist.
+#
+# projdir: The directory of the project.
+# files: The files about to be written, by path relative to projdir.
+def remove_stale_previews(projdir: str, files: dict[str, bytes]):
+	previews_dir = os.path.join(projdir, PREVIEWS_DIR)
+	os.makedirs(previews_dir, exist_ok=True)
+
+	for filename in os.listdir(previews_dir):
+		if (filename.startswith("sequence_") and not(f"{PREVIEWS_DIR}/{filename}" in files)):
+			os.remove(os.path.join(previews_dir, filename))
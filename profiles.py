@@ -0,0 +1,123 @@
+import math
+
+from constants import *
+
+
+#
+# Output Profiles
+#
+# A profile holds every setting that changes with the output resolution or framerate, keyed by
+# the name of the constant it replaces. Settings a profile does not give are taken from
+# constants.py. TEXT_SCALE multiplies every text size and pixel modifier, so the same script
+# keeps its proportions at higher resolutions.
+#
+# A loaded profile also carries the timing and style settings, so that everything affecting the
+# output is passed around as one dictionary rather than read from constants.py.
+#
+
+PROFILES = {
+	"1080p60": {
+		"PROFILE_NAME": "atsc_1080p_60",
+		"PROFILE_DESCRIPTION": "HD 1080p 60 fps",
+		"RES_WIDTH": 1920,
+		"RES_HEIGHT": 1080,
+		"FRAMERATE": 60
+	},
+	"2160p30": {
+		"PROFILE_NAME": "uhd_2160p_30",
+		"PROFILE_DESCRIPTION": "UHD 2160p 30 fps",
+		"RES_WIDTH": 3840,
+		"RES_HEIGHT": 2160,
+		"FRAMERATE": 30,
+		"MAX_CONTENT_WIDTH": 2880,
+		"Y_CENTER": 1720,
+		"TEXT_SCALE": 2
+	},
+	"vertical1080p60": {
+		"PROFILE_NAME": "vertical_1080p_60",
+		"PROFILE_DESCRIPTION": "Vertical HD 1080p 60 fps",
+		"RES_WIDTH": 1080,
+		"RES_HEIGHT": 1920,
+		"FRAMERATE": 60,
+		"MAX_CONTENT_WIDTH": 920,
+		"Y_CENTER": 1500
+	}
+}
+
+# Gets the full settings of a profile.
+#
+# name: The name of a profile in PROFILES. If blank, the settings in constants.py are used as-is.
+# overrides: Settings to use instead of those of the profile, keyed by constant name. Text sizes
+# given here are scaled like the ones in constants.py.
+#
+# Returns a dictionary of settings, or None if there is no profile with the given name or an
+# override is not a setting.
+def load_profile(name: str = "", overrides: dict | None = None) -> dict | None:
+	if (name != "" and not(name in PROFILES)):
+		return None
+
+	profile = {
+		"PROFILE_NAME": PROFILE_NAME,
+		"PROFILE_DESCRIPTION": PROFILE_DESCRIPTION,
+		"RES_WIDTH": RES_WIDTH,
+		"RES_HEIGHT": RES_HEIGHT,
+		"FRAMERATE": FRAMERATE,
+		"MAX_CONTENT_WIDTH": MAX_CONTENT_WIDTH,
+		"Y_CENTER": Y_CENTER,
+		"TEXT_MEASUREMENT": TEXT_MEASUREMENT,
+		"TEXT_SCALE": 1,
+		"READ_SPEED": READ_SPEED,
+		"TITLE_DURATION": TITLE_DURATION,
+		"SECTION_DURATION": SECTION_DURATION,
+		"SECTION_GAP": SECTION_GAP,
+		"CONTENT_GAP": CONTENT_GAP,
+		"TITLE_FADE_DURATION": TITLE_FADE_DURATION,
+		"FADE_DURATION": FADE_DURATION,
+		"FONT_NAME": FONT_NAME,
+		"FONT_COLOR": FONT_COLOR,
+		"FONT_OUTLINE_COLOR": FONT_OUTLINE_COLOR,
+		"FONT_WEIGHT": FONT_WEIGHT,
+		"SUBTITLE_FONT_COLOR": SUBTITLE_FONT_COLOR,
+		"SUPERTITLE_FONT_COLOR": SUPERTITLE_FONT_COLOR,
+		"SUBSUPER_FONT_WEIGHT": SUBSUPER_FONT_WEIGHT,
+		"MAX_SEQUENCE_CLIPS": MAX_SEQUENCE_CLIPS,
+		"MAX_SEQUENCE_DURATION": MAX_SEQUENCE_DURATION
+	}
+	if (name != ""):
+		profile.update(PROFILES[name])
+
+	text_sizes = {
+		"FONT_SIZE": FONT_SIZE,
+		"SECTION_FONT_SIZE": SECTION_FONT_SIZE,
+		"TITLE_FONT_SIZE": TITLE_FONT_SIZE,
+		"SUBTITLE_FONT_SIZE": SUBTITLE_FONT_SIZE,
+		"SUPERTITLE_FONT_SIZE": SUPERTITLE_FONT_SIZE,
+		"TITLE_GAP": TITLE_GAP,
+		"FONT_OUTLINE_THICK": FONT_OUTLINE_THICK
+	}
+
+	if (overrides != None):
+		for key in overrides:
+			if not(key in profile or key in text_sizes):
+				return None
+			if (key in text_sizes):
+				text_sizes[key] = overrides[key]
+			else:
+				profile[key] = overrides[key]
+
+	# Scale text sizes
+	for key, value in text_sizes.items():
+		profile[key] = round(value * profile["TEXT_SCALE"])
+
+	# Display aspect ratio, e.g. 16:9
+	aspect_gcd = math.gcd(profile["RES_WIDTH"], profile["RES_HEIGHT"])
+	profile["DISPLAY_ASPECT"] = (profile["RES_WIDTH"] // aspect_gcd, profile["RES_HEIGHT"] // aspect_gcd)
+
+	return profile
+
+# Scales a pixel value given in a script modifier to a profile.
+#
+# value: The value of the modifier.
+# profile: The profile from load_profile.
+def scale_to_profile(value: int, profile: dict) -> int:
+	return round(value * profile["TEXT_SCALE"])
@@ -1,6 +1,6 @@
 
 from lxml import etree
-import os, re, sys, json
+import os, re, sys, json, uuid, hashlib
 
 from helpers import *
 from constants import *
@@ -16,6 +16,18 @@ def id_to_seqclip_pair(clipid: str) -> [int, int]:
 	return (int(m[1]), int(m[2]))
 
 
+# Checks whether any title clip producer of a project is used by more than one clip in its
+# timelines, as happens when the project was created with deduplicated titles.
+#
+# ptree: The root ElementTree containing the entire project.
+def project_has_shared_titles(ptree) -> bool:
+	used = set()
+	for entry in ptree.xpath("/mlt/playlist[@id!='main_bin']/entry[contains(@producer, 'seq') and contains(@producer, '_clip')]"):
+		if (entry.get("producer") in used):
+			return True
+		used.add(entry.get("producer"))
+	return False
+
 
 # Adjusts the items in the playlist pl so that it matches the updated layout.
 #
@@ -29,9 +41,17 @@ def id_to_seqclip_pair(clipid: str) -> [int, int]:
 # base_id: The next free unique numeric ID, minus one.
 # num_to_add: The amount of clips to add.
 # num_to_delete: The amount of clips to delete. num_to_delete is 0 iff num_to_add is not 0.
+# titles: The title files by relative path. If not given, new titles are read from the project
+# directory.
+# inline_titles: Whether or not new titles are stored inside their producers. Requires titles.
+# uuid_namespace: If given, the UUIDs of new producers are derived from this namespace.
+# profile: The output profile of the project.
 #
 # Returns the total duration of the new playlist.
-def modify_playlist(pl, ptree, projfile: str, producer_durs: dict, seq_layout: list[dict], seq_idx: int, found: int, base_id: int, num_to_add: int, num_to_delete: int) -> float:
+def modify_playlist(pl, ptree, projfile: str, producer_durs: dict, seq_layout: list[dict], seq_idx: int, found: int, base_id: int, num_to_add: int, num_to_delete: int, titles: dict[str, bytes] | None = None, inline_titles: bool = False, uuid_namespace: uuid.UUID | None = None, profile: dict | None = None) -> float:
+	if (profile == None):
+		profile = load_profile()
+
 	# Track the new length of the sequence.
 	this_len = 0.0
 
@@ -48,6 +68,7 @@ def modify_playlist(pl, ptree, projfile: str, producer_durs: dict, seq_layout: l
 		# Create and add each producer to the tree & playlist
 		for i in range(num_to_add):
 			clip_data = seq_layout[found + i + 1]
+			title_data = titles[f"titles/{title_file_ref(clip_data)}.kdenlivetitle"] if titles != None else None
 
 			# Generate Producer XML
 			producer_str = title_to_producer(
@@ -56,7 +77,11 @@ def modify_playlist(pl, ptree, projfile: str, producer_durs: dict, seq_layout: l
 				folder_id = folder_id,
 				clip_id = (base_id + 1) + i,
 				producer_id = found + i + 1,
-				seq_id = seq_idx
+				seq_id = seq_idx,
+				file_hash = hashlib.md5(title_data).hexdigest() if title_data != None else "",
+				title_xml = title_data.decode() if inline_titles else "",
+				uuid_namespace = uuid_namespace,
+				profile = profile
 			)
 
 			# Add the producer to the tree
@@ -86,11 +111,11 @@ def modify_playlist(pl, ptree, projfile: str, producer_durs: dict, seq_layout: l
 				pl_id = found + i + 1,
 				unique_id = (base_id + 1) + i,
 				duration = clip_data["duration_time"],
-				fade_dur = FADE_DURATION
+				fade_dur = profile["FADE_DURATION"]
 			)
 
 			# Get blank length
-			blank_len = CONTENT_GAP
+			blank_len = profile["CONTENT_GAP"]
 			if ("before_pause" in clip_data["modifiers"]):
 				blank_len = clip_data["modifiers"]["before_pause"]
 
@@ -114,19 +139,19 @@ def modify_playlist(pl, ptree, projfile: str, producer_durs: dict, seq_layout: l
 
 		# Adjust fades
 		# Fade-out filter
-		pl[i].find("filter[@in]").set("in", seconds_to_timestamp(durations["out"] - FADE_DURATION))
+		pl[i].find("filter[@in]").set("in", seconds_to_timestamp(durations["out"] - profile["FADE_DURATION"]))
 		pl[i].find("filter[@in]").set("out", seconds_to_timestamp(durations["out"]))
 		# Fade-in filter
-		pl[i].xpath("filter[not(@in)]")[0].set("out", seconds_to_timestamp(FADE_DURATION))
+		pl[i].xpath("filter[not(@in)]")[0].set("out", seconds_to_timestamp(profile["FADE_DURATION"]))
 
 		this_len += durations["full"]
 		if (i > 0):
 			# Additionally handle and adjust gap before
-			gap_size = CONTENT_GAP
+			gap_size = profile["CONTENT_GAP"]
 			if ("before_pause" in seq_layout[i // 2]["modifiers"]):
 				gap_size = seq_layout[i // 2]["modifiers"]["before_pause"]
 			elif (i <= 2):
-				gap_size = SECTION_GAP
+				gap_size = profile["SECTION_GAP"]
 
 			pl[i - 1].set("length", seconds_to_timestamp(gap_size))
 			this_len += gap_size
@@ -159,9 +184,10 @@ def modify_playlist(pl, ptree, projfile: str, producer_durs: dict, seq_layout: l
 #
 # seq_trac: The sequence tractor to modify
 # baseline_len: The length of the title clip track of the sequence.
+# framerate: The framerate of the project.
 #
 # Returns the new length of the sequence.
-def modify_sequence_tractor(seq_trac, ptree, baseline_len: float) -> float:
+def modify_sequence_tractor(seq_trac, ptree, baseline_len: float, framerate: int = FRAMERATE) -> float:
 	# First, find the longest track length. This is the length of the entire sequence.
 	longest_len = baseline_len
 	track_ids = seq_trac.xpath("track[position() > 1]/@producer")
@@ -175,14 +201,14 @@ def modify_sequence_tractor(seq_trac, ptree, baseline_len: float) -> float:
 	longest_len = r3(longest_len)
 
 	# Set this sequence's length everywhere it's used.
-	seq_trac.set("out", seconds_to_timestamp(longest_len - 1 / FRAMERATE))
+	seq_trac.set("out", seconds_to_timestamp(longest_len - 1 / framerate))
 	seq_trac.find("property[@name='kdenlive:duration']").text = seconds_to_timestamp(longest_len)
-	seq_trac.find("property[@name='kdenlive:maxduration']").text = str(seconds_to_frames(longest_len))
-	seq_trac.find("property[@name='kdenlive:sequenceproperties.zoneout']").text = str(seconds_to_frames(longest_len))
+	seq_trac.find("property[@name='kdenlive:maxduration']").text = str(seconds_to_frames(longest_len, framerate))
+	seq_trac.find("property[@name='kdenlive:sequenceproperties.zoneout']").text = str(seconds_to_frames(longest_len, framerate))
 
 	# Adjust the entry in main_bin.
 	main_bin_entry = ptree.xpath(f"/mlt/playlist[@id='main_bin']/entry[@producer='{seq_trac.get("id")}']")[0]
-	main_bin_entry.set("out", seconds_to_timestamp(longest_len - 1 / FRAMERATE))
+	main_bin_entry.set("out", seconds_to_timestamp(longest_len - 1 / framerate))
 
 	pdb(f"New Length of Sequence {seq_trac.get("id")} Calculated: {longest_len}\n")
 
@@ -190,25 +216,59 @@ def modify_sequence_tractor(seq_trac, ptree, baseline_len: float) -> float:
 
 
 
+# Replaces the title stored inside a title clip producer. If the producer refers to a title file
+# instead, it is converted to store the title itself.
+#
+# producer: The title clip producer to modify.
+# title_xml: The new contents of the title.
+def set_producer_title_xml(producer, title_xml: str):
+	xmldata = producer.find("property[@name='xmldata']")
+	if (xmldata == None):
+		# Replace the placeholder "xml" property, which is where kdenlive keeps xmldata.
+		xmldata = producer.find("property[@name='xml']")
+		if (xmldata == None):
+			xmldata = etree.SubElement(producer, "property")
+		xmldata.set("name", "xmldata")
+
+	xmldata.text = title_xml
+	producer.find("property[@name='resource']").text = None
+	producer.find("property[@name='kdenlive:file_hash']").text = hashlib.md5(title_xml.encode()).hexdigest()
+
+
+
 # Attempts to adjust the title clip tracks inside the given kdenlive project file
 # so that they match the layout seen in the given layout.json file.
 #
 # - projfile: The .kdenlive project document to modify
 # - layoutfile: A layout.json file generated by tgen.py.
+# - layout: The title clip data returned by clip_data_to_titleclips. Used instead of reading
+#   layoutfile if given.
+# - titles: The title files by relative path. If not given, new titles are read from the
+#   directory of projfile, which they must already be written to.
+# - inline_titles: Whether or not titles are stored inside their producers instead of referring
+#   to the title files. Requires titles.
+# - uuid_namespace: If given, the UUIDs of new producers are derived from this namespace.
+# - profile: The output profile the layout was created for. Defaults to the settings in
+#   constants.py.
 #
 # Returns one of the following error codes based on what happened:
 # - 0: OK
 # - 1: Failed to read layout.json (layoutfile is invalid)
 # - 2: Failed to read project.kdenlive (projfile is invalid)
+# - 3: The layout needs a different number of sequences than the project has
+# - 4: The project was created with deduplicated titles, so its clips share producers
 #
-def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
+def adjust_titles_in_place(projfile: str, layoutfile: str, layout: list[dict] | None = None, titles: dict[str, bytes] | None = None, inline_titles: bool = False, uuid_namespace: uuid.UUID | None = None, profile: dict | None = None) -> int:
+	if (profile == None):
+		profile = load_profile()
+
 	# Read layout data into memory if possible
-	layout = []
-	try:
-		with open(layoutfile, "r") as layout_json:
-			layout = layout_to_sequences(json.loads(layout_json.read()))
-	except:
-		return 1
+	if (layout == None):
+		try:
+			with open(layoutfile, "r") as layout_json:
+				layout = json.loads(layout_json.read())
+		except:
+			return 1
 
 	# Open the project file
 	ptree = None
@@ -216,6 +276,71 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 		# Create an XML Element Tree for the project
 		ptree = etree.parse(projfile_text)
 
+	result = adjust_title_tree(ptree, projfile, layout, titles, inline_titles, uuid_namespace, profile)
+	if (result != 0):
+		return result
+
+	pdb(f"Modifications Complete! Saving...\n")
+
+	# Save to file.
+	with open(projfile, "w") as projfile_out:
+		projfile_out.write(etree.tostring(ptree, pretty_print=True).decode())
+
+	return 0
+
+# Checks whether a project can be adjusted in place to fit a script, before any of its title clips
+# are rewritten. Sequences are split by clip count and duration, which are known from the clip
+# data alone.
+#
+# - projfile: The path of the project file.
+# - cd: The clip data returned by parse_file.
+# - profile: The output profile the project is adjusted for. Defaults to the settings in
+#   constants.py.
+#
+# Returns 0 if the project can be adjusted, or 3 or 4 as adjust_titles_in_place would.
+def check_project_fits(projfile: str, cd: list[dict], profile: dict | None = None) -> int:
+	if (profile == None):
+		profile = load_profile()
+
+	with open(projfile, "r") as projfile_text:
+		ptree = etree.parse(projfile_text)
+
+	if (project_has_shared_titles(ptree)):
+		return 4
+
+	# Only the fields used to split sections are needed.
+	layout = [{
+		"ref": "section" if clip["type"] == "section" else clip["type"],
+		"duration_full": r3(clip["duration"]),
+		"modifiers": clip["modifiers"]
+	} for clip in cd]
+	if (len(title_playlists(ptree)) != len(layout_to_sequences(layout, profile=profile))):
+		return 3
+
+	return 0
+
+# Gets the playlists holding the title clips of each sequence in a project. Even though kdenlive
+# removes the original playlist names, the entry names are untouched, so as long as the first item
+# in a title track is a title clip, its playlist can be found.
+#
+# - ptree: The element tree of the project.
+def title_playlists(ptree) -> list:
+	return ptree.xpath("/mlt/playlist[@id!='main_bin']/entry[contains(@producer, 'seq') and contains(@producer, '_clip')]/..")
+
+# Adjusts the title clip tracks of a parsed project in place so that they match a layout.
+# See adjust_titles_in_place.
+#
+# - ptree: The element tree of the project.
+# - projfile: The path of the project file. Only its directory is used, to refer to title files.
+# - layout: The title clip data returned by clip_data_to_titleclips.
+# - titles, inline_titles, uuid_namespace: See adjust_titles_in_place.
+# - profile: The output profile the layout was created for.
+#
+# Returns 0 if the project was adjusted, 3 if the layout needs a different number of sequences
+# than the project has, or 4 if its clips share producers.
+def adjust_title_tree(ptree, projfile: str, layout: list[dict], titles: dict[str, bytes] | None, inline_titles: bool, uuid_namespace: uuid.UUID | None, profile: dict) -> int:
+	layout = layout_to_sequences(layout, profile=profile)
+
 	pdb("Getting Title Clip Producers...")
 
 	# First, find all producers of format seq*_clip*. These are title clips whose times
@@ -225,6 +350,11 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 	# Additionally get the corresponding <entry> in main_bin.
 	tc_entries = ptree.xpath("/mlt/playlist[@id='main_bin']/entry[contains(@producer, 'seq') and contains(@producer, '_clip')]")
 
+	# Adjusting clips in place assumes one producer per clip. Projects created with deduplicated
+	# titles use a producer for several clips, whatever flags they are retitled with now.
+	if (project_has_shared_titles(ptree)):
+		return 4
+
 
 
 	# Keep track of a few values before we go through our producer.
@@ -265,12 +395,16 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 
 		# Additionally set a few more properties for the producer.
 		# kdenlive:duration_frames
-		tc_producers[i].xpath("property[@name='kdenlive:duration_frames']")[0].text = frames_to_timestamp(clip_data["duration_frames"])
+		tc_producers[i].xpath("property[@name='kdenlive:duration_frames']")[0].text = frames_to_timestamp(clip_data["duration_frames"], profile["FRAMERATE"])
 		# kdenlive:duration
 		tc_producers[i].xpath("property[@name='kdenlive:duration']")[0].text = seconds_to_timestamp(clip_data["duration_full"])
 		# length
 		tc_producers[i].xpath("property[@name='length']")[0].text = str(clip_data["duration_frames"])
 
+		# Update the title itself if it is stored inside the producer
+		if (inline_titles):
+			set_producer_title_xml(tc_producers[i], titles[f"titles/{title_file_ref(clip_data)}.kdenlivetitle"].decode())
+
 		# Record Duration
 		producer_durs[tc_producers[i].get("id")] = {
 			"out": clip_data["duration_time"],
@@ -302,11 +436,12 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 				base_id = int(id_prop.text)
 
 	# Now we must adjust our playlists. To do this, we must first find every playlist which
-	# has our sequences. Even though kdenlive removes the original playlist names, we can still
-	# access them as the entry names are untouched.
-	# Therefore, as long as the first item in the title track is a title clip, we can find
-	# the correct playlist.
-	seq_plays = ptree.xpath("/mlt/playlist[@id!='main_bin']/entry[contains(@producer, 'seq') and contains(@producer, '_clip')]/..")
+	# has our sequences.
+	seq_plays = title_playlists(ptree)
+
+	# New sequences cannot be added in place, e.g. when a section grows past MAX_SEQUENCE_CLIPS.
+	if (len(seq_plays) != len(layout)):
+		return 3
 
 	# Index of the main sequence in seq_plays. This sequence needs to be processed last.
 	main_seq_idx = -1
@@ -346,14 +481,18 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 			found = found[seq_idx],
 			base_id = base_id,
 			num_to_add = to_add[seq_idx] if seq_idx in to_add else 0,
-			num_to_delete = to_delete[seq_idx] if seq_idx in to_delete else 0
+			num_to_delete = to_delete[seq_idx] if seq_idx in to_delete else 0,
+			titles = titles,
+			inline_titles = inline_titles,
+			uuid_namespace = uuid_namespace,
+			profile = profile
 		)
 
 		base_id += to_add[seq_idx] if seq_idx in to_add else 0
 
 
 		# Modify the tractor containing this playlist.
-		merge_trac.set("out", seconds_to_timestamp(this_len - 1 / FRAMERATE))
+		merge_trac.set("out", seconds_to_timestamp(this_len - 1 / profile["FRAMERATE"]))
 
 		# Modify the sequence tractor containing the prior tractor. Set its length to be the
 		# length of the longest track.
@@ -363,13 +502,14 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 			seq_trac = seq_trac,
 			baseline_len = this_len,
 			ptree = ptree,
+			framerate = profile["FRAMERATE"]
 		)
 
 		# Save the sequence length for later, using the UUID of the sequence for ease of
 		# access.
 		seq_times[seq_trac.get("id")] = {
 			"len": longest_len,
-			"before_gap": layout[seq_idx][0]["modifiers"]["before_pause"] if "before_pause" in layout[seq_idx][0]["modifiers"] else SECTION_GAP
+			"before_gap": layout[seq_idx][0]["modifiers"]["before_pause"] if "before_pause" in layout[seq_idx][0]["modifiers"] else profile["SECTION_GAP"]
 		}
 
 		pdb(f"Corresponding Sequence Regenerated.\n")
@@ -393,7 +533,11 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 		found = found[0],
 		base_id = base_id,
 		num_to_add = to_add[0] if 0 in to_add else 0,
-		num_to_delete = to_delete[0] if 0 in to_delete else 0
+		num_to_delete = to_delete[0] if 0 in to_delete else 0,
+		titles = titles,
+		inline_titles = inline_titles,
+		uuid_namespace = uuid_namespace,
+		profile = profile
 	)
 
 	# Now adjust the rest of each playlist.
@@ -419,16 +563,17 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 
 	# With both playlists set, modify BOTH corresponding tractors.
 	main_v_trac = ptree.xpath(f"/mlt/tractor/track[@producer='{mpl_v.get("id")}']/..")[0]
-	main_v_trac.set("out", seconds_to_timestamp(main_len_full - 1 / FRAMERATE))
+	main_v_trac.set("out", seconds_to_timestamp(main_len_full - 1 / profile["FRAMERATE"]))
 	main_a_trac = ptree.xpath(f"/mlt/tractor/track[@producer='{mpl_a.get("id")}']/..")[0]
-	main_a_trac.set("out", seconds_to_timestamp(main_len_full - 1 / FRAMERATE))
+	main_a_trac.set("out", seconds_to_timestamp(main_len_full - 1 / profile["FRAMERATE"]))
 
 	# Modify the sequence tractor.
 	main_seq_trac = ptree.xpath(f"/mlt/tractor/track[@producer='{main_v_trac.get("id")}']/..")[0]
 	main_seq_len = modify_sequence_tractor(
 		seq_trac = main_seq_trac,
 		baseline_len = main_len_full,
-		ptree = ptree
+		ptree = ptree,
+		framerate = profile["FRAMERATE"]
 	)
 
 	# Finally, modify the project tractor.
@@ -436,11 +581,5 @@ def adjust_titles_in_place(projfile: str, layoutfile: str) -> int:
 	proj_trac.set("out", seconds_to_timestamp(main_seq_len))
 	proj_trac.find("track").set("out", seconds_to_timestamp(main_seq_len))
 
-	pdb(f"Modifications Complete! Saving...\n")
-
-	# Save to file.
-	with open(projfile, "w") as projfile_out:
-		projfile_out.write(etree.tostring(ptree, pretty_print=True).decode())
-
 	return 0
 
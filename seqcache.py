@@ -0,0 +1,139 @@
+import os, json, uuid, hashlib
+
+from constants import *
+from helpers import *
+from writer import *
+
+
+#
+# Sequence Fragment Cache
+#
+# Each sequence created by titleclips_to_kdenlive is stored on disk under a key derived from
+# everything that affects its XML. When a project is rebuilt, unchanged sequences are spliced
+# in from the cache instead of being generated again.
+#
+
+# Placeholder stored in place of the document UUID, which changes on every rebuild.
+MAIN_UUID_PLACEHOLDER = "{@main_uuid@}"
+
+# Gets the directory the sequence cache of a project is stored in.
+def sequence_cache_dir(projdir: str) -> str:
+	return os.path.join(projdir, ".cache", "sequences")
+
+# Computes the md5 hash of every title file used by a sequence.
+#
+# sequence: A single sequence from the list created by layout_to_sequences.
+# projdir: The directory of the project.
+# files: The project's files by relative path, if they are held in memory instead of on disk.
+#
+# Returns a list of hashes in the same order as the sequence.
+def sequence_title_hashes(sequence: list[dict], projdir: str, files: dict[str, bytes] | None = None) -> list[str]:
+	hashes = []
+	for clip in sequence:
+		if (files != None):
+			hashes.append(hashlib.md5(files[f"titles/{title_file_ref(clip)}.kdenlivetitle"]).hexdigest())
+			continue
+
+		with open(os.path.join(projdir, "titles", f"{title_file_ref(clip)}.kdenlivetitle"), "rb") as title_file:
+			hashes.append(hashlib.md5(title_file.read()).hexdigest())
+	return hashes
+
+# Gets the title XML of every clip in a sequence from a dictionary of in-memory files.
+#
+# sequence: A single sequence from the list created by layout_to_sequences.
+# files: The project's files by relative path.
+#
+# Returns a list of title XML strings in the same order as the sequence.
+def sequence_title_xmls(sequence: list[dict], files: dict[str, bytes]) -> list[str]:
+	return [files[f"titles/{title_file_ref(clip)}.kdenlivetitle"].decode() for clip in sequence]
+
+# Computes the cache key of a sequence.
+#
+# seq_idx: The index of the sequence.
+# sequence: A single sequence from the list created by layout_to_sequences.
+# start_id: The first free unique numeric ID the sequence will use.
+# folder_obj: The project bin folder the sequence's titles are placed in.
+# sequence_folder: The ID of the project bin folder the sequence itself is placed in.
+# title_hashes: The hashes of the sequence's title files, from sequence_title_hashes.
+# inline_titles: Whether or not the title XML is stored inside the producers.
+# shared_producers: The producers created by earlier sequences when titles are deduplicated, as
+# passed to create_sequence. None if titles are not deduplicated.
+# uuid_namespace: The namespace UUIDs are derived from, or None if they are random.
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+#
+# Returns the key as a hex string.
+def sequence_cache_key(seq_idx: int, sequence: list[dict], start_id: int, folder_obj: dict, sequence_folder: int, title_hashes: list[str], inline_titles: bool = False, shared_producers: dict | None = None, uuid_namespace: uuid.UUID | None = None, profile: dict | None = None) -> str:
+	if (profile == None):
+		profile = load_profile()
+
+	# Only the shared producers this sequence can refer to affect its XML
+	if (shared_producers != None):
+		shared_producers = {title_file_ref(clip): shared_producers.get(title_file_ref(clip)) for clip in sequence}
+
+	key_data = {
+		"inline": inline_titles,
+		"uuid_namespace": str(uuid_namespace) if uuid_namespace != None else None,
+		"shared": shared_producers,
+		"seq_idx": seq_idx,
+		"layout": sequence,
+		"start_id": start_id,
+		"folder": folder_obj,
+		"sequence_folder": sequence_folder,
+		"titles": title_hashes,
+		"profile": profile
+	}
+	return hashlib.md5(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+# Attempts to load a cached sequence.
+#
+# projdir: The directory of the project.
+# key: The cache key of the sequence.
+# main_uuid: The UUID of the document the sequence will be placed in.
+#
+# Returns the same tuple as create_sequence, or None if the sequence is not cached.
+def load_cached_sequence(projdir: str, key: str, main_uuid: str) -> tuple[str, int, dict] | None:
+	try:
+		with open(os.path.join(sequence_cache_dir(projdir), f"{key}.json"), "r") as cache_file:
+			cached = json.loads(cache_file.read())
+	except (OSError, ValueError):
+		return None
+
+	pdb(f"Sequence cache hit: {key}")
+
+	return (cached["xml"].replace(MAIN_UUID_PLACEHOLDER, f"{{{main_uuid}}}"), cached["next_id"], cached["entry"])
+
+# Stores a sequence created by create_sequence in the cache.
+#
+# projdir: The directory of the project.
+# key: The cache key of the sequence.
+# main_uuid: The UUID of the document the sequence was created for.
+# seq_out, next_id, seq_entry: The values returned by create_sequence.
+# writer: The writer from start_writer to queue the entry in. If None, it is written immediately.
+def store_cached_sequence(projdir: str, key: str, main_uuid: str, seq_out: str, next_id: int, seq_entry: dict, writer: dict | None = None):
+	cache_dir = sequence_cache_dir(projdir)
+	os.makedirs(cache_dir, exist_ok=True)
+
+	cached = {
+		"xml": seq_out.replace(f"{{{main_uuid}}}", MAIN_UUID_PLACEHOLDER),
+		"next_id": next_id,
+		"entry": {**seq_entry, "uuid": str(seq_entry["uuid"])}
+	}
+
+	# Write to a temporary file first so an interrupted run never leaves a partial entry.
+	if (writer != None):
+		queue_write(writer, os.path.join(cache_dir, f"{key}.json"), json.dumps(cached).encode(), write_file_atomic)
+	else:
+		write_file_atomic(json.dumps(cached).encode(), os.path.join(cache_dir, f"{key}.json"))
+
+# Deletes every cached sequence that was not used in the latest build.
+#
+# projdir: The directory of the project.
+# used_keys: The keys of all sequences in the latest build.
+def prune_sequence_cache(projdir: str, used_keys: set[str]):
+	cache_dir = sequence_cache_dir(projdir)
+	if not os.path.isdir(cache_dir):
+		return
+
+	for filename in os.listdir(cache_dir):
+		if filename.removesuffix(".json") not in used_keys:
+			os.remove(os.path.join(cache_dir, filename))
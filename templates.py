@@ -1,12 +1,123 @@
+import string, operator, functools
+
 from constants import *
 
 #
 # A series of template Macros for various XML data.
 #
+# Fragments written for every clip are compiled once, with compile_template, into a format string
+# of their constant segments and typed slots. Slots that only depend on the style of a clip (its
+# font, colors, size, the resolution, etc.) can be bound with bind_template, which folds them
+# into the constant segments once per distinct style, so rendering a clip only fills in the clip's
+# own values.
+#
+# Slots are written as {name:d} for integers, {name:s} for strings and {name:b} for bytes, or
+# {name} for any other value. Literal braces are doubled, as with str.format. Templates compiled
+# with encoded set have their constant segments encoded once and render to bytes, and only take
+# integer and bytes slots.
+#
+
+# The conversion of each slot type, and the kinds of template (encoded or not) it can be used in.
+slot_conversions = {
+	"": ("%s", [False]),
+	"s": ("%s", [False]),
+	"d": ("%d", [False, True]),
+	"b": ("%b", [True])
+}
+
+# Compiles a template.
+#
+# name: The name of the template, for error messages.
+# source: The text of the template, with its slots.
+# encoded: Whether or not the template renders to bytes instead of a string.
+#
+# Returns the template as a dictionary.
+def compile_template(name: str, source: str, encoded: bool = False) -> dict:
+	segments = [""]
+	slots = []
+	for literal, field, spec, conversion in string.Formatter().parse(source):
+		segments[-1] += literal
+		if (field == None):
+			continue
+		if (not(spec in slot_conversions) or conversion != None or not(encoded in slot_conversions[spec][1])):
+			raise ValueError(f"Unsupported slot \"{field}:{spec}\" in template {name}.")
+		slots.append((field, spec))
+		segments.append("")
+
+	return make_template(name, segments, slots, encoded)
+
+# Builds a template dictionary from its constant segments and the slots between them. Used by
+# compile_template and bind_template.
+def make_template(name: str, segments: list[str], slots: list[tuple[str, str]], encoded: bool) -> dict:
+	pattern = segments[0].replace("%", "%%")
+	for i in range(len(slots)):
+		pattern += slot_conversions[slots[i][1]][0] + segments[i + 1].replace("%", "%%")
+
+	# Gets the tuple of slot values from the values given by name
+	fields = [field for field, spec in slots]
+	if (len(fields) == 0):
+		get_values = lambda values: ()
+	elif (len(fields) == 1):
+		get_values = lambda values: (values[fields[0]],)
+	else:
+		get_values = operator.itemgetter(*fields)
+
+	template = {
+		"name": name,
+		"segments": segments,
+		"slots": slots,
+		"encoded": encoded,
+		"pattern": pattern.encode() if encoded else pattern,
+		"get_values": get_values
+	}
+	# Binds this template from a tuple of bound values, keeping the most recently used bindings
+	template["bind"] = functools.lru_cache(maxsize=TEMPLATE_BINDINGS_MAX)(lambda key: fold_template(template, dict(key)))
+	return template
+
+# Folds the given slots of a template into its constant segments. The result is interned, so each
+# distinct set of values (such as a style) is only bound once while it is among the
+# TEMPLATE_BINDINGS_MAX most recently used. Bytes slots can be bound to strings, which are encoded.
+#
+# template: The template from compile_template or bind_template.
+# values: The value of each slot to bind, by slot name.
+#
+# Returns the bound template.
+def bind_template(template: dict, **values) -> dict:
+	return template["bind"](tuple(values.items()))
+
+# Folds the given slots of a template into its constant segments, without interning the result.
+# See bind_template.
+def fold_template(template: dict, values: dict) -> dict:
+	segments = [template["segments"][0]]
+	slots = []
+	for i in range(len(template["slots"])):
+		field, spec = template["slots"][i]
+		if (field in values):
+			value = values[field]
+			if (spec == "d"):
+				value = "%d" % value
+			elif (isinstance(value, bytes)):
+				value = value.decode()
+			segments[-1] += str(value) + template["segments"][i + 1]
+		else:
+			slots.append((field, spec))
+			segments.append(template["segments"][i + 1])
+
+	return make_template(template["name"], segments, slots, template["encoded"])
+
+# Renders a template.
+#
+# template: The template from compile_template or bind_template.
+# values: The value of each remaining slot, by slot name.
+#
+# Returns the rendered string, or bytes if the template is encoded.
+def render_template(template: dict, **values) -> str | bytes:
+	return template["pattern"] % template["get_values"](values)
+
+
 
 # Title Clip Producer
-def template_TITLE_PRODUCER(seq_id: int, clip_id: int, out: str, length: str, titlepath: str, duration: str, duration_frames: str, folder_id: int, unique_id: int, uuid: str, file_hash: str) -> str:
-	return f"""<producer id="seq{seq_id}_clip{clip_id}" in="00:00:00.000" out="{out}">
+TITLE_PRODUCER = compile_template("TITLE_PRODUCER", """<producer id="seq{seq_id}_clip{clip_id}" in="00:00:00.000" out="{out}">
 	<property name="length">{length}</property>
 	<property name="eof">pause</property>
 	<property name="resource">{titlepath}</property>
@@ -23,18 +134,52 @@ def template_TITLE_PRODUCER(seq_id: int, clip_id: int, out: str, length: str, ti
 	<property name="kdenlive:clip_type">2</property>
 	<property name="kdenlive:file_hash">{file_hash}</property>
 	<property name="force_reload">0</property>
-	<property name="meta.media.width">{RES_WIDTH}</property>
-	<property name="meta.media.height">{RES_HEIGHT}</property>
+	<property name="meta.media.width">{width}</property>
+	<property name="meta.media.height">{height}</property>
+	<property name="kdenlive:monitorPosition">0</property>
+</producer>\n""")
+
+def template_TITLE_PRODUCER(seq_id: int, clip_id: int, out: str, length: str, titlepath: str, duration: str, duration_frames: str, folder_id: int, unique_id: int, uuid: str, file_hash: str, width: int = RES_WIDTH, height: int = RES_HEIGHT) -> str:
+	return render_template(bind_template(TITLE_PRODUCER, width=width, height=height), seq_id=seq_id, clip_id=clip_id, out=out, length=length, titlepath=titlepath, duration=duration, duration_frames=duration_frames, folder_id=folder_id, unique_id=unique_id, uuid=uuid, file_hash=file_hash)
+
+
+
+# Title Clip Producer with the title XML stored in the producer itself.
+# xmldata must already be escaped for use as XML text.
+INLINE_TITLE_PRODUCER = compile_template("INLINE_TITLE_PRODUCER", """<producer id="seq{seq_id}_clip{clip_id}" in="00:00:00.000" out="{out}">
+	<property name="length">{length}</property>
+	<property name="eof">pause</property>
+	<property name="resource"/>
+	<property name="meta.media.progressive">1</property>
+	<property name="aspect_ratio">1</property>
+	<property name="seekable">1</property>
+	<property name="mlt_service">kdenlivetitle</property>
+	<property name="kdenlive:duration">{duration}</property>
+	<property name="kdenlive:duration_frames">{duration_frames}</property>
+	<property name="kdenlive:clipname">{clipname}</property>
+	<property name="xmldata">{xmldata}</property>
+	<property name="kdenlive:folderid">{folder_id}</property>
+	<property name="kdenlive:id">{unique_id}</property>
+	<property name="kdenlive:control_uuid">{uuid}</property>
+	<property name="kdenlive:clip_type">2</property>
+	<property name="kdenlive:file_hash">{file_hash}</property>
+	<property name="force_reload">0</property>
+	<property name="meta.media.width">{width}</property>
+	<property name="meta.media.height">{height}</property>
 	<property name="kdenlive:monitorPosition">0</property>
-</producer>\n"""
+</producer>\n""")
+
+def template_INLINE_TITLE_PRODUCER(seq_id: int, clip_id: int, out: str, length: str, clipname: str, xmldata: str, duration: str, duration_frames: str, folder_id: int, unique_id: int, uuid: str, file_hash: str, width: int = RES_WIDTH, height: int = RES_HEIGHT) -> str:
+	return render_template(bind_template(INLINE_TITLE_PRODUCER, width=width, height=height), seq_id=seq_id, clip_id=clip_id, out=out, length=length, clipname=clipname, xmldata=xmldata, duration=duration, duration_frames=duration_frames, folder_id=folder_id, unique_id=unique_id, uuid=uuid, file_hash=file_hash)
 
 
 
 # Playlist Clip Entry
-def template_PLAYLIST_ENTRY(seq_idx: int, pl_idx: int, unique_id: int, entry_out: str, fadein_out: str, fadeout_in: str) -> str:
-	return f"""	<entry in="00:00:00.000" out="{entry_out}" producer="seq{seq_idx}_clip{pl_idx}">
+# clip names the clip's filters, and producer is the producer it plays (usually the same).
+PLAYLIST_ENTRY = compile_template("PLAYLIST_ENTRY", """	<entry in="00:00:00.000" out="{entry_out}" producer="{producer}">
 		<property name="kdenlive:id">{unique_id}</property>
-		<filter id="seq{seq_idx}_clip{pl_idx}_fadein" out="{fadein_out}">
+
+		<filter id="{clip}_fadein" out="{fadein_out}">
 			<property name="start">1</property>
 			<property name="level">1</property>
 			<property name="mlt_service">brightness</property>
@@ -42,7 +187,7 @@ def template_PLAYLIST_ENTRY(seq_idx: int, pl_idx: int, unique_id: int, entry_out
 			<property name="alpha">00:00:00.000=0;{fadein_out}=1</property>
 			<property name="kdenlive:collapsed">0</property>
 		</filter>
-		<filter id="seq{seq_idx}_clip{pl_idx}_fadeout" in="{fadeout_in}" out="{entry_out}">
+		<filter id="{clip}_fadeout" in="{fadeout_in}" out="{entry_out}">
 			<property name="start">1</property>
 			<property name="level">1</property>
 			<property name="mlt_service">brightness</property>
@@ -50,16 +195,44 @@ def template_PLAYLIST_ENTRY(seq_idx: int, pl_idx: int, unique_id: int, entry_out
 			<property name="alpha">00:00:00.000=1;{fadein_out}=0</property>
 			<property name="kdenlive:collapsed">0</property>
 		</filter>
-	</entry>\n"""
+	</entry>\n""")
+
+def template_PLAYLIST_ENTRY(seq_idx: int, pl_idx: int, unique_id: int, entry_out: str, fadein_out: str, fadeout_in: str) -> str:
+	return render_template(bind_template(PLAYLIST_ENTRY, fadein_out=fadein_out), entry_out=entry_out, producer=f"seq{seq_idx}_clip{pl_idx}", clip=f"seq{seq_idx}_clip{pl_idx}", unique_id=unique_id, fadeout_in=fadeout_in)
 
 
 
 # Playlist Blank
+PLAYLIST_BLANK = compile_template("PLAYLIST_BLANK", """<blank length="{duration}"/>\n""")
+
 def template_PLAYLIST_BLANK(duration: str):
-	return f"""<blank length="{duration}"/>\n"""
+	return render_template(PLAYLIST_BLANK, duration=duration)
 
 
 
 # main_bin entry
+MAIN_BIN_ENTRY = compile_template("MAIN_BIN_ENTRY", """<entry in="00:00:00.000" out="{duration}" producer="{producer}"/>\n""")
+
 def template_MAIN_BIN_ENTRY(duration: str, producer: str):
-	return f"""<entry in="00:00:00.000" out="{duration}" producer="{producer}"/>\n"""
+	return render_template(MAIN_BIN_ENTRY, duration=duration, producer=producer)
+
+
+
+# Text item of a title clip
+TITLE_ITEM_SOURCE = """ <item type="QGraphicsTextItem" z-index="{z_index:d}">
+  <position x="{x:d}" y="{y:d}">
+   <transform>1,0,0,0,1,0,0,0,1</transform>
+  </position>
+  <content alignment="4" box-height="{box_height:d}" box-width="{box_width:d}" font="{font:b}" font-color="{color:b}" font-italic="0" font-outline="{outline_width:d}" font-outline-color="{outline_color:b}" font-pixel-size="{font_size:d}" font-underline="0" font-weight="{font_weight:d}" letter-spacing="0" line-spacing="0" shadow="1;#80000000;4;0;4" tab-width="80" typewriter="0;2;1;0;0">{content:b}</content>
+ </item>\n"""
+
+TITLE_ITEM = compile_template("TITLE_ITEM", TITLE_ITEM_SOURCE, encoded=True)
+
+
+
+# Title clip (.kdenlivetitle), with its main text item last. items holds any other text items,
+# rendered with TITLE_ITEM.
+TITLE_CLIP = compile_template("TITLE_CLIP", """<kdenlivetitle LC_NUMERIC="C" duration_frames="{duration_frames:d}" height="{height:d}" out="{duration_frames:d}" width="{width:d}">\n""" + "{items:b}" + TITLE_ITEM_SOURCE + """ <startviewport rect="0,0,{width:d},{height:d}"/>
+ <endviewport rect="0,0,{width:d},{height:d}"/>
+ <background color="0,0,0,0"/>
+</kdenlivetitle>""", encoded=True)
@@ -0,0 +1,44 @@
+import uuid
+
+from helpers import title_file_ref
+
+
+#
+# Test Layouts
+#
+# Layouts are built by hand, as clip_data_to_titleclips would create them, so that projects can
+# be generated in tests without the fonts needed to lay titles out.
+#
+
+# Namespace for the UUIDs of test projects, so that they are identical between runs.
+TEST_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "kdenlive-title-gen:tests")
+
+# Creates a title clip entry as saved in layout.json.
+#
+# ref: The name of the clip, e.g. "title", "section_1" or "content_s1_c2".
+# duration: The duration of the clip in seconds.
+# title_ref: The clip whose title file this clip shares, if titles are deduplicated.
+# framerate: The framerate of the project.
+def layout_entry(ref: str, duration: float = 2.0, title_ref: str | None = None, framerate: int = 60) -> dict:
+	entry = {
+		"duration_frames": round(duration * framerate),
+		"duration_full": round(duration, 3),
+		"duration_time": round(duration - 1.0 / framerate, 3),
+		"modifiers": {},
+		"ref": ref
+	}
+	if (title_ref != None):
+		entry["title_ref"] = title_ref
+	return entry
+
+# Creates a placeholder title file for each clip of a layout that has a file of its own.
+#
+# layout: The layout, as created by layout_entry.
+#
+# Returns the title files by path relative to the project directory.
+def layout_titles(layout: list[dict]) -> dict[str, bytes]:
+	titles = {}
+	for entry in layout:
+		if (not("title_ref" in entry)):
+			titles[f"titles/{title_file_ref(entry)}.kdenlivetitle"] = f"<kdenlivetitle><!-- {title_file_ref(entry)} --></kdenlivetitle>".encode()
+	return titles
@@ -0,0 +1,67 @@
+import hashlib, pytest
+from lxml import etree
+
+import api
+from retitle import check_project_fits
+from layouts import *
+
+
+# Creates a project from a layout with the API.
+def create_layout_project(layout: list[dict], projdir: str) -> bytes:
+	return api.create_project(layout, layout_titles(layout), projdir, api.load_settings(), uuid_namespace=TEST_NAMESPACE)
+
+# Gets the producer of a title clip from a project.
+def find_producer(project: bytes, producer_id: str):
+	return etree.fromstring(project).find(f"producer[@id='{producer_id}']")
+
+LAYOUT = [
+	layout_entry("title", 6.0),
+	layout_entry("section_1", 3.0),
+	layout_entry("content_s1_c1")
+]
+
+def test_retitle_adds_file_titles_before_they_are_written(tmp_path):
+	# Nothing is written to the project directory, so the new title only exists in memory.
+	project = create_layout_project(LAYOUT, str(tmp_path))
+	layout = LAYOUT + [layout_entry("content_s1_c2", 3.0)]
+	titles = layout_titles(layout)
+
+	retitled = api.retitle_project(project, layout, titles, str(tmp_path), inline_titles=False, uuid_namespace=TEST_NAMESPACE)
+
+	producer = find_producer(retitled, "seq1_clip2")
+	assert producer.find("property[@name='resource']").text == "titles/content_s1_c2.kdenlivetitle"
+	assert producer.find("property[@name='xmldata']") == None
+	assert producer.find("property[@name='kdenlive:file_hash']").text == hashlib.md5(titles["titles/content_s1_c2.kdenlivetitle"]).hexdigest()
+	assert list(tmp_path.iterdir()) == []
+
+def test_retitle_adds_inline_titles(tmp_path):
+	project = create_layout_project(LAYOUT, str(tmp_path))
+	layout = LAYOUT + [layout_entry("content_s1_c2", 3.0)]
+	titles = layout_titles(layout)
+
+	retitled = api.retitle_project(project, layout, titles, str(tmp_path), inline_titles=True, uuid_namespace=TEST_NAMESPACE)
+
+	producer = find_producer(retitled, "seq1_clip2")
+	assert producer.find("property[@name='xmldata']").text == titles["titles/content_s1_c2.kdenlivetitle"].decode()
+
+def test_retitle_refuses_deduplicated_projects(tmp_path):
+	layout = LAYOUT + [layout_entry("content_s1_c2", title_ref="content_s1_c1")]
+	project = api.create_project(layout, layout_titles(layout), str(tmp_path), api.load_settings(), dedupe=True, uuid_namespace=TEST_NAMESPACE)
+
+	with pytest.raises(api.TitleGenError):
+		api.retitle_project(project, layout, layout_titles(layout), str(tmp_path), uuid_namespace=TEST_NAMESPACE)
+
+def test_check_project_fits_counts_sequences_before_retitling(tmp_path):
+	project_path = tmp_path / "project.kdenlive"
+	project_path.write_bytes(create_layout_project(LAYOUT, str(tmp_path)))
+	script = "---\ntitle: Title\n---\n\n## Section\n\nSome content.\n"
+
+	assert check_project_fits(str(project_path), api.parse_script(script)) == 0
+	assert check_project_fits(str(project_path), api.parse_script(script + "\n## Another Section\n\nMore content.\n")) == 3
+
+def test_create_titles_reports_missing_fonts():
+	settings = api.load_settings("", {"FONT_NAME": "NoSuchFontForTests", "TEXT_MEASUREMENT": "metrics"})
+	clips = api.parse_script("---\ntitle: Title\n---\n\nSome content.\n", settings)
+
+	with pytest.raises(api.TitleGenError, match="NoSuchFontForTests"):
+		api.create_titles(clips, settings)
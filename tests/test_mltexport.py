@@ -0,0 +1,69 @@
+import json
+
+from layouts import *
+from mltexport import export_parts
+from tgen import titleclips_to_kdenlive
+
+
+# Generates a project in memory and exports its parts.
+def export_layout(layout: list[dict], dedupe_titles: bool) -> dict[str, bytes]:
+	files = layout_titles(layout)
+	titleclips_to_kdenlive("/tmp/project", layout=layout, files=files, cache=False, dedupe_titles=dedupe_titles, uuid_namespace=TEST_NAMESPACE)
+	return export_parts(files["project.kdenlive"])
+
+def test_export_parts_splits_sequences():
+	layout = [
+		layout_entry("title", 6.0),
+		layout_entry("section_1", 3.0),
+		layout_entry("content_s1_c1"),
+		layout_entry("section_2", 3.0),
+		layout_entry("content_s2_c1")
+	]
+	manifest = json.loads(export_layout(layout, False)["parts/manifest.json"])
+
+	assert [part["sequence"] for part in manifest["parts"]] == ["Main", "Sequence 1", "Sequence 2"]
+	assert sum(part["frames"] for part in manifest["parts"]) == manifest["frames"]
+
+def test_export_parts_with_deduplicated_titles():
+	# The main sequence's content clip matches a clip of the first section, so with deduplicated
+	# titles both are placed from a single producer named after one of the sequences.
+	layout = [
+		layout_entry("title", 6.0),
+		layout_entry("content_s0_c1"),
+		layout_entry("section_1", 3.0),
+		layout_entry("content_s1_c1", title_ref="content_s0_c1"),
+		layout_entry("section_2", 3.0),
+		layout_entry("content_s2_c1")
+	]
+	files = export_layout(layout, True)
+	manifest = json.loads(files["parts/manifest.json"])
+
+	assert [part["sequence"] for part in manifest["parts"]] == ["Main", "Sequence 1", "Sequence 2"]
+	assert [part["file"] for part in manifest["parts"]] == ["part_000.mlt", "part_001.mlt", "part_002.mlt"]
+	assert files["parts/concat.txt"] == b"file 'part_000.mp4'\nfile 'part_001.mp4'\nfile 'part_002.mp4'\n"
+
+	# The main part holds the title, the gap after it, the shared content clip and the gap
+	# before Sequence 1.
+	assert manifest["parts"][0]["frames"] == (6 + 2 + 2 + 2) * 60
+
+def test_export_parts_with_merged_scripts():
+	# Each script has a title and one sequence. The second script's title follows the first
+	# script's sequence in the main sequence.
+	parts = []
+	files = {}
+	for name in ["first", "second"]:
+		layout = [
+			{**layout_entry("title", 6.0), "title_dir": name},
+			{**layout_entry("section_1", 3.0), "title_dir": name},
+			{**layout_entry("content_s1_c1"), "title_dir": name}
+		]
+		parts.append({"name": name, "layout": layout})
+		files.update(layout_titles(layout))
+	titleclips_to_kdenlive("/tmp/project", files=files, cache=False, uuid_namespace=TEST_NAMESPACE, parts=parts)
+	manifest = json.loads(export_parts(files["project.kdenlive"])["parts/manifest.json"])
+
+	assert [part["sequence"] for part in manifest["parts"]] == ["Main", "Sequence 1", "Main", "Sequence 2"]
+	assert sum(part["frames"] for part in manifest["parts"]) == manifest["frames"]
+
+	# The second title is a part of its own, padded with the gap before the second sequence.
+	assert manifest["parts"][2]["frames"] == (6 + 2) * 60
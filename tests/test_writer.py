@@ -0,0 +1,27 @@
+import pytest
+
+from helpers import TitleGenError
+from writer import *
+
+
+def test_failed_writes_are_reported(tmp_path):
+	writer = start_writer(threads=2)
+	queue_write(writer, str(tmp_path / "missing" / "a.kdenlivetitle"), b"data")
+	# Not bytes, so the write raises TypeError rather than OSError
+	queue_write(writer, str(tmp_path / "b.kdenlivetitle"), "data")
+
+	errors = stop_writer(writer)
+	assert len(errors) >= 1
+
+	with pytest.raises(TitleGenError, match="Could not write"):
+		raise_write_errors(errors)
+
+def test_flush_survives_unexpected_errors(tmp_path):
+	writer = start_writer(threads=1)
+	queue_write(writer, str(tmp_path / "a.kdenlivetitle"), "data")
+	queue_write(writer, str(tmp_path / "b.kdenlivetitle"), b"data")
+
+	# Every item is marked done even though the first write raised, so this returns.
+	errors = flush_writer(writer)
+	assert [type(err) for path, err in errors] == [TypeError]
+	stop_writer(writer)
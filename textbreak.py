@@ -0,0 +1,224 @@
+import os, pathlib, platform, threading
+
+from constants import *
+from helpers import *
+from fontmetrics import *
+
+# Pillow is only needed to measure text with FreeType. Without it, text is measured with the
+# font metrics packs.
+try:
+	from PIL import ImageFont
+except ImportError:
+	ImageFont = None
+
+
+#
+# Text Measurement
+#
+# Content is broken into lines that fit MAX_CONTENT_WIDTH by measuring it in its font, either
+# with FreeType through Pillow or from the font's metrics pack (see fontmetrics.py). This module
+# does not depend on the rest of the generator, so scripts can be checked without it.
+#
+
+# Check if any string in broken_text exceeds max_width given a measuring function.
+# Used as a helper for break_text_by_font_width. Single words cannot be broken any further, so
+# they are never reported.
+#
+# broken_text: A list of strings to perform width checks on.
+# max_width: The maximum width that the text can be, in pixels.
+# measure: A function returning the widths of a list of strings, from get_text_measurer.
+#
+# Returns the index of the first line that exceeds max_width, or -1 if no line does so.
+def none_exceed_max_width(broken_text: list[str], max_width: int, measure) -> int:
+	widths = measure(broken_text)
+	for i in range(len(widths)):
+		if (widths[i] > max_width and " " in broken_text[i]):
+			return i
+	return -1
+
+# Fonts, loaded font faces and line breaks found so far. These are kept for the whole run so
+# that every profile and every repeated line reuses the same measurements. Font faces are not
+# safe to use from several threads at once, so measuring holds font_lock.
+system_font_paths = {}
+loaded_fonts = {}
+line_breaks = {}
+font_lock = threading.Lock()
+
+# Attempts to get the given font from the system's installed fonts.
+#
+# font: The name of the font.
+#
+# Returns the path of the font if it was found, otherwise returns a blank string.
+def get_system_font(font: str):
+	if (font in system_font_paths):
+		return system_font_paths[font]
+
+	# Get OS to find directories with installed fonts
+	paths = []
+	os_name = platform.system()
+	if (os_name == "Windows"):
+		paths = ["C:\\Windows\\fonts"]
+	elif (os_name == "Darwin"):
+		HOME = str(pathlib.Path.home())
+		paths = ["/Library/Fonts/", "/System/Library/Fonts/", f"{HOME}/Library/Fonts/"]
+	else:
+		if (os_name != "Linux"):
+			pwrn("Unsupported OS, font finder may fail.")
+		HOME = str(pathlib.Path.home())
+		paths = [f"{HOME}/.local/share/fonts/", "/usr/local/share/fonts", "/usr/share/fonts"]
+
+	# Find font
+	font_path = ""
+	font_found = False
+	pdb(f"Finding Font {font}")
+	for font_dir in paths:
+		for path, subdirs, filenames in os.walk(font_dir):
+			for filename in filenames:
+				if (font.lower() in filename.lower()):
+					font_path = os.path.join(path, filename)
+					font_found = True
+					break
+			if font_found:
+				break
+		if font_found:
+			break
+
+	pdb(f"Path for font {font}: {font_path}")
+
+	system_font_paths[font] = font_path
+	return font_path
+
+# Finds what text in a font is measured with: the font file for the FreeType backend, or the
+# font's metrics pack.
+#
+# font: The name of the font.
+# font_size: The size of the font in pixels.
+# backend: The measurement backend, as in TEXT_MEASUREMENT.
+#
+# Returns the path of the font file or metrics pack, or a blank string if neither was found.
+def find_font_source(font: str, font_size: int, backend: str = "auto") -> str:
+	if (backend != "metrics" and ImageFont != None):
+		font_path = get_system_font(font)
+		if (font_path != "" or backend == "freetype"):
+			return font_path
+	elif (backend == "freetype"):
+		return ""
+
+	return find_metrics_pack(font, font_size)
+
+# Gets a function measuring the widths of a batch of strings. Must be called with font_lock held,
+# and the function must only be called with it held.
+#
+# source: The path from find_font_source.
+# font_size: The size of the font in pixels.
+#
+# Returns the function, or None if the font or pack could not be loaded.
+def get_text_measurer(source: str, font_size: int):
+	if (source.endswith(PACK_EXTENSION)):
+		pack = load_metrics_pack(source)
+		if (pack == None):
+			return None
+		return lambda strings: measure_with_pack(pack, strings, font_size)
+
+	ifont = loaded_fonts.get((source, font_size))
+	if (ifont == None):
+		try:
+			ifont = ImageFont.truetype(source, font_size)
+		except OSError:
+			try:
+				ifont = ImageFont.load(source, font_size)
+			except:
+				return None
+		loaded_fonts[(source, font_size)] = ifont
+	return lambda strings: [ifont.getlength(text) for text in strings]
+
+# Measures the widths of a batch of strings in a font.
+#
+# strings: The strings to measure.
+# font: The name of the font.
+# font_size: The size of the font in pixels.
+# backend: The measurement backend, as in TEXT_MEASUREMENT.
+#
+# Returns the width of each string in pixels, or None if the font could not be found.
+def measure_text_widths(strings: list[str], font: str, font_size: int, backend: str = "auto") -> list[float] | None:
+	source = find_font_source(font, font_size, backend)
+	if (source == ""):
+		return None
+
+	with font_lock:
+		measure = get_text_measurer(source, font_size)
+		if (measure == None):
+			return None
+		return measure(strings)
+
+# Splits a string of text so that, given a font and size, the text does not
+# exceed max_width pixels in width.
+#
+# text: The text content to split
+# font: The name of the font to load. Must be a valid TTF/OTF font in the OS's default font
+# directory, or have a metrics pack in FONT_METRICS_DIR.
+# font_size: The size of the font in pixels.
+# max_width: The maximum width that the text can be, in pixels.
+# backend: The measurement backend, as in TEXT_MEASUREMENT.
+#
+# Returns an empty list if an error occurred.
+def break_text_by_font_width(text: str, font: str, font_size: int, max_width: int, backend: str = "auto") -> list[str]:
+	# Attempt to find the font
+	source = find_font_source(font, font_size, backend)
+	if (source == ""):
+		return []
+
+	if ((text, source, font_size, max_width) in line_breaks):
+		return list(line_breaks[(text, source, font_size, max_width)])
+
+	with font_lock:
+		measure = get_text_measurer(source, font_size)
+		if (measure == None):
+			return []
+		broken_text = break_text_with_measurer(text, measure, max_width)
+
+	line_breaks[(text, source, font_size, max_width)] = list(broken_text)
+	return broken_text
+
+# Does the work of break_text_by_font_width once the font has been loaded. Must be called with
+# font_lock held.
+#
+# measure: The function from get_text_measurer.
+def break_text_with_measurer(text: str, measure, max_width: int) -> list[str]:
+	broken_text = [text]
+
+	long_idx = none_exceed_max_width(broken_text, max_width, measure)
+
+	while long_idx >= 0:
+		# Binary search the long text until an optimal split point is found
+		space_split_line = broken_text[long_idx].split(" ")
+
+		l = 0
+		r = len(space_split_line) - 1
+
+		while (l <= r):
+			i = (r + l) // 2
+
+			split_width = measure([" ".join(space_split_line[:i])])[0]
+
+			if (split_width > max_width):
+				r = i - 1
+			else:
+				l = i + 1
+
+		split_point = l
+		if (measure([" ".join(space_split_line[:split_point])])[0] > max_width):
+			split_point = r
+
+		# A word wider than max_width cannot be split, so it is left on a line of its own.
+		if (split_point == 0):
+			split_point = 1
+
+		# Split line at that point
+		broken_text.insert(long_idx + 1, " ".join(space_split_line[split_point:]))
+		broken_text[long_idx] = " ".join(space_split_line[:split_point])
+
+		# Recheck widths
+		long_idx = none_exceed_max_width(broken_text, max_width, measure)
+
+	return broken_text
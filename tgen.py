@@ -5,75 +5,33 @@
 from constants import *
 from templates import *
 from helpers import *
-from retitle import adjust_titles_in_place
+from retitle import adjust_titles_in_place, check_project_fits
+from seqcache import *
+from titlecache import *
+from mltexport import *
+from textbreak import *
+from writer import *
+from mdparse import *
+from journal import *
+import check
 
 #
 # IMPORTS
 #
 
-from PIL import ImageFont
-import os, sys, json, math, time, uuid, hashlib, pathlib, platform
+# Pillow is only needed to measure text with FreeType and to render previews.
+if (ImageFont != None):
+	from preview import *
+
+import io, os, sys, json, time, uuid, hashlib, tarfile, concurrent.futures
 
 CFG_FILE = ""
 CFG_PROJDIR = ""
 
-#
-# Internal Vars
-#
-
-errors = {
-	"general": "General Error",
-	"dp": "Markdown Parsing Error",
-	"cp": "Command Parsing Error",
-	"mp": "Modifier Parsing Error",
-	"tc": "Title Clip Conversion Error",
-	"pf": "Project Creation Error"
-}
-
-commands = {
-	"pause": [
-		["float;0-"]
-	],
-	"ignore": [
-		[]
-	]
-}
-
-modifiers = {
-	"color": [
-		["int;0-255","int;0-255","int;0-255"],
-		["int;0-255","int;0-255","int;0-255","int;0-255"]
-	],
-	"font": [
-		["string"]
-	],
-	"font_size": [
-		["int;1-2147483647"]
-	],
-	"outline_color": [
-		["int;0-255","int;0-255","int;0-255"],
-		["int;0-255","int;0-255","int;0-255","int;0-255"]
-	],
-	"outline_width": [
-		["int;0-2147483647"]
-	],
-	"y": [
-		["int"]
-	]
-}
-
 #
 # UTILITY FUNCTIONS
 #
 
-# general helpers
-
-# Prints the given error with the given error key.
-def print_error(error_key: str, msg: str):
-	print(f"{errors[error_key]}: {msg}")
-
-
-
 # titleclips_to_kdenlive Helpers
 
 # Creates the XML for three blank tracks, two audio and one video.
@@ -162,6 +120,14 @@ def prepare_sequence_blanks(seq_idx: int, audio_track_count: int = 2):
 # folder_obj: A dictionary that stores the ID, Name, and Parent ID of a project bin folder.
 # projdir: The directory the outputted kdenlive file will be stored in.
 # main_uuid: The UUID of the document.
+# title_hashes: The md5 hashes of the sequence's title files, if already known.
+# title_xmls: The contents of the sequence's title files, if they are to be stored inside the producers.
+# shared_producers: If titles are deduplicated, the producers created so far as a dictionary of
+# [producer ID, numeric ID] pairs keyed by title file ref. Clips whose title already has a
+# producer refer to it instead of creating their own. Updated in place.
+# uuid_namespace: If given, the sequence's UUIDs are derived from this namespace and its contents.
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+# sequence_folder: The ID of the project bin folder the sequence itself is placed in.
 #
 # Returns a tuple with three elements.
 # The first is the XML for the given sequence.
@@ -171,59 +137,57 @@ def prepare_sequence_blanks(seq_idx: int, audio_track_count: int = 2):
 #   "id": The numeric ID of the sequence's tractor
 #   "seq_dur": The duration of the sequence in seconds.
 #   "before_pause": The duration of the gap before the section.
-def create_sequence(seq_idx: int, sequence: list[dict], start_id: int, folder_obj: dict, projdir: str, main_uuid: str) -> tuple[str, int, dict]:
+#   "shared_producers": The producers this sequence added to shared_producers.
+def create_sequence(seq_idx: int, sequence: list[dict], start_id: int, folder_obj: dict, projdir: str, main_uuid: str, title_hashes: list[str] | None = None, title_xmls: list[str] | None = None, shared_producers: dict | None = None, uuid_namespace: uuid.UUID | None = None, profile: dict | None = None, sequence_folder: int = 1) -> tuple[str, int, dict]:
+	if (profile == None):
+		profile = load_profile()
+
 	out = ""
 
 	# Add blank video producer
 	out += prepare_sequence_blanks(seq_idx)
 
 	# Add all producers from title tracks
+	entry_producers, new_producers = assign_title_producers(seq_idx, sequence, start_id, shared_producers)
 	for i in range(len(sequence)):
-		out += title_to_producer(title_obj=sequence[i], projdir=projdir, folder_id=folder_obj["id"], clip_id=(start_id + i), producer_id=i, seq_id=seq_idx)
+		if (entry_producers[i][0] != f"seq{seq_idx}_clip{i}"):
+			continue
+		out += title_to_producer(title_obj=sequence[i], projdir=projdir, folder_id=folder_obj["id"], clip_id=(start_id + i), producer_id=i, seq_id=seq_idx, file_hash=(title_hashes[i] if title_hashes else ""), title_xml=(title_xmls[i] if title_xmls else ""), uuid_namespace=uuid_namespace, profile=profile)
+
+	# Form the playlist. The fades and gaps are the same for every clip.
+	entry_template = bind_template(PLAYLIST_ENTRY, fadein_out=seconds_to_timestamp(profile["FADE_DURATION"]))
+	section_blank = template_PLAYLIST_BLANK(seconds_to_timestamp(profile["SECTION_GAP"]))
+	content_blank = template_PLAYLIST_BLANK(seconds_to_timestamp(profile["CONTENT_GAP"]))
 
-	# Form the playlist
 	sequence_len: float = 0.0
 	out += f"""<playlist id="seq{seq_idx}_v2b1">\n"""
 	for i in range(len(sequence)):
 		# Add entry
-		out += f"""	<entry in="00:00:00.000" out="{seconds_to_timestamp(sequence[i]["duration_time"])}" producer="seq{seq_idx}_clip{i}">
-		<property name="kdenlive:id">{start_id + i}</property>
-
-		<filter id="seq{seq_idx}_clip{i}_fadein" out="{seconds_to_timestamp(FADE_DURATION)}">
-			<property name="start">1</property>
-			<property name="level">1</property>
-			<property name="mlt_service">brightness</property>
-			<property name="kdenlive_id">fade_from_black</property>
-			<property name="alpha">00:00:00.000=0;{seconds_to_timestamp(FADE_DURATION)}=1</property>
-			<property name="kdenlive:collapsed">0</property>
-		</filter>
-		<filter id="seq{seq_idx}_clip{i}_fadeout" in="{seconds_to_timestamp(sequence[i]["duration_time"] - FADE_DURATION)}" out="{seconds_to_timestamp(sequence[i]["duration_time"])}">
-			<property name="start">1</property>
-			<property name="level">1</property>
-			<property name="mlt_service">brightness</property>
-			<property name="kdenlive_id">fade_to_black</property>
-			<property name="alpha">00:00:00.000=1;{seconds_to_timestamp(FADE_DURATION)}=0</property>
-			<property name="kdenlive:collapsed">0</property>
-		</filter>
-	</entry>\n"""
+		out += render_template(entry_template,
+			entry_out = seconds_to_timestamp(sequence[i]["duration_time"]),
+			producer = entry_producers[i][0],
+			unique_id = entry_producers[i][1],
+			clip = f"seq{seq_idx}_clip{i}",
+			fadeout_in = seconds_to_timestamp(sequence[i]["duration_time"] - profile["FADE_DURATION"])
+		)
 		sequence_len += sequence[i]["duration_full"]
 
 		# Add blank
 		if (i < len(sequence) - 1):
 			if ("before_pause" in sequence[i + 1]["modifiers"]):
-				out += f"""<blank length="{seconds_to_timestamp(sequence[i + 1]["modifiers"]["before_pause"])}"/>\n"""
+				out += template_PLAYLIST_BLANK(seconds_to_timestamp(sequence[i + 1]["modifiers"]["before_pause"]))
 				sequence_len += sequence[i + 1]["modifiers"]["before_pause"]
 			elif (i == 0):
-				out += f"""<blank length="{seconds_to_timestamp(SECTION_GAP)}"/>\n"""
-				sequence_len += SECTION_GAP
+				out += section_blank
+				sequence_len += profile["SECTION_GAP"]
 			else:
-				out += f"""<blank length="{seconds_to_timestamp(CONTENT_GAP)}"/>\n"""
-				sequence_len += CONTENT_GAP
+				out += content_blank
+				sequence_len += profile["CONTENT_GAP"]
 
 	# Add final playlist and track tractor
 	out += f"""</playlist>
 <playlist id="seq{seq_idx}_v2b2"/>
-<tractor id="seq{seq_idx}_tractor3" in="00:00:00.000" out="{seconds_to_timestamp(sequence_len - (1 / FRAMERATE))}">
+<tractor id="seq{seq_idx}_tractor3" in="00:00:00.000" out="{seconds_to_timestamp(sequence_len - (1 / profile["FRAMERATE"]))}">
 	<property name="kdenlive:trackheight">67</property>
 	<property name="kdenlive:timeline_active">1</property>
 	<property name="kdenlive:thumbs_format"/>
@@ -235,22 +199,23 @@ def create_sequence(seq_idx: int, sequence: list[dict], start_id: int, folder_ob
 
 	# Create Sequence Tractor
 	# Get UUID and Hash
-	sequence_uuid = uuid.uuid4()
+	sequence_contents = hashlib.md5(json.dumps([sequence, title_hashes], sort_keys=True).encode()).hexdigest()
+	sequence_uuid = make_uuid(uuid_namespace, f"sequence/{seq_idx}/{sequence_contents}")
 	sequence_hash = hashlib.md5(f"{{{sequence_uuid}}}".encode()).hexdigest()
 
 	# Create
-	out += f"""<tractor id="{{{sequence_uuid}}}" in="00:00:00.000" out="{seconds_to_timestamp(sequence_len - (1 / FRAMERATE))}">
+	out += f"""<tractor id="{{{sequence_uuid}}}" in="00:00:00.000" out="{seconds_to_timestamp(sequence_len - (1 / profile["FRAMERATE"]))}">
 	<property name="kdenlive:duration">{seconds_to_timestamp(sequence_len)}</property>
-	<property name="kdenlive:maxduration">{seconds_to_frames(sequence_len)}</property>
+	<property name="kdenlive:maxduration">{seconds_to_frames(sequence_len, profile["FRAMERATE"])}</property>
 	<property name="kdenlive:clipname">Sequence {seq_idx}</property>
 	<property name="kdenlive:description"/>
 	<property name="kdenlive:uuid">{{{sequence_uuid}}}</property>
 	<property name="kdenlive:producer_type">17</property>
-	<property name="kdenlive:control_uuid">{{{uuid.uuid4()}}}</property>
+	<property name="kdenlive:control_uuid">{{{make_uuid(uuid_namespace, f"control/{sequence_uuid}")}}}</property>
 	<property name="kdenlive:id">{start_id + len(sequence) + 1}</property>
 	<property name="kdenlive:clip_type">0</property>
 	<property name="kdenlive:file_hash">{sequence_hash}</property>
-	<property name="kdenlive:folderid">1</property>
+	<property name="kdenlive:folderid">{sequence_folder}</property>
 	<property name="kdenlive:sequenceproperties.activeTrack">2</property>
 	<property name="kdenlive:sequenceproperties.disablepreview">0</property>
 	<property name="kdenlive:sequenceproperties.documentuuid">{{{main_uuid}}}</property>
@@ -262,7 +227,7 @@ def create_sequence(seq_idx: int, sequence: list[dict], start_id: int, folder_ob
 	<property name="kdenlive:sequenceproperties.tracksCount">4</property>
 	<property name="kdenlive:sequenceproperties.verticalzoom">1</property>
 	<property name="kdenlive:sequenceproperties.zonein">0</property>
-	<property name="kdenlive:sequenceproperties.zoneout">{seconds_to_frames(sequence_len)}</property>
+	<property name="kdenlive:sequenceproperties.zoneout">{seconds_to_frames(sequence_len, profile["FRAMERATE"])}</property>
 	<property name="kdenlive:sequenceproperties.zoom">8</property>
 	<property name="kdenlive:sequenceproperties.groups">[
 	]
@@ -313,9 +278,37 @@ def create_sequence(seq_idx: int, sequence: list[dict], start_id: int, folder_ob
 		"uuid": sequence_uuid,
 		"id": start_id + len(sequence) + 1,
 		"seq_dur": sequence_len,
-		"before_pause": sequence[0]["modifiers"]["before_pause"] if "before_pause" in sequence[0]["modifiers"] else SECTION_GAP
+		"before_pause": sequence[0]["modifiers"]["before_pause"] if "before_pause" in sequence[0]["modifiers"] else profile["SECTION_GAP"],
+		"shared_producers": new_producers
 	})
 
+# Decides which producer each clip of a sequence plays.
+#
+# seq_idx: The index of the sequence.
+# sequence: A single sequence from the list created by layout_to_sequences.
+# start_id: The numeric ID of the first clip's producer.
+# shared_producers: The producers created so far if titles are deduplicated (see create_sequence),
+# or None. Updated in place.
+#
+# Returns a tuple with two elements. The first is a list of [producer ID, numeric ID] pairs, one
+# per clip. The second is a dictionary of the producers added to shared_producers.
+def assign_title_producers(seq_idx: int, sequence: list[dict], start_id: int, shared_producers: dict | None) -> tuple[list[list], dict]:
+	entry_producers = []
+	new_producers = {}
+	for i in range(len(sequence)):
+		own_producer = [f"seq{seq_idx}_clip{i}", start_id + i]
+		if (shared_producers == None):
+			entry_producers.append(own_producer)
+			continue
+
+		file_ref = title_file_ref(sequence[i])
+		if not(file_ref in shared_producers):
+			shared_producers[file_ref] = own_producer
+			new_producers[file_ref] = own_producer
+		entry_producers.append(shared_producers[file_ref])
+
+	return (entry_producers, new_producers)
+
 
 # clip_data_to_titleclips Helpers
 
@@ -338,363 +331,140 @@ def color_code_aopt(component_list: list[str]) -> str:
 	else:
 		raise ValueError
 
-# Check if any string in broken_text exceeds max_width given some font data.
-# Used as a helper for break_text_by_font_width.
-#
-# broken_text: A list of strings to perform width checks on.
-# max_width: The maximum width that the text can be, in pixels.
-# font: A PIL FreeTypeFont object that has font data.
-#
-# Returns the index of the first line that exceeds max_width, or -1 if no line does so.
-def none_exceed_max_width(broken_text: list[str], max_width: int, font) -> int:
-	for i in range(len(broken_text)):
-		width = font.getlength(broken_text[i])
-		if (width > max_width):
-			return i
-	return -1
-
-# Attempts to get the given font from the system's installed fonts.
-#
-# font: The name of the font.
-#
-# Returns the path of the font if it was found, otherwise returns a blank string.
-def get_system_font(font: str):
-	# Get OS to find directories with installed fonts
-	paths = []
-	os_name = platform.system()
-	if (os_name == "Windows"):
-		paths = ["C:\\Windows\\fonts"]
-	elif (os_name == "Darwin"):
-		HOME = str(pathlib.Path.home())
-		paths = ["/Library/Fonts/", "/System/Library/Fonts/", f"{HOME}/Library/Fonts/"]
-	else:
-		if (os_name != "Linux"):
-			pwrn("Unsupported OS, font finder may fail.")
-		HOME = str(pathlib.Path.home())
-		paths = [f"{HOME}/.local/share/fonts/", "/usr/local/share/fonts", "/usr/share/fonts"]
-
-	# Find font
-	font_path = ""
-	font_found = False
-	pdb(f"Finding Font {font}")
-	for font_dir in paths:
-		for path, subdirs, filenames in os.walk(font_dir):
-			for filename in filenames:
-				if (font.lower() in filename.lower()):
-					font_path = os.path.join(path, filename)
-					font_found = True
-					break
-			if font_found:
-				break
-		if font_found:
-			break
-
-	pdb(f"Path for font {font}: {font_path}")
-
-	return font_path
-
-# Splits a string of text so that, given a font and size, the text does not
-# exceed max_width pixels in width.
-#
-# text: The text content to split
-# font: The name of the font to load. Must be a valid TTF/OTF font in the OS's default font directory.
-# font_size: The size of the font in pixels.
-# max_width: The maximum width that the text can be, in pixels.
-#
-# Returns an empty list if an error occurred.
-def break_text_by_font_width(text: str, font: str, font_size: int, max_width: int) -> list[str]:
-	# Attempt to load font
-	font_path = get_system_font(font)
-	if (font_path == ""):
-		return []
-
-	ifont = None
-	try:
-		ifont = ImageFont.truetype(font_path, font_size)
-	except OSError:
-		try:
-			ifont = ImageFont.load(font_path, font_size)
-		except:
-			return []
-
-	broken_text = [text]
-
-	long_idx = none_exceed_max_width(broken_text, max_width, ifont)
-
-	while long_idx >= 0:
-		# Binary search the long text until an optimal split point is found
-		space_split_line = broken_text[long_idx].split(" ")
-
-		l = 0
-		r = len(space_split_line) - 1
-
-		while (l <= r):
-			i = (r + l) // 2
-
-			split_width = ifont.getlength(" ".join(space_split_line[:i]))
-
-			if (split_width > max_width):
-				r = i - 1
-			else:
-				l = i + 1
-
-		split_point = l
-		if (ifont.getlength(" ".join(space_split_line[:split_point])) > max_width):
-			split_point = r
-
-		# Split line at that point
-		broken_text.insert(long_idx + 1, " ".join(space_split_line[split_point:]))
-		broken_text[long_idx] = " ".join(space_split_line[:split_point])
-
-		# Recheck widths
-		long_idx = none_exceed_max_width(broken_text, max_width, ifont)
-
-	return broken_text
-
-
-# Checks a list of parameters for type validity based on the given keyword and corresponding
-# command definition.
 #
-# keyword: The keyword for a given command.
-# params: The list of parameters acquired from the command line, as a list of strings.
-# modifier: Whether or not to use the modifiers list. This ensures commands with modifier
-# keywords are not checked and vice versa.
+# WORKING FUNCTIONS
 #
-# Returns whether or not the given parameter list is a valid set for the given command.
-def check_paramlist_validity(keyword: str, params: list[str], modifier: bool = False) -> bool:
-	cmd_def_list = modifiers[keyword] if modifier else commands[keyword]
-	pdb(f"Checking if {params} valid")
-	for paramlist in cmd_def_list:
-		# Check if lengths are equal
-		pdb(f"Checking paramlist {paramlist} for match")
-		if (len(params) != len(paramlist)):
-			continue
 
-		# Go through each type in param list
-		bad_params = False
-		for i in range(len(paramlist)):
-			combined_type = paramlist[i]
-			# Split by restriction
-			split_type = combined_type.split(";")
-
-			pdb(f"Param {i} ({params[i]}) should be of type {split_type}")
-
-			# Get restriction on range of values if it exists
-			split_range = []
-			if (len(split_type) >= 2):
-				str_split_range = split_type[1].split("-")
-				# Add lower bound
-				split_range.append(int(str_split_range[0]))
-				# Add upper bound
-				if (len(str_split_range) > 0 and str_split_range[1] != ""):
-					split_range.append(int(str_split_range[1]))
-
-				pdb(f"type has Range LB/UB {split_range}")
-
-			# Check General Type
-			match split_type[0]:
-				case "int":
-					# Check if correct type
-					try:
-						int(params[i])
-					except ValueError:
-						bad_params = True
-						break
-					# Check if out of bounds
-					if (len(split_range) > 0):
-						if (int(params[i]) < split_range[0]):
-							bad_params = True
-							break
-						if (len(split_range) > 1):
-							if (int(params[i]) > split_range[1]):
-								bad_params = True
-								break
-				case "float":
-					# Check if correct type
-					try:
-						float(params[i])
-					except ValueError:
-						bad_params = True
-						break
-					# Check if out of bounds
-					if (len(split_range) > 0):
-						if (float(params[i]) < split_range[0]):
-							bad_params = True
-							break
-						if (len(split_range) > 1):
-							if (float(params[i]) > split_range[1]):
-								bad_params = True
-								break
-
-		if (bad_params):
-			continue
-
-		# Types valid and length valid, param list is therefore valid
-		return True
 
-	# No valid form found.
-	return False
+# Reads a kdenlive project file to convert tracks with titles to a readable and
+# modifiable JSON format.
+def kdenlive_to_titleclips(projfile):
+	pass
 
 
-# Parses a single command line.
-#
-# line: The entire command line to parse.
-#
-# Returns a tuple containing two elements. The first is the keyword of the command,
-# the second is a list of its parameters as a string.
-def parse_command(line: str) -> tuple[str, list[str]]:
-	# Check if command
-	if (line[0:3] != "-=-"):
-		return ("ERROR_NOT_COMMAND", [])
-
-	# Get parameter index
-	line = line.replace(" ", "")
-	param_i = line.find("(")
-	param_end_i = line.find(")")
-
-	# Check if no params
-	if (param_i == -1):
-		param_i = len(line)
-	elif (param_end_i == -1):
-		return ("ERROR_UNCLOSED_PARAMS", [])
-
-	# Get command keyword
-	keyword = line[3:param_i]
-
-	pdb(f"Parsing Command {keyword}")
-
-	if not(keyword in commands):
-		return ("ERROR_INVALID_COMMAND", [])
-
-	# Get command parameters (if present)
-	params = []
-	if (param_i != -1):
-		params = line[param_i + 1:param_end_i].split(";")
-		if (len(params) == 1 and len(params[0]) == 0):
-			params = []
-
-	# Check validity of params
-	params_valid = check_paramlist_validity(keyword, params)
-	if not(params_valid):
-		return (f"ERROR_PARAMVALID", [])
-
-	return (keyword, params)
-
-# Parses the given block for commands, ensuring only commands are present and that
-# all commands are valid.
-# Assumes that this block has already been determined to be a command block (i.e. contains
-# at least one command line).
+# Calculates the length of a script's clips in the main sequence, including the gaps between them.
 #
-# lines: The list of lines that form this command block.
-# line_num: The number of the first line of the command block in the markdown file.
-#
-# Returns the list of commands as keyword/parameter list pairs, or an empty list if an
-# error occurred while parsing.
-def parse_commands(lines: list[str], line_num: int) -> list[tuple[str, list[str]]]:
-	cmd_list = []
-	for i in range(len(lines)):
-		keyerr, paramlist = parse_command(lines[i])
-		# Check if error
-		if not(keyerr in commands):
-			match keyerr:
-				case "ERROR_NOT_COMMAND":
-					print_error("cp", f"Line in Command Block is Not a Command (Line {i + line_num}).")
-				case "ERROR_UNCLOSED_PARAMS":
-					print_error("cp", f"Unclosed Parameters (Line {i + line_num})")
-				case "ERROR_INVALID_COMMAND":
-					print_error("cp", f"Unspecified Command (Line {i + line_num})")
-				case "ERROR_PARAMVALID":
-					print_error("cp", f"Invalid Parameters (Line {i + line_num})")
-			return []
-
-		# Add to list
-		cmd_list.append((keyerr, paramlist))
-
-	return cmd_list
-
-
-# Parses the given block for modifiers, ensuring all modifiers are valid.
-# See the documentation for more details regarding modifiers and their syntax.
-#
-# lines: The list of lines that form this command block.
-# line_num: The number of the first line of the command block in the markdown file.
-#
-# Returns the list of modifiers as a dictionary, with the key being the modifier's keyword
-# and the value being the list of parameters the modifier has as an all-string list.
-def parse_modifiers(lines: list[str], line_num: int) -> dict[str, list[str]]:
-	current_modifiers = {}
-
-	for i in range(len(lines)):
-		li = lines[i].replace(" ", "")
-
-		# Check if line specifies a modifier
-		if li[0:2] == "{{":
-			last_i = li.find("}}")
-			if (last_i == -1):
-				print_error("mp", f"Unclosed Modifier Keyword (Line {i + line_num})")
-				return {"error": True}
+# clips: The script's part of the main sequence, from layout_to_sequences.
+# profile: The output profile from load_profile.
+def main_clips_length(clips: list[dict], profile: dict) -> float:
+	length = 0.0
+	for i in range(len(clips)):
+		length += clips[i]["duration_full"]
+		if (i < len(clips) - 1):
+			if ("before_pause" in clips[i + 1]["modifiers"]):
+				length += clips[i + 1]["modifiers"]["before_pause"]
 			else:
-				# Get modifier keyword
-				keyword = li[2:last_i]
-
-				pdb(f"Parsing Modifier ({keyword})")
-
-				# Get params
-				param_i = li.find("(")
-				param_end_i = li.find(")")
-
-				params = []
-				if (param_i != -1 and param_end_i != -1):
-					params = li[param_i + 1:param_end_i].split(";")
-					if (len(params) == 1 and len(params[0]) == 0):
-						params = []
-				if (param_i != -1 and param_end_i == -1 or param_i == -1 and param_end_i != -1):
-					print_error("mp", f"Unclosed Parameter Block (Line {i + line_num})")
-					return {"error": True}
-
-				params_valid = check_paramlist_validity(keyword, params, modifier=True)
-				if not(params_valid):
-					print_error("mp", f"Invalid Parameters (Line {i + line_num})")
-					return {"error": True}
-
-				# Create Modifier
-				current_modifiers[keyword] = params
-
-	current_modifiers["error"] = False
-	return current_modifiers
-
+				length += profile["SECTION_GAP"] if i == 0 else profile["CONTENT_GAP"]
+	return length
 
+# Gets the gap before a merged script's clips in the main sequence, after the script before it.
 #
-# WORKING FUNCTIONS
+# part: The script, as in titleclips_to_kdenlive.
+# profile: The output profile from load_profile.
+def main_script_gap(part: dict, profile: dict) -> float:
+	first_clip = part["sequences"][-1][0]
+	if ("before_pause" in first_clip["modifiers"]):
+		return first_clip["modifiers"]["before_pause"]
+	return profile["SECTION_GAP"]
+
+# Creates the main sequence's playlist entries for a script's clips, with the blanks between them.
 #
+# clips: The script's part of the main sequence, from layout_to_sequences.
+# first_clip: The index of the script's first clip in the main sequence.
+# main_producers: The producers of the main sequence, from assign_title_producers.
+# profile: The output profile from load_profile.
+def main_clip_entries(clips: list[dict], first_clip: int, main_producers: list[tuple], profile: dict) -> str:
+	output = ""
+	for j in range(len(clips)):
+		i = first_clip + j
+		fade_dur = profile["FADE_DURATION"] if j > 0 else profile["TITLE_FADE_DURATION"]
+		# Add entry
+		output += f"""	<entry in="00:00:00.000" out="{seconds_to_timestamp(clips[j]["duration_time"])}" producer="{main_producers[i][0]}">
+		<property name="kdenlive:id">{main_producers[i][1]}</property>
 
+		<filter id="seq0_clip{i}_fadein" out="{seconds_to_timestamp(fade_dur)}">
+			<property name="start">1</property>
+			<property name="level">1</property>
+			<property name="mlt_service">brightness</property>
+			<property name="kdenlive_id">fade_from_black</property>
+			<property name="alpha">00:00:00.000=0;{seconds_to_timestamp(fade_dur)}=1</property>
+			<property name="kdenlive:collapsed">0</property>
+		</filter>
+		<filter id="seq0_clip{i}_fadeout" in="{seconds_to_timestamp(clips[j]["duration_time"] - fade_dur)}" out="{seconds_to_timestamp(clips[j]["duration_time"])}">
+			<property name="start">1</property>
+			<property name="level">1</property>
+			<property name="mlt_service">brightness</property>
+			<property name="kdenlive_id">fade_to_black</property>
+			<property name="alpha">00:00:00.000=1;{seconds_to_timestamp(fade_dur)}=0</property>
+			<property name="kdenlive:collapsed">0</property>
+		</filter>
+	</entry>\n"""
 
-# Reads a kdenlive project file to convert tracks with titles to a readable and
-# modifiable JSON format.
-def kdenlive_to_titleclips(projfile):
-	pass
+		# Add blank
+		if (j < len(clips) - 1):
+			if ("before_pause" in clips[j + 1]["modifiers"]):
+				output += f"""<blank length="{seconds_to_timestamp(clips[j + 1]["modifiers"]["before_pause"])}"/>"""
+			elif (j == 0):
+				output += f"""<blank length="{seconds_to_timestamp(profile["SECTION_GAP"])}"/>\n"""
+			else:
+				output += f"""<blank length="{seconds_to_timestamp(profile["CONTENT_GAP"])}"/>\n"""
+	return output
 
 
 # Converts a list of title clip objects to a Kdenlive project.
 # The clips will be placed in the "V2" timeline and have fade in and out effects applied.
-def titleclips_to_kdenlive(projdir):
+#
+# projdir: The directory of the project.
+# layout: The title clip data returned by clip_data_to_titleclips. Read from layout.json if not given.
+# files: If given, title clips are read from and the project is written to this dictionary of
+# file contents by relative path, instead of the project directory.
+# inline_titles: Whether or not to store the title XML inside each producer instead of referring
+# to the title files. Requires files.
+# cache: Whether or not to use the project's sequence fragment cache.
+# dedupe_titles: Whether or not clips sharing a title file also share a single bin producer.
+# uuid_namespace: If given, every UUID in the project is derived from this namespace (see
+# script_uuid_namespace) instead of being random, so unchanged inputs produce an identical file.
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+# writer: The writer from start_writer that the project and cache entries are queued in. If not
+# given, a writer is started and stopped for this call.
+# parts: If given, the scripts to merge into one project instead of layout, in order, each a
+# dictionary with the script's "name" and "layout" (see build_project). Each script's titles and
+# sequences are placed in bin folders of their own, and its title and sequences follow those of
+# the script before it in the main sequence.
+def titleclips_to_kdenlive(projdir, layout: list[dict] | None = None, files: dict[str, bytes] | None = None, inline_titles: bool = False, cache: bool = True, dedupe_titles: bool = False, uuid_namespace: uuid.UUID | None = None, profile: dict | None = None, writer: dict | None = None, parts: list[dict] | None = None):
+	if (profile == None):
+		profile = load_profile()
+
+	# Files kept in memory need no writer.
+	own_writer = (writer == None and files == None)
+	if (own_writer):
+		writer = start_writer()
+
 	# Init file
-	main_uuid = uuid.uuid4()
+	main_uuid = make_uuid(uuid_namespace, "main")
 	main_uuid_hash = hashlib.md5(f"{{{main_uuid}}}".encode()).hexdigest()
 
 	base_id = 3
 
-	layout = None
-
-	with open(os.path.join(projdir, "titles", f"layout.json"), "r") as layout_json:
-		# Read Layout JSON
-		layout = json.loads(layout_json.read())
+	merged = (parts != None)
+	if (not(merged)):
+		if (layout == None):
+			with open(os.path.join(projdir, "titles", f"layout.json"), "r") as layout_json:
+				# Read Layout JSON
+				layout = json.loads(layout_json.read())
+		parts = [{"name": "", "layout": layout}]
 
 	# Get all clips and arrange by what sequence they will be put in.
-	# The last sequence in this list shall be the main sequence.
-	sequences = layout_to_sequences(layout, title_last = True)
+	# The last sequence of each script is its part of the main sequence.
+	for part in parts:
+		part["sequences"] = layout_to_sequences(part["layout"], title_last = True, profile = profile)
+		part["seq_data"] = []
 
 	seq_data = []
+	used_seq_keys = set()
+
+	# Producers shared between clips with identical titles
+	shared_producers = {} if dedupe_titles else None
 
 	# Specify IDs for folders
 	folders = [
@@ -711,28 +481,68 @@ def titleclips_to_kdenlive(projdir):
 	]
 
 	# Create Header
-	# NOTE: Currently this only supports 1080p60.
 	output = f"""<?xml version='1.0' encoding='utf-8'?>
 <mlt LC_NUMERIC="C" producer="main_bin" root="{os.path.abspath(projdir)}" version="7.28.0">
-	<profile colorspace="709" description="HD 1080p 60 fps" display_aspect_den="9" display_aspect_num="16" frame_rate_den="1" frame_rate_num="{FRAMERATE}" height="{RES_HEIGHT}" progressive="1" sample_aspect_den="1" sample_aspect_num="1" width="{RES_WIDTH}"/>\n"""
-
-	# Create subsequences
-	for i in range(len(sequences) - 1):
-		sequence = sequences[i]
-
-		this_seq_folder = {
-			"id": base_id,
-			"name": f"Section {i + 1}",
-			"parent": 2
-		}
-
-		folders.append(this_seq_folder)
-
-		seq_out, new_base_id, seq_entry = create_sequence(seq_idx=(i + 1), sequence=sequence, start_id=(base_id + 1), folder_obj=this_seq_folder, projdir=projdir, main_uuid=main_uuid)
-		base_id = new_base_id
-
-		output += seq_out
-		seq_data.append(seq_entry)
+	<profile colorspace="709" description="{profile["PROFILE_DESCRIPTION"]}" display_aspect_den="{profile["DISPLAY_ASPECT"][1]}" display_aspect_num="{profile["DISPLAY_ASPECT"][0]}" frame_rate_den="1" frame_rate_num="{profile["FRAMERATE"]}" height="{profile["RES_HEIGHT"]}" progressive="1" sample_aspect_den="1" sample_aspect_num="1" width="{profile["RES_WIDTH"]}"/>\n"""
+
+	# Merged scripts get a folder of titles and a folder of sequences each. Their IDs are allocated
+	# from the same counter as every clip's, so they are unique across the whole project.
+	for part in parts:
+		if (merged):
+			part["title_folder"] = base_id
+			part["sequence_folder"] = base_id + 1
+			folders.append({"id": base_id, "name": escape(part["name"]), "parent": 2})
+			folders.append({"id": base_id + 1, "name": escape(part["name"]), "parent": 1})
+			base_id += 2
+		else:
+			part["title_folder"] = 2
+			part["sequence_folder"] = 1
+
+	# Create subsequences, numbered across every script
+	seq_idx = 0
+	for part in parts:
+		for i in range(len(part["sequences"]) - 1):
+			sequence = part["sequences"][i]
+			seq_idx += 1
+
+			this_seq_folder = {
+				"id": base_id,
+				"name": f"Section {i + 1}",
+				"parent": part["title_folder"]
+			}
+
+			folders.append(this_seq_folder)
+
+			# Reuse the sequence from the fragment cache if nothing it depends on has changed.
+			title_hashes = sequence_title_hashes(sequence, projdir, files)
+			seq_key = sequence_cache_key(seq_idx, sequence, base_id + 1, this_seq_folder, part["sequence_folder"], title_hashes, inline_titles, shared_producers, uuid_namespace, profile)
+			used_seq_keys.add(seq_key)
+
+			cached_seq = load_cached_sequence(projdir, seq_key, main_uuid) if cache else None
+			if (cached_seq != None):
+				seq_out, new_base_id, seq_entry = cached_seq
+				if (shared_producers != None):
+					shared_producers.update(seq_entry["shared_producers"])
+			else:
+				title_xmls = sequence_title_xmls(sequence, files) if inline_titles else None
+				seq_out, new_base_id, seq_entry = create_sequence(seq_idx=seq_idx, sequence=sequence, start_id=(base_id + 1), folder_obj=this_seq_folder, projdir=projdir, main_uuid=main_uuid, title_hashes=title_hashes, title_xmls=title_xmls, shared_producers=shared_producers, uuid_namespace=uuid_namespace, profile=profile, sequence_folder=part["sequence_folder"])
+				if (cache):
+					store_cached_sequence(projdir, seq_key, main_uuid, seq_out, new_base_id, seq_entry, writer)
+			base_id = new_base_id
+
+			output += seq_out
+			seq_data.append(seq_entry)
+			part["seq_data"].append(seq_entry)
+
+	# Every sequence, with the main sequence (the main clips of every script) last
+	main_sequence = [clip for part in parts for clip in part["sequences"][-1]]
+	sequences = [sequence for part in parts for sequence in part["sequences"][:-1]] + [main_sequence]
+
+	# Drop cached sequences that no longer appear in the project, once the new ones are written
+	if (cache):
+		if (writer != None):
+			raise_write_errors(flush_writer(writer))
+		prune_sequence_cache(projdir, used_seq_keys)
 
 	# Create main sequence blank tracks
 	output += prepare_sequence_blanks(0, audio_track_count=1)
@@ -741,25 +551,30 @@ def titleclips_to_kdenlive(projdir):
 	output += f"""<playlist id="seq0_a2b1">
 <property name="kdenlive:audio_track">1</property>\n"""
 
-	# Calculate the length of the main sequence before all other sequences are added
+	# Add every script's sequences to the playlist, after its main clips, calculating the final
+	# length of the main sequence. audio_gap is the time since the last sequence on this track.
 	len_sum = 0.0
-	for i in range(len(sequences[-1])):
-		len_sum += sequences[-1][i]["duration_full"]
-		if (i < len(sequences[-1]) - 1):
-			if ("before_pause" in sequences[-1][i + 1]["modifiers"]):
-				len_sum += sequences[-1][i + 1]["modifiers"]["before_pause"]
-			else:
-				len_sum += SECTION_GAP if i == 0 else CONTENT_GAP
-
-	# Add all other sequences to playlist, calculating the final length of the main sequence.
-	for i in range(len(seq_data)):
-		this_gap = seq_data[i]["before_pause"]
-		output += f"""	<blank length="{seconds_to_timestamp(len_sum + this_gap) if i == 0 else seconds_to_timestamp(this_gap)}"/>
-<entry in="00:00:00.000" out="{seconds_to_timestamp(seq_data[i]["seq_dur"])}" producer="{{{seq_data[i]["uuid"]}}}">
-	<property name="kdenlive:maxduration">{seconds_to_frames(seq_data[i]["seq_dur"])}</property>
-	<property name="kdenlive:id">{seq_data[i]["id"]}</property>
+	audio_gap = 0.0
+	for k in range(len(parts)):
+		if (k > 0):
+			script_gap = main_script_gap(parts[k], profile)
+			len_sum += script_gap
+			audio_gap += script_gap
+
+		main_len = main_clips_length(parts[k]["sequences"][-1], profile)
+		len_sum += main_len
+		audio_gap += main_len
+
+		part_seq_data = parts[k]["seq_data"]
+		for i in range(len(part_seq_data)):
+			this_gap = part_seq_data[i]["before_pause"]
+			output += f"""	<blank length="{seconds_to_timestamp(audio_gap + this_gap)}"/>
+<entry in="00:00:00.000" out="{seconds_to_timestamp(part_seq_data[i]["seq_dur"])}" producer="{{{part_seq_data[i]["uuid"]}}}">
+	<property name="kdenlive:maxduration">{seconds_to_frames(part_seq_data[i]["seq_dur"], profile["FRAMERATE"])}</property>
+	<property name="kdenlive:id">{part_seq_data[i]["id"]}</property>
 </entry>\n"""
-		len_sum += seq_data[i]["seq_dur"] + this_gap
+			len_sum += part_seq_data[i]["seq_dur"] + this_gap
+			audio_gap = 0.0
 
 	output += f"""</playlist>
 <playlist id="seq0_a2b2">
@@ -799,52 +614,32 @@ def titleclips_to_kdenlive(projdir):
 	# Create main sequence outer video track
 
 	# Create producers
-	for i in range(len(sequences[-1])):
-		output += title_to_producer(title_obj=sequences[-1][i], projdir=projdir, folder_id=2, clip_id=(base_id + i), producer_id=i, seq_id=0)
+	title_hashes = sequence_title_hashes(main_sequence, projdir, files)
+	title_xmls = sequence_title_xmls(main_sequence, files) if inline_titles else None
+	main_producers = assign_title_producers(0, main_sequence, base_id, shared_producers)[0]
+	main_folders = [part["title_folder"] for part in parts for clip in part["sequences"][-1]]
+	for i in range(len(main_sequence)):
+		if (main_producers[i][0] != f"seq0_clip{i}"):
+			continue
+		output += title_to_producer(title_obj=main_sequence[i], projdir=projdir, folder_id=main_folders[i], clip_id=(base_id + i), producer_id=i, seq_id=0, file_hash=title_hashes[i], title_xml=(title_xmls[i] if title_xmls else ""), uuid_namespace=uuid_namespace, profile=profile)
 
-	# Create playlist entries for non-sequences
+	# Create playlist entries for each script: its main clips, then its sequences
 	output += f"""<playlist id="seq0_v2b1">"""
-	for i in range(len(sequences[-1])):
-		fade_dur = FADE_DURATION if i > 0 else TITLE_FADE_DURATION
-		# Add entry
-		output += f"""	<entry in="00:00:00.000" out="{seconds_to_timestamp(sequences[-1][i]["duration_time"])}" producer="seq0_clip{i}">
-		<property name="kdenlive:id">{base_id + i}</property>
-
-		<filter id="seq0_clip{i}_fadein" out="{seconds_to_timestamp(fade_dur)}">
-			<property name="start">1</property>
-			<property name="level">1</property>
-			<property name="mlt_service">brightness</property>
-			<property name="kdenlive_id">fade_from_black</property>
-			<property name="alpha">00:00:00.000=0;{seconds_to_timestamp(fade_dur)}=1</property>
-			<property name="kdenlive:collapsed">0</property>
-		</filter>
-		<filter id="seq0_clip{i}_fadeout" in="{seconds_to_timestamp(sequences[-1][i]["duration_time"] - fade_dur)}" out="{seconds_to_timestamp(sequences[-1][i]["duration_time"])}">
-			<property name="start">1</property>
-			<property name="level">1</property>
-			<property name="mlt_service">brightness</property>
-			<property name="kdenlive_id">fade_to_black</property>
-			<property name="alpha">00:00:00.000=1;{seconds_to_timestamp(fade_dur)}=0</property>
-			<property name="kdenlive:collapsed">0</property>
-		</filter>
+	first_clip = 0
+	for k in range(len(parts)):
+		if (k > 0):
+			output += template_PLAYLIST_BLANK(seconds_to_timestamp(main_script_gap(parts[k], profile)))
+		output += main_clip_entries(parts[k]["sequences"][-1], first_clip, main_producers, profile)
+		first_clip += len(parts[k]["sequences"][-1])
+
+		# Create playlist entries for sequences
+		for entry in parts[k]["seq_data"]:
+			output += f"""	<blank length="{seconds_to_timestamp(entry["before_pause"])}"/>
+	<entry in="00:00:00.000" out="{seconds_to_timestamp(entry["seq_dur"])}" producer="{{{entry["uuid"]}}}">
+		<property name="kdenlive:id">{entry["id"]}</property>
 	</entry>\n"""
 
-		# Add blank
-		if (i < len(sequences[-1]) - 1):
-			if ("before_pause" in sequences[-1][i + 1]["modifiers"]):
-				output += f"""<blank length="{seconds_to_timestamp(sequences[-1][i + 1]["modifiers"]["before_pause"])}"/>"""
-			elif (i == 0):
-				output += f"""<blank length="{seconds_to_timestamp(SECTION_GAP)}"/>\n"""
-			else:
-				output += f"""<blank length="{seconds_to_timestamp(CONTENT_GAP)}"/>\n"""
-
-	base_id += len(sequences[-1])
-
-	# Create playlist entries for sequences
-	for i in range(len(seq_data)):
-		output += f"""	<blank length="{seconds_to_timestamp(seq_data[i]["before_pause"])}"/>
-	<entry in="00:00:00.000" out="{seconds_to_timestamp(seq_data[i]["seq_dur"])}" producer="{{{seq_data[i]["uuid"]}}}">
-		<property name="kdenlive:id">{seq_data[i]["id"]}</property>
-	</entry>\n"""
+	base_id += len(main_sequence)
 
 	output += f"""</playlist>
 <playlist id="seq0_v2b2"/>
@@ -861,7 +656,7 @@ def titleclips_to_kdenlive(projdir):
 	# Define Main Sequence
 	output += f"""<tractor id="{{{main_uuid}}}" in="00:00:00.000" out="{seconds_to_timestamp(len_sum)}">
 	<property name="kdenlive:duration">{seconds_to_timestamp(len_sum)}</property>
-	<property name="kdenlive:maxduration">{seconds_to_frames(len_sum)}</property>
+	<property name="kdenlive:maxduration">{seconds_to_frames(len_sum, profile["FRAMERATE"])}</property>
 	<property name="kdenlive:clipname">Main Sequence</property>
 	<property name="kdenlive:description"/>
 	<property name="kdenlive:uuid">{{{main_uuid}}}</property>
@@ -883,7 +678,7 @@ def titleclips_to_kdenlive(projdir):
 	<property name="kdenlive:sequenceproperties.tracksCount">4</property>
 	<property name="kdenlive:sequenceproperties.verticalzoom">1</property>
 	<property name="kdenlive:sequenceproperties.zonein">0</property>
-	<property name="kdenlive:sequenceproperties.zoneout">{seconds_to_frames(len_sum)}</property>
+	<property name="kdenlive:sequenceproperties.zoneout">{seconds_to_frames(len_sum, profile["FRAMERATE"])}</property>
 	<property name="kdenlive:sequenceproperties.zoom">8</property>
 	<property name="kdenlive:sequenceproperties.groups">[
 	]
@@ -934,6 +729,10 @@ def titleclips_to_kdenlive(projdir):
 	for entry in seq_data:
 		all_seq_uuids += f'{{{entry["uuid"]}}}' + ";"
 	all_seq_uuids = all_seq_uuids[:-1]
+	# A merged project can have hundreds of sequences, which would all be opened as timelines when
+	# the project is loaded, so only the main sequence is opened.
+	if (merged):
+		all_seq_uuids = f"{{{main_uuid}}}"
 
 	output += f"""<playlist id="main_bin">\n"""
 
@@ -946,7 +745,7 @@ def titleclips_to_kdenlive(projdir):
 	<property name="kdenlive:docproperties.audioChannels">2</property>
 	<property name="kdenlive:docproperties.binsort">100</property>
 	<property name="kdenlive:docproperties.browserurl">./</property>
-	<property name="kdenlive:docproperties.documentid">{round(time.time())}</property>
+	<property name="kdenlive:docproperties.documentid">{round(time.time()) if uuid_namespace == None else main_uuid.int % 10000000000}</property>
 	<property name="kdenlive:docproperties.enableTimelineZone">0</property>
 	<property name="kdenlive:docproperties.enableexternalproxy">0</property>
 	<property name="kdenlive:docproperties.enableproxy">0</property>
@@ -1005,7 +804,7 @@ def titleclips_to_kdenlive(projdir):
 	<property name="kdenlive:docproperties.opensequences">{all_seq_uuids}</property>
 	<property name="kdenlive:docproperties.previewextension"/>
 	<property name="kdenlive:docproperties.previewparameters"/>
-	<property name="kdenlive:docproperties.profile">atsc_1080p_60</property>
+	<property name="kdenlive:docproperties.profile">{profile["PROFILE_NAME"]}</property>
 	<property name="kdenlive:docproperties.proxyextension"/>
 	<property name="kdenlive:docproperties.proxyimageminsize">2000</property>
 	<property name="kdenlive:docproperties.proxyimagesize">800</property>
@@ -1013,7 +812,7 @@ def titleclips_to_kdenlive(projdir):
 	<property name="kdenlive:docproperties.proxyparams"/>
 	<property name="kdenlive:docproperties.proxyresize">640</property>
 	<property name="kdenlive:docproperties.seekOffset">30000</property>
-	<property name="kdenlive:docproperties.sessionid">{{{uuid.uuid4()}}}</property>
+	<property name="kdenlive:docproperties.sessionid">{{{make_uuid(uuid_namespace, "session")}}}</property>
 	<property name="kdenlive:docproperties.uuid">{{{main_uuid}}}</property>
 	<property name="kdenlive:docproperties.version">1.1</property>
 	<property name="kdenlive:expandedFolders">1;2</property>
@@ -1025,9 +824,12 @@ def titleclips_to_kdenlive(projdir):
 
 	pdb(sequences)
 
-	# Add entries for all clips
+	# Add entries for all clips. Clips sharing a producer only need one entry.
+	bin_producers = {producer[0] for producer in shared_producers.values()} if dedupe_titles else None
 	for i in range(len(sequences)):
 		for j in range(len(sequences[i])):
+			if (bin_producers != None and not(f"seq{(i + 1) % len(sequences)}_clip{j}" in bin_producers)):
+				continue
 			output += f"""	<entry in="00:00:00.000" out="{seconds_to_timestamp(sequences[i][j]["duration_time"])}" producer="seq{(i + 1) % len(sequences)}_clip{j}"/>\n"""
 
 	# Add entries for all sequences
@@ -1043,48 +845,108 @@ def titleclips_to_kdenlive(projdir):
 	<track in="00:00:00.000" out="{seconds_to_timestamp(len_sum)}" producer="{{{main_uuid}}}"/>
 </tractor></mlt>"""
 
-	with open(os.path.join(projdir, "project.kdenlive"), "w") as project_file:
-		project_file.write(output)
+	if (files != None):
+		files["project.kdenlive"] = output.encode()
+	else:
+		queue_write(writer, os.path.join(projdir, "project.kdenlive"), output.encode())
+
+	if (own_writer):
+		raise_write_errors(stop_writer(writer))
 
 
 
 # Converts clip data into title clip objects, which feature the clip's XML definition
 # and the timestamp where the clip is to be placed.
-def clip_data_to_titleclips(cd, projdir):
+#
+# cd: The clip data returned by parse_file.
+# projdir: The directory of the project.
+# files: If given, title clips and layout.json are stored in this dictionary of file contents
+# by relative path, instead of being written to the project directory.
+# dedupe: Whether or not clips with identical titles share a single title file. Repeated clips
+# get a "title_ref" naming the file of the first identical clip, and no file of their own.
+# title_cache: Whether or not to reuse line breaks and title files from the shared title cache.
+# profile: The output profile from load_profile. Defaults to the settings in constants.py.
+# writer: The writer from start_writer that title clips are queued in. Every title clip has been
+# written when this returns. If not given, a writer is started and stopped for this call.
+# journal: If given, the journal from open_journal that each finished title clip is recorded in.
+# Clips it records from an earlier run are reused while their title files are intact. Requires
+# title clips to be written to projdir.
+# title_dir: If given, title clips and layout.json are placed in this folder within the titles
+# folder, and each clip's "title_dir" names it. Used to keep merged scripts apart.
+# evict_cache: Whether or not to trim the title cache afterwards. Left to the caller when several
+# processes use the title cache at once, so that none removes a title another is linking.
+#
+# Returns the title clip data, as saved in layout.json.
+def clip_data_to_titleclips(cd, projdir, files: dict[str, bytes] | None = None, dedupe: bool = False, title_cache: bool = False, profile: dict | None = None, writer: dict | None = None, journal: dict | None = None, title_dir: str = "", evict_cache: bool = True) -> list[dict]:
 	tc_data = []
+	title_refs = {}
+
+	if (profile == None):
+		profile = load_profile()
+
+	# Files kept in memory need no writer.
+	own_writer = (writer == None and files == None)
+	if (own_writer):
+		writer = start_writer()
 
 	section_idx = 0
 	content_idx = 0
 
-	if not(os.path.exists(os.path.join(projdir, "titles"))):
+	# Title template with the profile's layout bound. Each clip's style is bound from this.
+	title_template = bind_template(TITLE_CLIP, width=profile["RES_WIDTH"], height=profile["RES_HEIGHT"], z_index=0, x=(profile["RES_WIDTH"] - profile["MAX_CONTENT_WIDTH"]) // 2, box_height=profile["RES_HEIGHT"], box_width=profile["MAX_CONTENT_WIDTH"], font_weight=profile["FONT_WEIGHT"])
+
+	if (files == None and not(os.path.exists(os.path.join(projdir, "titles")))):
 		os.mkdir(os.path.join(projdir, "titles"))
+	if (files == None and title_dir != ""):
+		os.makedirs(os.path.join(projdir, "titles", title_dir), exist_ok=True)
+	layout_path = "titles/layout.json" if title_dir == "" else f"titles/{title_dir}/layout.json"
+
+	resumed = resume_journal_clips(journal, projdir, title_refs if dedupe else None) if journal != None else []
+	if (len(resumed) > 0):
+		print(f"Resuming from clip {len(resumed) + 1} of {len(cd)}...")
 
 	# Go through each clip in the clip data
 	for i in range(len(cd)):
 		clip = cd[i]
+
+		# Clips finished by an earlier run only need the counters naming the later clips
+		if (i < len(resumed)):
+			if (clip["type"] == "section"):
+				section_idx += 1
+				content_idx = 0
+			elif (clip["type"] == "content"):
+				content_idx += 1
+			tc_data.append(resumed[i]["entry"])
+			journal_clip(journal, i, resumed[i]["entry"], resumed[i]["hash"])
+			continue
+
 		tc_entry = {}
 
 		# Set durations
-		tc_entry["duration_frames"] = round(clip["duration"] * FRAMERATE)
+		tc_entry["duration_frames"] = round(clip["duration"] * profile["FRAMERATE"])
 		tc_entry["duration_full"] = r3(clip["duration"])
-		tc_entry["duration_time"] = r3(clip["duration"] - (1.0 / FRAMERATE))
+		tc_entry["duration_time"] = r3(clip["duration"] - (1.0 / profile["FRAMERATE"]))
 
-		data = f"""<kdenlivetitle LC_NUMERIC="C" duration_frames="{tc_entry["duration_frames"]}" height="{RES_HEIGHT}" out="{tc_entry["duration_frames"]}" width="{RES_WIDTH}">\n"""
+		# Text items other than the main one
+		items = b""
 
 		# Pass modifiers to title clip processor in case they are needed (e.g. before_pause)
 		tc_entry["modifiers"] = clip["modifiers"]
 
+		if (title_dir != ""):
+			tc_entry["title_dir"] = title_dir
+
 		# Set default formatting
 		y_pos = 0
 		clip_content = clip["content"]
 
 		# Get modifiers/default values
-		clip_color = color_code_aopt(clip["modifiers"]["color"]) if "color" in clip["modifiers"] else color_code(FONT_COLOR)
-		clip_outline_color = color_code_aopt(clip["modifiers"]["outline_color"]) if "outline_color" in clip["modifiers"] else color_code(FONT_OUTLINE_COLOR)
+		clip_color = color_code_aopt(clip["modifiers"]["color"]) if "color" in clip["modifiers"] else color_code(profile["FONT_COLOR"])
+		clip_outline_color = color_code_aopt(clip["modifiers"]["outline_color"]) if "outline_color" in clip["modifiers"] else color_code(profile["FONT_OUTLINE_COLOR"])
 
-		clip_font = FONT_NAME
+		clip_font = profile["FONT_NAME"]
 		if ("font" in clip["modifiers"]):
-			sf = get_system_font(clip["modifiers"]["font"][0])
+			sf = find_font_source(clip["modifiers"]["font"][0], profile["FONT_SIZE"], profile["TEXT_MEASUREMENT"])
 			if (sf != ""):
 				clip_font = clip["modifiers"]["font"][0]
 			else:
@@ -1093,42 +955,34 @@ def clip_data_to_titleclips(cd, projdir):
 		# Apply remaining modifiers
 		clip_font_size = 0
 		if ("font_size" in clip["modifiers"]):
-			clip_font_size = int(clip["modifiers"]["font_size"][0])
+			clip_font_size = scale_to_profile(int(clip["modifiers"]["font_size"][0]), profile)
 
-		clip_outline_width = int(clip["modifiers"]["outline_width"][0]) if "outline_width" in clip["modifiers"] else FONT_OUTLINE_THICK
+		clip_outline_width = scale_to_profile(int(clip["modifiers"]["outline_width"][0]), profile) if "outline_width" in clip["modifiers"] else profile["FONT_OUTLINE_THICK"]
 
 		match clip["type"]:
 			case "title":
 				# Set Values
 				tc_entry["ref"] = "title"
 				if (clip_font_size) == 0:
-					clip_font_size = TITLE_FONT_SIZE
+					clip_font_size = profile["TITLE_FONT_SIZE"]
 
 				# get y positions
-				y_pos = RES_HEIGHT // 2
+				y_pos = profile["RES_HEIGHT"] // 2
 				if ("y" in clip["modifiers"]):
-					y_pos = int(clip["modifiers"]["y"][0])
+					y_pos = scale_to_profile(int(clip["modifiers"]["y"][0]), profile)
 				y_pos -= clip_font_size // 2
-				subtitle_y_pos = y_pos + clip_font_size + TITLE_GAP
-				supertitle_y_pos = y_pos - TITLE_GAP - SUPERTITLE_FONT_SIZE
+				subtitle_y_pos = y_pos + clip_font_size + profile["TITLE_GAP"]
+				supertitle_y_pos = y_pos - profile["TITLE_GAP"] - profile["SUPERTITLE_FONT_SIZE"]
 
 				# Add optional subtitle
 				if ("subtitle" in clip):
-					data += f""" <item type="QGraphicsTextItem" z-index="2">
-  <position x="0" y="{subtitle_y_pos}">
-   <transform>1,0,0,0,1,0,0,0,1</transform>
-  </position>
-  <content alignment="4" box-height="{RES_HEIGHT}" box-width="{RES_WIDTH}" font="{FONT_NAME}" font-color="{color_code(SUBTITLE_FONT_COLOR)}" font-italic="0" font-outline="{FONT_OUTLINE_THICK}" font-outline-color="{color_code(FONT_OUTLINE_COLOR)}" font-pixel-size="{SUBTITLE_FONT_SIZE}" font-underline="0" font-weight="{SUBSUPER_FONT_WEIGHT}" letter-spacing="0" line-spacing="0" shadow="1;#80000000;4;0;4" tab-width="80" typewriter="0;2;1;0;0">{clip["subtitle"]}</content>
- </item>\n"""
+					subtitle_item = bind_template(TITLE_ITEM, z_index=2, x=0, box_height=profile["RES_HEIGHT"], box_width=profile["RES_WIDTH"], font=profile["FONT_NAME"], color=color_code(profile["SUBTITLE_FONT_COLOR"]), outline_width=profile["FONT_OUTLINE_THICK"], outline_color=color_code(profile["FONT_OUTLINE_COLOR"]), font_size=profile["SUBTITLE_FONT_SIZE"], font_weight=profile["SUBSUPER_FONT_WEIGHT"])
+					items += render_template(subtitle_item, y=subtitle_y_pos, content=clip["subtitle"].encode())
 
 				# Add optional supertitle
 				if ("supertitle" in clip):
-					data += f""" <item type="QGraphicsTextItem" z-index="1">
-  <position x="0" y="{supertitle_y_pos}">
-   <transform>1,0,0,0,1,0,0,0,1</transform>
-  </position>
-  <content alignment="4" box-height="{RES_HEIGHT}" box-width="{RES_WIDTH}" font="{FONT_NAME}" font-color="{color_code(SUPERTITLE_FONT_COLOR)}" font-italic="0" font-outline="{FONT_OUTLINE_THICK}" font-outline-color="{color_code(FONT_OUTLINE_COLOR)}" font-pixel-size="{SUPERTITLE_FONT_SIZE}" font-underline="0" font-weight="{SUBSUPER_FONT_WEIGHT}" letter-spacing="0" line-spacing="0" shadow="1;#80000000;4;0;4" tab-width="80" typewriter="0;2;1;0;0">{clip["supertitle"]}</content>
- </item>\n"""
+					supertitle_item = bind_template(TITLE_ITEM, z_index=1, x=0, box_height=profile["RES_HEIGHT"], box_width=profile["RES_WIDTH"], font=profile["FONT_NAME"], color=color_code(profile["SUPERTITLE_FONT_COLOR"]), outline_width=profile["FONT_OUTLINE_THICK"], outline_color=color_code(profile["FONT_OUTLINE_COLOR"]), font_size=profile["SUPERTITLE_FONT_SIZE"], font_weight=profile["SUBSUPER_FONT_WEIGHT"])
+					items += render_template(supertitle_item, y=supertitle_y_pos, content=clip["supertitle"].encode())
 			case "section":
 				# Set Values
 				section_idx += 1
@@ -1136,276 +990,87 @@ def clip_data_to_titleclips(cd, projdir):
 
 				tc_entry["ref"] = f"section_{section_idx}"
 				if (clip_font_size) == 0:
-					clip_font_size = SECTION_FONT_SIZE
+					clip_font_size = profile["SECTION_FONT_SIZE"]
 
 				# create section clip
-				y_pos = RES_HEIGHT // 2
+				y_pos = profile["RES_HEIGHT"] // 2
 				if ("y" in clip["modifiers"]):
-					y_pos = int(clip["modifiers"]["y"][0])
+					y_pos = scale_to_profile(int(clip["modifiers"]["y"][0]), profile)
 				y_pos -= clip_font_size // 2
 			case "content":
 				# Set Values
 				content_idx += 1
 				tc_entry["ref"] = f"content_s{section_idx}_c{content_idx}"
 				if (clip_font_size) == 0:
-					clip_font_size = FONT_SIZE
+					clip_font_size = profile["FONT_SIZE"]
 
 				# split this content so that it fits on screen width-wise.
-				lines = break_text_by_font_width(clip["content"], clip_font, clip_font_size, MAX_CONTENT_WIDTH)
-				if (len(lines) == 0):
-					print_error("tc", f"Font for clip ({clip_font}) could not be found.")
-					sys.exit()
+				lines = None
+				lines_key = ""
+				if (title_cache):
+					font_source = find_font_source(clip_font, clip_font_size, profile["TEXT_MEASUREMENT"])
+					if (font_source != ""):
+						lines_key = line_cache_key(clip["content"], font_source, clip_font_size, profile["MAX_CONTENT_WIDTH"])
+						lines = load_cached_lines(lines_key)
+
+				if (lines == None):
+					lines = break_text_by_font_width(clip["content"], clip_font, clip_font_size, profile["MAX_CONTENT_WIDTH"], profile["TEXT_MEASUREMENT"])
+					if (len(lines) == 0):
+						raise_error("tc", f"Font for clip ({clip_font}) could not be found.")
+					if (lines_key != ""):
+						store_cached_lines(lines_key, lines)
 
 				clip_content = "\n".join(lines)
 
 				# Get Y from Y_CENTER
-				y_pos = Y_CENTER
+				y_pos = profile["Y_CENTER"]
 				if ("y" in clip["modifiers"]):
-					y_pos = int(clip["modifiers"]["y"][0])
+					y_pos = scale_to_profile(int(clip["modifiers"]["y"][0]), profile)
 				y_pos -= round((len(lines) / 2.0) * clip_font_size)
 
-		# Add main title
-		data += f""" <item type="QGraphicsTextItem" z-index="0">
-  <position x="{(RES_WIDTH - MAX_CONTENT_WIDTH) // 2}" y="{y_pos}">
-   <transform>1,0,0,0,1,0,0,0,1</transform>
-  </position>
-  <content alignment="4" box-height="{RES_HEIGHT}" box-width="{MAX_CONTENT_WIDTH}" font="{clip_font}" font-color="{clip_color}" font-italic="0" font-outline="{clip_outline_width}" font-outline-color="{clip_outline_color}" font-pixel-size="{clip_font_size}" font-underline="0" font-weight="{FONT_WEIGHT}" letter-spacing="0" line-spacing="0" shadow="1;#80000000;4;0;4" tab-width="80" typewriter="0;2;1;0;0">{clip_content}</content>
- </item>
- <startviewport rect="0,0,{RES_WIDTH},{RES_HEIGHT}"/>
- <endviewport rect="0,0,{RES_WIDTH},{RES_HEIGHT}"/>
- <background color="0,0,0,0"/>
-</kdenlivetitle>"""
+		# Render the title with its main text item, from the title template bound to this clip's style
+		style = bind_template(title_template, font=clip_font, color=clip_color, outline_width=clip_outline_width, outline_color=clip_outline_color, font_size=clip_font_size)
+		data = render_template(style, duration_frames=tc_entry["duration_frames"], items=items, y=y_pos, content=clip_content.encode())
+
+		# Point repeated titles at the first identical title file
+		if (dedupe):
+			if (data in title_refs):
+				tc_entry["title_ref"] = title_refs[data]
+				tc_data.append(tc_entry)
+				if (journal != None):
+					journal_clip(journal, i, tc_entry, None)
+				continue
+			title_refs[data] = tc_entry["ref"]
 
 		# Write kdenlivetitle XML to file
-		with open(os.path.join(projdir, "titles", f"{tc_entry["ref"]}.kdenlivetitle"), "w") as klt:
-			if (data != ""):
-				klt.write(data)
+		title_path = os.path.join(projdir, "titles", f"{title_file_ref(tc_entry)}.kdenlivetitle")
+		if (files != None):
+			files[f"titles/{title_file_ref(tc_entry)}.kdenlivetitle"] = data
+		elif (title_cache):
+			queue_write(writer, title_path, data, write_cached_title)
+		else:
+			queue_write(writer, title_path, data)
 
 		tc_data.append(tc_entry)
+		if (journal != None):
+			journal_clip(journal, i, tc_entry, hashlib.md5(data).hexdigest())
 
 	# Write title clip data to layout.json within the titles folder in the project directory.
-	with open(os.path.join(projdir, "titles", f"layout.json"), "w") as jsc:
-		jsc.write(json.dumps(tc_data))
-
-
-# Parses a markdown script file for text content.
-# Currently, the markdown file must have the following properties:
-# - frontmatter with at least a title field at the very start of the file
-#   - subtitle, supertitle, and other fields are optional, with subtitle and supertitle being read
-# - one empty line after frontmatter
-# - at least one line of content
-#   - lines are "section titles" if they start with ##
-#   - all other lines are treated as normal text
-#   - all content lines must have an empty line in between.
-def parse_file(f):
-	# Initialize title clip
-	clip_data = [
-		{
-			"type": "title",
-			"duration": TITLE_DURATION + TITLE_FADE_DURATION
-		}
-	]
-
-	# Read script
-	with open(f) as inp:
-		# Frontmatter check 1
-		line = inp.readline()
-		if (line != "---\n"):
-			print_error("dp", "Markdown does not start with frontmatter")
-			return []
-
-		# Parse frontmatter
-		line = inp.readline()
-		title_lines = [line[:-1]]
-		line_no = 1
-		while (line != "---\n" and line != ""):
-			lt = line[:-1]
-			# Get title field
-			if ("title:" in lt[0:6]):
-				clip_data[0]["content"] = lt[7:]
-
-			# Get subtitle field
-			if ("subtitle:" in lt[0:9]):
-				clip_data[0]["subtitle"] = lt[10:]
-
-			# Get supertitle field
-			if ("supertitle:" in lt[0:11]):
-				clip_data[0]["supertitle"] = lt[12:]
-
-			line = inp.readline()
-			title_lines.append(line[:-1])
-			line_no += 1
-
-		clip_data[0]["modifiers"] = parse_modifiers(title_lines, 1)
-
-		# Frontmatter check 2
-		if (line != "---\n" or not "content" in clip_data[0]):
-			if (line != "---\n"):
-				print_error("dp", "Frontmatter incomplete.")
-			else:
-				print_error("dp", "No 'title' field in frontmatter.")
-			return []
-
-		# Content check
-		line = inp.readline()
-		line = inp.readline()
-		line_no += 2
-		if (line == ""):
-			print_error("dp", "At least one line of text/section header/command must be present in the document.")
-			return []
-
-		# Command flags, used for next block
-		cmd_flags = {
-			"pause": -1,
-			"ignore": False
-		}
-
-		# Parse content
-		while (line != ""):
-			# Get lines in block
-			lines = []
-
-			while (line != "\n" and line != ""):
-				# Eliminate Comments
-				if (line[:3] != "/=/"):
-					lines.append(line[:-1])
-				line = inp.readline()
-				line_no += 1
-
-			pdb(f"Block Read: {lines} (now @{line_no})")
-
-			if (len(lines) == 0):
-				line = inp.readline()
-				line_no += 1
-				continue
-
-			# Check if this is a command block
-			command_block = False
-			for line in lines:
-				if (line[0:3] == "-=-"):
-					# Command block
-					command_block = True
-					command_list = parse_commands(lines, line_no - len(lines) + 1)
-
-					if (command_list == []):
-						print_error("dp", "An error occurred while parsing a command block.")
-						return []
-					else:
-						# Process Commands
-						for command_pair in command_list:
-							match command_pair[0]:
-								case "pause":
-									cmd_flags["pause"] = command_pair[1][0]
-								case "ignore":
-									cmd_flags["ignore"] = True
-			if (command_block):
-				line = inp.readline()
-				line_no += 1
-				continue
-
-			# Not a command block.
-
-			# Check if ignore
-			if (cmd_flags["ignore"]):
-				cmd_flags["ignore"] = False
-				line = inp.readline()
-				line_no += 1
-				continue
-
-			this_clip = {}
-
-			# Coalesce lines into content
-			block_text = ""
-			modifiers_present = False
-			for line in lines:
-				if (line[0:2] != "{{"):
-					# Add to block, stripping unnecessary whitespace
-					block_text += line.strip() + " "
-				else:
-					modifiers_present = True
-			block_text = block_text[:-1]
-			pdb(f"CONTENT: [{block_text}]")
-
-			# Check if contentless block has modifiers
-			if (modifiers_present and block_text == ""):
-				print_error("dp", "Modifier present with No Content.")
-				return []
-
-			# Parse for modifiers
-			this_clip["modifiers"] = parse_modifiers(lines, line_no - len(lines) + 1)
-			if (this_clip["modifiers"]["error"]):
-				return []
-			del this_clip["modifiers"]["error"]
-
-			if (block_text[0:2] == "##"):
-				# section clip
-				this_clip["type"] = "section"
-				this_clip["duration"] = SECTION_DURATION + FADE_DURATION * 2
-
-				this_clip["content"] = block_text[3:]
-			else:
-				# content clip
-				this_clip["type"] = "content"
-
-				wc = len(block_text.split(" "))
-
-				# Get duration_frames as a function of reading speed relative to # words
-				# multiplied by a factor which shortens the clip length as longer
-				# texts are entered
-				this_clip["duration"] = r3((wc / READ_SPEED) * (2 ** (-0.01 * wc)))
-				# Add fade time
-				this_clip["duration"] += FADE_DURATION * 2
-
-				this_clip["content"] = block_text
-
-			# Pause command
-			if (cmd_flags["pause"] != -1):
-				this_clip["modifiers"]["before_pause"] = float(cmd_flags["pause"])
-				cmd_flags["pause"] = -1
-
-			clip_data.append(this_clip)
-
-			line = inp.readline()
-			line_no += 1
-
-	pdb(f"CLIPS: {clip_data}")
-
-	return clip_data
-
-
-# Gets the index of the given flag in sys.argv if it exists.
-# If it does not exist, returns -1.
-#
-# shorthand: The flag's shorthand (e.g. h)
-# longhand: The flag's full name (e.g. help)
-def get_flag_idx(shorthand: str, longhand: str) -> int:
-	try:
-		return sys.argv.index(f"--{longhand}")
-	except:
-		if (shorthand != ""):
-			try:
-				return sys.argv.index(f"-{shorthand}")
-			except:
-				pass
+	if (files != None):
+		files[layout_path] = json.dumps(tc_data).encode()
+	else:
+		queue_write(writer, os.path.join(projdir, layout_path), json.dumps(tc_data).encode())
 
-	return -1
+	if (writer != None):
+		raise_write_errors(stop_writer(writer) if own_writer else flush_writer(writer))
 
-# Gets the argument for the given flag.
-# Note: This does not work for longhand arguments adjacent to the flag, e.g. --opt=2
-#
-# shorthand: The flag's shorthand (e.g. h)
-# longhand: The flag's full name (e.g. help)
-#
-# Returns the argument for this flag, as a string.
-def get_flag_arg(shorthand: str, longhand: str) -> str:
-	idx = get_flag_idx(shorthand, longhand)
+	if (journal != None):
+		checkpoint_journal(journal, force=True)
 
-	# Index Check
-	if (idx == -1 or idx == len(sys.argv) - 1):
-		return ""
+	if (title_cache and evict_cache):
+		evict_title_cache()
 
-	# Get argument
-	return sys.argv[idx + 1]
+	return tc_data
 
 
 def parse_flags():
@@ -1424,10 +1089,257 @@ def parse_flags():
 		print("              \tcreated or modified.")
 		print("  --force-regen\tDelete and recreate the project file from scratch. This will")
 		print("               \tdelete any changes to the video outside of the title clips.")
+		print("               \tUnchanged sequences are reused from the project's .cache folder.")
+		print("  --stdout\tWrite the project and all title clips to stdout as a tar stream instead")
+		print("          \tof to the project directory. The directory is optional and only sets the")
+		print("          \tproject root. Progress messages are written to stderr.")
+		print("  --inline-titles\tStore each title's XML inside its producer in the project file")
+		print("                 \tinstead of writing a .kdenlivetitle file per title.")
+		print("  --no-title-cache\tDo not reuse line breaks, included files and title files from the cache")
+		print("                  \tshared by all projects.")
+		print("  --deterministic\tDerive every UUID from the script's path and contents instead of")
+		print("                 \tgenerating them randomly, so unchanged scripts produce identical")
+		print("                 \tprojects.")
+		print("  --profiles\tCreate a project for each of the given comma-separated profiles, each in")
+		print("            \ta subdirectory named after the profile. The script is only parsed once.")
+		print(f"            \tAvailable profiles: {", ".join(PROFILES.keys())}")
+		print("  --dedupe-titles\tGive clips with identical titles a single shared title file and")
+		print("                 \tbin producer. Existing projects must be rebuilt with --force-regen.")
+		print("  --export-parts\tAlso export each sequence of the main timeline as a standalone MLT")
+		print("                \tfile in the project's parts folder, with a manifest.json and an")
+		print("                \tffmpeg concat list, so the parts can be rendered in parallel.")
+		print("  --preview\tRender a contact sheet of every sequence's titles to the project's")
+		print("           \tpreviews folder, for reviewing titles without opening Kdenlive.")
+		print("  --measure\tHow content is measured to break it into lines: freetype (exact, needs")
+		print("           \tPillow and the font), metrics (the font's metrics pack, see")
+		print("           \tcompile_metrics.py) or auto (the default).")
+		print("  --resume\tContinue a run that was interrupted from the last checkpoint in the")
+		print("          \tproject's .cache/journal.jsonl, if the script and settings are unchanged.")
+		print("          \tTitle clips whose files are intact are not generated again.")
+		print("  --check\tCheck the scripts given after this flag instead of generating anything,")
+		print("         \tand print a JSON report of errors and overflowing clips. See")
+		print("         \tpython3 check.py --help.")
+		print("  --merge\tMerge the scripts given after this flag (and -f, if given) into one")
+		print("         \tproject, one after another. Each script's titles and sequences get bin")
+		print("         \tfolders of their own, and scripts are processed in parallel. An existing")
+		print("         \tproject is only replaced with --force-regen.")
+		print()
+		print("Use '-' as the file to read the markdown script from stdin.")
 		sys.exit()
 
 
+# Writes a set of files to a stream as an uncompressed tar archive.
+#
+# files: The contents of each file, keyed by its path within the archive.
+# stream: The binary stream to write to. Does not need to be seekable.
+# mtime: The modification time given to every file. Defaults to the current time.
+def write_tar_stream(files: dict[str, bytes], stream, mtime: float | None = None):
+	if (mtime == None):
+		mtime = time.time()
+	with tarfile.open(fileobj=stream, mode="w|") as tar:
+		# Add directories first so extracting the archive creates them with normal permissions.
+		for dirname in sorted({os.path.dirname(path) for path in files} - {""}):
+			info = tarfile.TarInfo(dirname)
+			info.type = tarfile.DIRTYPE
+			info.mode = 0o755
+			info.mtime = mtime
+			tar.addfile(info)
+
+		for path, data in files.items():
+			info = tarfile.TarInfo(path)
+			info.size = len(data)
+			info.mode = 0o644
+			info.mtime = mtime
+			tar.addfile(info, io.BytesIO(data))
+
+
+# Parses a script and creates its title clips, for a project merging several scripts. Run in a
+# worker process by merge_titles.
+#
+# path: The path of the script.
+# name: The name of the script's folder in the project. See clip_data_to_titleclips.
+# projdir: The directory of the project.
+# in_memory: Whether or not to return the title clips instead of writing them to projdir.
+# dedupe_titles, title_cache: See the matching flags.
+# profile: The output profile from load_profile.
+#
+# Returns a dictionary with the script's "name", "layout" and, if in_memory is set, its "files".
+def merge_script_titles(path: str, name: str, projdir: str, in_memory: bool, dedupe_titles: bool, title_cache: bool, profile: dict) -> dict:
+	cdata = parse_file(path, jobs=1, profile=profile, include_cache=(INCLUDE_CACHE and title_cache))
+	if (cdata == []):
+		raise_error("dp", f"Invalid Markdown Script! ({path})")
+
+	files = {} if in_memory else None
+	layout = clip_data_to_titleclips(cdata, projdir, files, dedupe=dedupe_titles, title_cache=title_cache, profile=profile, title_dir=name, evict_cache=False)
+	return {"name": name, "layout": layout, "files": files}
+
+# Creates the title clips of several scripts across a process pool, for a project merging them.
+# Each script's title clips are placed in a folder named after the script.
+#
+# paths: The paths of the scripts, in order.
+# jobs: The number of processes to use. 0 uses every core.
+# See merge_script_titles for the other arguments.
+#
+# Returns the result of merge_script_titles for each script, in order.
+def merge_titles(paths: list[str], projdir: str, in_memory: bool, dedupe_titles: bool, title_cache: bool, profile: dict, jobs: int = MERGE_JOBS) -> list[dict]:
+	# Scripts with the same file name are told apart by a number.
+	names = []
+	for path in paths:
+		stem = os.path.splitext(os.path.basename(path))[0]
+		name = stem
+		count = 1
+		while (name in names):
+			count += 1
+			name = f"{stem}_{count}"
+		names.append(name)
+
+	if (jobs == 0):
+		jobs = os.cpu_count() or 1
+	jobs = min(jobs, len(paths))
+
+	args = [paths, names, [projdir] * len(paths), [in_memory] * len(paths), [dedupe_titles] * len(paths), [title_cache] * len(paths), [profile] * len(paths)]
+	if (jobs <= 1):
+		results = list(map(merge_script_titles, *args))
+	else:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+			results = list(pool.map(merge_script_titles, *args))
+
+
+	if (title_cache):
+		evict_title_cache()
+
+	return results
+
+
+# Creates the title clips and project of a single profile from parsed clip data.
+#
+# cdata: The clip data returned by parse_file.
+# projdir: The directory of the project.
+# profile: The output profile from load_profile.
+# modify_project: Whether or not to adjust the existing project instead of creating a new one.
+# no_project: Whether or not to only create the title clips.
+# in_memory: Whether or not to return the project's files instead of writing them to projdir.
+# inline_titles, dedupe_titles, title_cache, uuid_namespace, export, preview, resume: See the
+# matching flags.
+# merge_scripts: If given, the paths of several scripts to merge into one project, which are
+# parsed along with their title clips in parallel. cdata is ignored. Cannot be used with
+# modify_project, preview or resume.
+#
+# Returns the project's files by relative path if in_memory is set, otherwise None.
+def build_project(cdata: list[dict], projdir: str, profile: dict, modify_project: bool, no_project: bool, in_memory: bool, inline_titles: bool, dedupe_titles: bool, title_cache: bool, uuid_namespace: uuid.UUID | None, export: bool = False, preview: bool = False, resume: bool = False, merge_scripts: list[str] | None = None) -> dict[str, bytes] | None:
+	# A project that cannot be adjusted in place is refused before any of its titles are rewritten.
+	if (modify_project and not(no_project)):
+		result = check_project_fits(os.path.join(projdir, "project.kdenlive"), cdata, profile)
+		if (result == 3):
+			raise_error("pf", "The script now needs a different number of sequences than the project has. Use --force-regen to rebuild it.")
+		elif (result == 4):
+			raise_error("pf", "The project was created with deduplicated titles, which cannot be adjusted in place. Use --force-regen to rebuild it.")
+
+	# When writing to stdout or inlining titles, every file is kept in memory and written out
+	# at the end.
+	files = {} if (in_memory or inline_titles) else None
+
+	# Files written to the project directory are handed to background threads, so generation
+	# continues while they are written.
+	writer = start_writer()
+
+	# Progress is journaled so that --resume can continue a run that died. Only files written to
+	# the project directory can be resumed from.
+	journal = open_journal(projdir, journal_input_hash(cdata, profile, dedupe_titles), resume, writer) if (files == None and merge_scripts == None) else None
+
+	# The journal is checkpointed and closed if the build fails, so the clips finished so far can
+	# be resumed from.
+	try:
+		print("Creating Title Clips...")
+		merge_parts = None
+		if (merge_scripts != None):
+			if (files == None and not(os.path.exists(os.path.join(projdir, "titles")))):
+				os.mkdir(os.path.join(projdir, "titles"))
+			merge_parts = merge_titles(merge_scripts, projdir, files != None, dedupe_titles, title_cache, profile)
+			for part in merge_parts:
+				if (files != None):
+					files.update(part["files"])
+			layout = None
+		else:
+			layout = clip_data_to_titleclips(cdata, projdir, files, dedupe=dedupe_titles, title_cache=title_cache, profile=profile, writer=writer, journal=journal)
+
+		if (not no_project):
+			if (modify_project):
+				print("Modifying Project...")
+				result = adjust_titles_in_place(
+					projfile = os.path.join(projdir, "project.kdenlive"),
+					layoutfile = os.path.join(projdir, "titles", "layout.json"),
+					layout = layout,
+					titles = files,
+					inline_titles = inline_titles,
+					uuid_namespace = uuid_namespace,
+					profile = profile
+				)
+				if (result == 3):
+					raise_error("pf", "The script now needs a different number of sequences than the project has. Use --force-regen to rebuild it.")
+				elif (result == 4):
+					raise_error("pf", "The project was created with deduplicated titles, which cannot be adjusted in place. Use --force-regen to rebuild it.")
+			else:
+				print("Creating New Project...")
+				titleclips_to_kdenlive(projdir, layout=layout, files=files, inline_titles=inline_titles, cache=not(in_memory), dedupe_titles=dedupe_titles, uuid_namespace=uuid_namespace, profile=profile, writer=writer, parts=merge_parts)
+
+			if (export):
+				print("Exporting Parts...")
+				raise_write_errors(flush_writer(writer))
+				if (files != None and "project.kdenlive" in files):
+					project_xml = files["project.kdenlive"]
+				else:
+					with open(os.path.join(projdir, "project.kdenlive"), "rb") as project_file:
+						project_xml = project_file.read()
+				parts = export_parts(project_xml)
+
+				if (files != None):
+					files.update(parts)
+				else:
+					remove_stale_parts(projdir, parts)
+					for path, data in parts.items():
+						queue_write(writer, os.path.join(projdir, path), data)
+
+		if (preview):
+			print("Rendering Previews...")
+			sheets = render_previews(layout, projdir, get_system_font, files=files, cache=not(in_memory), profile=profile)
+
+			if (files != None):
+				files.update(sheets)
+			else:
+				remove_stale_previews(projdir, sheets)
+				for path, data in sheets.items():
+					queue_write(writer, os.path.join(projdir, path), data)
+
+		# Inlined titles are already part of the project.
+		if (files != None and inline_titles):
+			files = {path: data for path, data in files.items() if not path.startswith("titles/")}
+
+		if (files != None and not(in_memory)):
+			if (export):
+				remove_stale_parts(projdir, files)
+			if (preview):
+				remove_stale_previews(projdir, files)
+			for path, data in files.items():
+				queue_write(writer, os.path.join(projdir, path), data)
+
+		raise_write_errors(stop_writer(writer))
+
+		if (journal != None):
+			close_journal(journal, complete=True)
+	except:
+		if (journal != None):
+			close_journal(journal, complete=False)
+		raise
+
+	return files if in_memory else None
+
+
 def main():
+	# Checking scripts is handled entirely by check.py
+	if (get_flag_idx("", "check") != -1):
+		check.main()
+
 	# Get script as second CLI argument.
 	parse_flags()
 	CFG_FILE = get_flag_arg("f", "file")
@@ -1435,34 +1347,128 @@ def main():
 
 	NO_PROJECT = get_flag_idx("n", "no-proj") != -1
 	REGEN = get_flag_idx("", "force-regen") != -1
-
-	if not os.path.isfile(CFG_FILE) or not os.path.isdir(CFG_PROJDIR):
-		if os.path.isfile(CFG_FILE):
+	TO_STDOUT = get_flag_idx("", "stdout") != -1
+	INLINE_TITLES = get_flag_idx("", "inline-titles") != -1
+	DEDUPE_TITLES = get_flag_idx("", "dedupe-titles") != -1
+	TITLE_CACHE = get_flag_idx("", "no-title-cache") == -1
+	DETERMINISTIC = get_flag_idx("", "deterministic") != -1
+	CFG_PROFILES = get_flag_arg("", "profiles")
+	EXPORT_PARTS = get_flag_idx("", "export-parts") != -1
+	PREVIEW = get_flag_idx("", "preview") != -1
+	RESUME = get_flag_idx("", "resume") != -1
+	MERGE = get_flag_idx("", "merge") != -1
+	CFG_MEASURE = get_flag_arg("", "measure")
+
+	if (CFG_MEASURE != "" and not(CFG_MEASURE in ["freetype", "metrics", "auto"])):
+		print(f"Unknown measurement backend \"{CFG_MEASURE}\". Use freetype, metrics or auto.")
+		sys.exit()
+	if (ImageFont == None and (PREVIEW or CFG_MEASURE == "freetype")):
+		print("Pillow is required for --preview and --measure freetype.")
+		sys.exit()
+	measure_override = {"TEXT_MEASUREMENT": CFG_MEASURE} if CFG_MEASURE != "" else None
+
+	# Each profile gets its own project. With --profiles, these are subdirectories named after
+	# the profiles. They are checked before anything is created.
+	profile_names = [""]
+	if (CFG_PROFILES != ""):
+		profile_names = CFG_PROFILES.split(",")
+		for name in profile_names:
+			if (load_profile(name) == None):
+				print(f"Unknown profile \"{name}\". Available profiles: {", ".join(PROFILES.keys())}")
+				sys.exit()
+
+	# Scripts to merge are every argument that is not a flag, along with -f
+	merge_scripts = None
+	if (MERGE):
+		merge_scripts = ([CFG_FILE] if CFG_FILE != "" else []) + get_positional_args(["-f", "--file", "-d", "--directory", "--profiles", "--measure"])
+		if (len(merge_scripts) == 0 or "-" in merge_scripts):
+			print("--merge needs the paths of the scripts to merge.")
+			sys.exit()
+		if (PREVIEW or RESUME):
+			print("--preview and --resume cannot be used with --merge.")
+			sys.exit()
+		for path in merge_scripts:
+			if (not(os.path.isfile(path))):
+				print(f"Invalid file \"{path}\".")
+				sys.exit()
+		CFG_FILE = merge_scripts[0]
+
+	if (TO_STDOUT):
+		# Keep stdout clean for the archive.
+		tar_stream = sys.stdout.buffer
+		sys.stdout = sys.stderr
+		if (CFG_PROJDIR == ""):
+			CFG_PROJDIR = "."
+
+	if (CFG_FILE != "-" and not os.path.isfile(CFG_FILE)) or (not TO_STDOUT and not os.path.isdir(CFG_PROJDIR)):
+		if (CFG_FILE == "-" or os.path.isfile(CFG_FILE)) and CFG_PROJDIR != "":
 			print("Making project directory...")
 			os.mkdir(CFG_PROJDIR)
 		else:
 			print("Invalid file or directory. Both are required.")
 			sys.exit()
 
-	# Parse script
-	print("Parsing Script...")
-	cdata = parse_file(CFG_FILE)
-	if (cdata == []):
-		print("Invalid Markdown Script!")
-		sys.exit()
+	# Parse script. Merged scripts are parsed along with their title clips.
+	cdata = []
+	if (not(MERGE)):
+		print("Parsing Script...")
+		if (CFG_FILE == "-"):
+			cdata = parse_buffer(sys.stdin.buffer.read(), include_cache=(INCLUDE_CACHE and TITLE_CACHE))
+		else:
+			cdata = parse_file(CFG_FILE, include_cache=(INCLUDE_CACHE and TITLE_CACHE))
+		if (cdata == []):
+			print("Invalid Markdown Script!")
+			sys.exit()
 
-	print("Creating Title Clips...")
-	clip_data_to_titleclips(cdata, CFG_PROJDIR)
+	uuid_namespace = None
+	if (DETERMINISTIC):
+		uuid_namespace = merge_uuid_namespace(merge_scripts) if MERGE else script_uuid_namespace(CFG_FILE)
 
-	if (not NO_PROJECT):
-		if (not(REGEN) and os.path.isfile(os.path.join(CFG_PROJDIR, "project.kdenlive"))):
-			print("Modifying Project...")
-			adjust_titles_in_place(
-				projfile = os.path.join(CFG_PROJDIR, "project.kdenlive"),
-				layoutfile = os.path.join(CFG_PROJDIR, "titles", "layout.json")
-			)
-		else:
-			print("Creating New Project...")
-			titleclips_to_kdenlive(CFG_PROJDIR)
+	profile_dirs = [os.path.join(CFG_PROJDIR, name) if name != "" else CFG_PROJDIR for name in profile_names]
 
-main()
+	# Modifying a project in place assumes one producer per clip.
+	modify_project = [not(NO_PROJECT) and not(TO_STDOUT) and not(REGEN) and os.path.isfile(os.path.join(projdir, "project.kdenlive")) for projdir in profile_dirs]
+	if (DEDUPE_TITLES and True in modify_project):
+		print_error("pf", "Deduplicated titles cannot be applied to an existing project. Use --force-regen to rebuild it.")
+		sys.exit()
+	if (MERGE and True in modify_project):
+		print_error("pf", "Merged scripts cannot be applied to an existing project. Use --force-regen to rebuild it.")
+		sys.exit(1)
+
+	tar_files = {}
+	for i in range(len(profile_names)):
+		if (profile_names[i] != ""):
+			print(f"Profile {profile_names[i]}:")
+			if (not(TO_STDOUT) and not(os.path.isdir(profile_dirs[i]))):
+				os.mkdir(profile_dirs[i])
+
+		files = build_project(
+			cdata = cdata,
+			projdir = profile_dirs[i],
+			profile = load_profile(profile_names[i], measure_override),
+			modify_project = modify_project[i],
+			no_project = NO_PROJECT,
+			in_memory = TO_STDOUT,
+			inline_titles = INLINE_TITLES,
+			dedupe_titles = DEDUPE_TITLES,
+			title_cache = TITLE_CACHE,
+			uuid_namespace = uuid_namespace if (uuid_namespace == None or profile_names[i] == "") else uuid.uuid5(uuid_namespace, profile_names[i]),
+			export = EXPORT_PARTS,
+			preview = PREVIEW,
+			resume = RESUME,
+			merge_scripts = merge_scripts
+		)
+
+		if (TO_STDOUT):
+			for path, data in files.items():
+				tar_files[os.path.join(profile_names[i], path)] = data
+
+	if (TO_STDOUT):
+		write_tar_stream(tar_files, tar_stream, mtime=(0 if DETERMINISTIC else None))
+
+if __name__ == "__main__":
+	try:
+		main()
+	except TitleGenError:
+		# The error has already been printed.
+		sys.exit(1)
@@ -0,0 +1,146 @@
+import os, json, shutil, hashlib, pathlib, threading
+
+from constants import *
+from helpers import *
+
+
+#
+# Title Cache
+#
+# Shared by every project on the machine. Line breaks are stored under a key derived from the
+# text, the font file, the font size and the maximum width. Finished title files are stored
+# under the md5 hash of their contents, and are copied (or hardlinked, with TITLE_CACHE_HARDLINK)
+# into projects instead of being written again. Least recently used entries are evicted once the
+# cache exceeds TITLE_CACHE_MAX_BYTES.
+#
+
+# Gets the directory the title cache is stored in.
+def title_cache_dir() -> str:
+	if (TITLE_CACHE_DIR != ""):
+		return TITLE_CACHE_DIR
+
+	cache_home = os.environ.get("XDG_CACHE_HOME", "")
+	if (cache_home == ""):
+		cache_home = os.path.join(str(pathlib.Path.home()), ".cache")
+	return os.path.join(cache_home, "kdenlive-title-gen")
+
+# Writes a file in the title cache so that an interrupted or concurrent run never sees a partial file.
+#
+# path: The path of the file.
+# data: The contents of the file.
+def write_cache_file(path: str, data: bytes):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(tmp_path, "wb") as cache_file:
+		cache_file.write(data)
+	os.replace(tmp_path, path)
+
+# Marks a cache file as recently used.
+def touch_cache_file(path: str):
+	try:
+		os.utime(path)
+	except OSError:
+		pass
+
+# Computes the cache key of a line break.
+#
+# text: The text being broken.
+# font_path: The path of the font file used to measure the text.
+# font_size: The size of the font in pixels.
+# max_width: The maximum width of a line in pixels.
+#
+# Returns the key as a hex string.
+def line_cache_key(text: str, font_path: str, font_size: int, max_width: int) -> str:
+	# The font file's size and modification time stand in for its contents.
+	font_stat = os.stat(font_path)
+	key_data = [text, font_path, font_stat.st_size, font_stat.st_mtime_ns, font_size, max_width]
+	return hashlib.md5(json.dumps(key_data).encode()).hexdigest()
+
+# Attempts to load a cached line break.
+#
+# key: The key from line_cache_key.
+#
+# Returns the lines, or None if the line break is not cached.
+def load_cached_lines(key: str) -> list[str] | None:
+	path = os.path.join(title_cache_dir(), "lines", f"{key}.json")
+	try:
+		with open(path, "r") as cache_file:
+			lines = json.loads(cache_file.read())
+	except (OSError, ValueError):
+		return None
+
+	touch_cache_file(path)
+	return lines
+
+# Stores a line break in the cache.
+#
+# key: The key from line_cache_key.
+# lines: The lines returned by break_text_by_font_width.
+def store_cached_lines(key: str, lines: list[str]):
+	write_cache_file(os.path.join(title_cache_dir(), "lines", f"{key}.json"), json.dumps(lines).encode())
+
+# Places a title file in a project, reusing an identical title from the cache if there is one.
+# The title is added to the cache if it is not already there.
+#
+# data: The contents of the title file.
+# dest: The path of the title file in the project.
+def write_cached_title(data: bytes, dest: str):
+	path = os.path.join(title_cache_dir(), "titles", f"{hashlib.md5(data).hexdigest()}.kdenlivetitle")
+
+	# A title edited in place through a hardlink no longer matches its name, so it is replaced.
+	try:
+		with open(path, "rb") as cache_file:
+			cached = cache_file.read() == data
+	except OSError:
+		cached = False
+
+	if (cached):
+		pdb(f"Title cache hit: {path}")
+		touch_cache_file(path)
+	else:
+		write_cache_file(path, data)
+
+	# Never write through an existing hardlink into the cache or another project.
+	if (os.path.lexists(dest)):
+		os.remove(dest)
+
+	if (TITLE_CACHE_HARDLINK):
+		try:
+			os.link(path, dest)
+			return
+		except OSError:
+			pass
+	shutil.copyfile(path, dest)
+
+# Deletes the least recently used entries until the title cache fits in TITLE_CACHE_MAX_BYTES.
+def evict_title_cache():
+	entries = []
+	total_size = 0
+	for subdir in ["lines", "titles", "includes"]:
+		cache_dir = os.path.join(title_cache_dir(), subdir)
+		if not os.path.isdir(cache_dir):
+			continue
+
+		with os.scandir(cache_dir) as dir_entries:
+			for entry in dir_entries:
+				try:
+					entry_stat = entry.stat()
+				except OSError:
+					continue
+				entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry.path))
+				total_size += entry_stat.st_size
+
+	if (total_size <= TITLE_CACHE_MAX_BYTES):
+		return
+
+	entries.sort()
+	for mtime, size, path in entries:
+		if (total_size <= TITLE_CACHE_MAX_BYTES):
+			break
+		try:
+			os.remove(path)
+		except OSError:
+			continue
+		total_size -= size
+
+	pdb(f"Title cache evicted down to {total_size} bytes")
@@ -0,0 +1,141 @@
+import os, queue, threading
+
+from constants import *
+from helpers import *
+
+
+#
+# Background File Writer
+#
+# Files are pushed into a bounded queue as they are generated and written by a pool of I/O
+# threads, so generating titles and the project overlaps with waiting on the filesystem (which
+# dominates on network mounts). A writer is a dictionary holding its queue, threads and any
+# errors the threads ran into. Errors are collected rather than raised, and are returned when
+# the writer is flushed or stopped.
+#
+
+# Writes a file, replacing any existing file instead of writing through it, as it may be
+# hardlinked to the title cache.
+#
+# data: The contents of the file.
+# path: The path of the file.
+def write_file(data: bytes, path: str):
+	if (os.path.lexists(path)):
+		os.remove(path)
+	with open(path, "wb") as out_file:
+		out_file.write(data)
+
+# Writes a file through a temporary file so that an interrupted run never leaves a partial file.
+#
+# data: The contents of the file.
+# path: The path of the file.
+def write_file_atomic(data: bytes, path: str):
+	tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(tmp_path, "wb") as out_file:
+		out_file.write(data)
+	os.replace(tmp_path, path)
+
+# Flushes a file or directory to disk.
+def fsync_path(path: str):
+	fd = os.open(path, os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+# Writes queued files until the writer is stopped. Run by each of the writer's threads. Every
+# item is marked done, however its write ends, so that flushing the writer never hangs.
+def writer_thread(writer: dict):
+	while True:
+		item = writer["queue"].get()
+		if (item == None):
+			writer["queue"].task_done()
+			return
+
+		path, data, write = item
+		try:
+			# Once a write has failed the run is abandoned, so the rest are skipped.
+			if (len(writer["errors"]) == 0):
+				write(data, path)
+				if (writer["fsync"]):
+					fsync_path(path)
+		except Exception as err:
+			writer["errors"].append((path, err))
+		finally:
+			writer["queue"].task_done()
+
+# Starts a writer.
+#
+# threads: The number of I/O threads.
+# queue_size: The number of files that can be queued before queue_write blocks.
+# fsync: Whether or not to flush every written file, and each directory written to once the
+# writer is stopped, to disk.
+def start_writer(threads: int = WRITE_THREADS, queue_size: int = WRITE_QUEUE_SIZE, fsync: bool = WRITE_FSYNC) -> dict:
+	writer = {
+		"queue": queue.Queue(maxsize=queue_size),
+		"threads": [],
+		"errors": [],
+		"dirs": set(),
+		"fsync": fsync
+	}
+
+	for i in range(max(threads, 1)):
+		thread = threading.Thread(target=writer_thread, args=(writer,), daemon=True)
+		thread.start()
+		writer["threads"].append(thread)
+	return writer
+
+# Queues a file to be written. Blocks while the queue is full.
+#
+# writer: The writer from start_writer.
+# path: The path of the file.
+# data: The contents of the file.
+# write: The function writing the file, called with data and path.
+def queue_write(writer: dict, path: str, data: bytes, write=write_file):
+	writer["dirs"].add(os.path.dirname(os.path.abspath(path)))
+	writer["queue"].put((path, data, write))
+
+# Waits for every queued file to be written.
+#
+# Returns a list of (path, error) tuples for the writes that failed.
+def flush_writer(writer: dict) -> list[tuple[str, Exception]]:
+	writer["queue"].join()
+	return writer["errors"]
+
+# Writes every queued file and stops the writer's threads.
+#
+# Returns a list of (path, error) tuples for the writes that failed.
+def stop_writer(writer: dict) -> list[tuple[str, Exception]]:
+	for thread in writer["threads"]:
+		writer["queue"].put(None)
+	for thread in writer["threads"]:
+		thread.join()
+
+	# Directories cannot be opened for syncing on Windows.
+	if (writer["fsync"] and len(writer["errors"]) == 0 and os.name != "nt"):
+		for path in sorted(writer["dirs"]):
+			try:
+				fsync_path(path)
+			except OSError as err:
+				writer["errors"].append((path, err))
+
+	return writer["errors"]
+
+# Describes an error returned by flush_writer or stop_writer.
+def write_error_message(path: str, err: Exception) -> str:
+	reason = err.strerror if (isinstance(err, OSError) and err.strerror != None) else repr(err)
+	return f"Could not write {path} ({reason})."
+
+# Prints the errors returned by flush_writer or stop_writer.
+#
+# Returns True if there were any errors.
+def report_write_errors(write_errors: list[tuple[str, Exception]]) -> bool:
+	for path, err in write_errors:
+		print_error("fw", write_error_message(path, err))
+	return len(write_errors) > 0
+
+# Prints the errors returned by flush_writer or stop_writer, and raises the first as a
+# TitleGenError if there were any.
+def raise_write_errors(write_errors: list[tuple[str, Exception]]):
+	if (report_write_errors(write_errors)):
+		raise TitleGenError(write_error_message(*write_errors[0]))